@@ -1,4 +1,3 @@
-import csv
 import io
 import os
 import zipfile
@@ -7,84 +6,78 @@ from urllib.parse import urlparse
 import requests
 from django.http import HttpResponse
 from django.contrib import admin, messages
-from django.db.models import Q, Exists, OuterRef
+from django.db.models import Q, Exists, OuterRef, Prefetch
+from core.csv_export import EXPORT_CHUNK_SIZE, stream_csv
 from .models import User
 from django.utils.text import slugify
 
 
+USER_EXPORT_HEADER = [
+    'Phone',
+    'Name',
+    'Batch',
+    'Gender',
+    'Profile Image URL',
+    'Staff',
+    'Active',
+    'Date Joined',
+    'Payment Transaction ID',
+    'Payment Type',
+    'Payment Amount',
+    'Payment Method',
+    'Payment Approved',
+    'Payment Created At',
+]
+
+
+def _profile_image_url(user):
+    if not getattr(user, 'profile_image', None):
+        return ''
+    try:
+        return user.profile_image.url
+    except Exception:  # pragma: no cover - prevent export failure if storage is misconfigured
+        return str(user.profile_image)
+
+
+def _user_export_rows(queryset):
+    from payments.models import Payment
+
+    users = queryset.only(
+        'phone', 'name', 'batch', 'gender', 'profile_image', 'is_staff', 'is_active', 'date_joined',
+    ).prefetch_related(
+        Prefetch('payments', queryset=Payment.objects.order_by('-created_at'))
+    )
+    # Two queries per chunk (users + their payments), whatever the row count
+    for user in users.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        user_columns = [
+            user.phone,
+            user.name,
+            user.batch,
+            user.gender,
+            _profile_image_url(user),
+            user.is_staff,
+            user.is_active,
+            user.date_joined.isoformat() if user.date_joined else '',
+        ]
+        payments = user.payments.all()
+        if not payments:
+            yield user_columns + [''] * 6
+        for payment in payments:
+            yield user_columns + [
+                payment.transaction_id,
+                payment.payment_type,
+                str(payment.amount),
+                payment.method,
+                payment.payment_approved,
+                payment.created_at.isoformat() if payment.created_at else '',
+            ]
+
+
 def export_users_csv(modeladmin, request, queryset):
     """
-    Export selected users as CSV.
+    Export selected users as CSV, streamed in chunks.
     """
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="users.csv"'
-
-    writer = csv.writer(response)
-    # Header row
-    writer.writerow([
-        'Phone',
-        'Name',
-        'Batch',
-        'Gender',
-        'Profile Image URL',
-        'Staff',
-        'Active',
-        'Date Joined',
-        'Payment Transaction ID',
-        'Payment Type',
-        'Payment Amount',
-        'Payment Method',
-        'Payment Approved',
-        'Payment Created At',
-    ])
-
-    for user in queryset:
-        payments = list(user.payments.all().order_by('-created_at'))
-
-        profile_image_url = ''
-        if getattr(user, 'profile_image', None):
-            try:
-                profile_image_url = user.profile_image.url
-            except Exception:  # pragma: no cover - prevent export failure if storage is misconfigured
-                profile_image_url = str(user.profile_image)
-
-        if payments:
-            for payment in payments:
-                writer.writerow([
-                    user.phone,
-                    user.name,
-                    user.batch,
-                    user.gender,
-                    profile_image_url,
-                    user.is_staff,
-                    user.is_active,
-                    user.date_joined.isoformat() if user.date_joined else '',
-                    payment.transaction_id,
-                    payment.payment_type,
-                    str(payment.amount),
-                    payment.method,
-                    payment.payment_approved,
-                    payment.created_at.isoformat() if payment.created_at else '',
-                ])
-        else:
-            writer.writerow([
-                user.phone,
-                user.name,
-                user.batch,
-                user.gender,
-                profile_image_url,
-                user.is_staff,
-                user.is_active,
-                user.date_joined.isoformat() if user.date_joined else '',
-                '',
-                '',
-                '',
-                '',
-                '',
-                '',
-            ])
-
-    return response
+    return stream_csv('users.csv', USER_EXPORT_HEADER, _user_export_rows(queryset))
 
 
 export_users_csv.short_description = "Export Selected Users to CSV"
@@ -0,0 +1,22 @@
+# Written by hand: makemigrations would also pick up the year-dependent
+# BATCH_CHOICES change on User.batch, which is not a schema change.
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_alter_user_batch'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['batch', 'gender'], name='user_batch_gender'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['-date_joined'], name='user_date_joined'),
+        ),
+    ]
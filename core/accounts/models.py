@@ -55,6 +55,13 @@ class User(AbstractBaseUser, PermissionsMixin):
     USERNAME_FIELD = 'phone'
     REQUIRED_FIELDS = []
 
+    class Meta:
+        indexes = [
+            # Registration stats group by batch and gender; the admin lists newest first
+            models.Index(fields=['batch', 'gender'], name='user_batch_gender'),
+            models.Index(fields=['-date_joined'], name='user_date_joined'),
+        ]
+
     objects = UserManager()
 
     def __str__(self):
@@ -1,3 +1,58 @@
-from django.test import TestCase
+import csv
+import io
 
-# Create your tests here.
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core.query_plans import IndexPlanTestCase
+from payments.models import Payment
+from .admin import _user_export_rows
+from .models import User
+
+
+@override_settings(GATE_SCAN_LOG_ENABLED=False)
+class UserExportTests(TestCase):
+    """The user CSV export streams and does not query per user."""
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser(phone='01900000000', password='x')
+        self.client.force_login(self.admin)
+
+    def make_users(self, start, count):
+        for i in range(start, start + count):
+            user = User.objects.create_user(phone=f'017{i:08d}', password='x', name=f'Guest {i}')
+            Payment.objects.create(user=user, transaction_id=f'TX{i}a', amount=500, payment_type='registration')
+            Payment.objects.create(user=user, transaction_id=f'TX{i}b', amount=100, payment_type='donation')
+
+    def export(self):
+        response = self.client.post(reverse('admin:accounts_user_changelist'), {
+            'action': 'export_users_csv',
+            '_selected_action': list(User.objects.values_list('pk', flat=True)),
+        })
+        self.assertTrue(response.streaming)
+        return list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode())))
+
+    def test_export_rows_and_constant_queries(self):
+        self.make_users(0, 3)
+        with self.assertNumQueries(2):
+            rows = list(_user_export_rows(User.objects.all()))
+        self.make_users(3, 20)
+        with self.assertNumQueries(2):
+            more = list(_user_export_rows(User.objects.all()))
+        self.assertEqual(len(more) - len(rows), 40)
+
+        rows = self.export()
+        self.assertEqual(rows[0][0], 'Phone')
+        # Every user with two payments gets two rows, newest payment first
+        guest = [row for row in rows if row[0] == '01700000001']
+        self.assertEqual([row[8] for row in guest], ['TX1b', 'TX1a'])
+        # The admin itself has no payments and gets one row with empty payment columns
+        self.assertEqual([row[8:] for row in rows if row[0] == '01900000000'], [[''] * 6])
+
+
+class UserIndexTests(IndexPlanTestCase):
+    def test_batch_stats(self):
+        self.assertUsesIndex(
+            User.objects.filter(batch='2019').values('gender'),
+            'user_batch_gender',
+        )
@@ -2,6 +2,8 @@
 ASGI config for core project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Serve it with an ASGI server (e.g. ``uvicorn core.asgi:application``) for
+long-lived responses such as the live dashboard stream (/api/ticket/live/).
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
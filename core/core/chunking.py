@@ -0,0 +1,15 @@
+"""
+Chunked IN (...) lookups.
+
+Bulk operations over thousands of ids split them into chunks so each
+query stays well below the backends' bound-parameter limits.
+"""
+
+# Ids per IN (...) list
+CHUNK_SIZE = 2000
+
+
+def chunks(items, size=CHUNK_SIZE):
+    """Consecutive slices of the sequence `items`, each at most `size` long."""
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
@@ -0,0 +1,36 @@
+"""
+Query plan checks for the tests.
+
+IndexPlanTestCase seeds a large dataset once per class and checks with
+EXPLAIN that hot reads are answered from an index rather than a full
+table scan. Each app's tests subclass it for the indexes the app owns.
+"""
+from django.db import connection
+from django.test import TestCase, override_settings
+
+
+@override_settings(GATE_SCAN_LOG_ENABLED=False)
+class IndexPlanTestCase(TestCase):
+    USERS = 5000
+
+    @classmethod
+    def setUpTestData(cls):
+        from accounts.models import User
+
+        users = User.objects.bulk_create([
+            User(phone=f'017{i:08d}', password='!', name=f'Guest {i}',
+                 batch=str(1998 + i % 30), gender=('male', 'female')[i % 2])
+            for i in range(cls.USERS)
+        ], batch_size=1000)
+        cls.user = users[0]
+        cls.seed(users)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    @classmethod
+    def seed(cls, users):
+        """Create the app's rows for the seeded users."""
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(index_name, plan, f"{index_name} not used:\n{plan}\n{queryset.query}")
@@ -34,6 +34,23 @@ ALLOWED_HOSTS = ["*"]
 
 TICKET_FONT_BASE_URL = os.getenv('TICKET_FONT_BASE_URL')
 
+# Ticket codes: zero-padded length and how many codes each worker reserves at once
+TICKET_CODE_LENGTH = int(os.getenv('TICKET_CODE_LENGTH', 5))
+TICKET_CODE_BLOCK_SIZE = int(os.getenv('TICKET_CODE_BLOCK_SIZE', 20))
+# 'numeric' (00042) or 'check' (letters without look-alikes + check character)
+TICKET_CODE_FORMAT = os.getenv('TICKET_CODE_FORMAT', 'numeric')
+
+# Signed ticket QR payloads. TICKET_QR_KEYS is "KID:secret,KID2:secret2";
+# empty means one key derived from SECRET_KEY. TICKET_QR_SIGNED makes new
+# ticket images encode signed payloads; TICKET_QR_REQUIRE_SIGNED makes the
+# gate reject bare codes.
+TICKET_QR_KEYS = dict(
+    item.split(':', 1) for item in os.getenv('TICKET_QR_KEYS', '').split(',') if ':' in item
+)
+TICKET_QR_ACTIVE_KEY = os.getenv('TICKET_QR_ACTIVE_KEY', '')
+TICKET_QR_SIGNED = os.getenv('TICKET_QR_SIGNED', 'False') == 'True'
+TICKET_QR_REQUIRE_SIGNED = os.getenv('TICKET_QR_REQUIRE_SIGNED', 'False') == 'True'
+
 
 # Application definition
 
@@ -120,6 +137,60 @@ else:
     }
 }
 
+# Cache
+# A shared cache (Redis, needs the `redis` package) keeps per-worker gate state
+# such as the roster index in step across gunicorn workers. Without REDIS_URL
+# each process falls back to its own in-memory cache.
+REDIS_URL = os.getenv('REDIS_URL')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    # LocMem is per process: roster change notices, scan claims and live
+    # counts are not shared, so with several workers a gate field changed on
+    # another worker (food, entry, profile) can be stale here for up to
+    # GATE_ROSTER_MAX_AGE seconds; unknown codes are still read from the
+    # database. Set REDIS_URL whenever more than one worker serves the gate.
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Gate roster: seconds before a worker fully reloads its in-memory roster
+GATE_ROSTER_MAX_AGE = int(os.getenv('GATE_ROSTER_MAX_AGE', 300))
+# Gate responses: edge length (px) of the optional profile thumbnail
+GATE_THUMBNAIL_SIZE = int(os.getenv('GATE_THUMBNAIL_SIZE', 96))
+# Gate: seconds within which a repeat enter/food scan of a code is flagged (0 disables)
+GATE_DUPLICATE_WINDOW = int(os.getenv('GATE_DUPLICATE_WINDOW', 10))
+# Gate scan event log: buffered in memory and bulk inserted by a writer thread
+GATE_SCAN_LOG_ENABLED = os.getenv('GATE_SCAN_LOG_ENABLED', 'True') == 'True'
+GATE_SCAN_LOG_ASYNC = os.getenv('GATE_SCAN_LOG_ASYNC', 'True') == 'True'
+GATE_SCAN_LOG_BATCH_SIZE = int(os.getenv('GATE_SCAN_LOG_BATCH_SIZE', 200))
+GATE_SCAN_LOG_FLUSH_INTERVAL = float(os.getenv('GATE_SCAN_LOG_FLUSH_INTERVAL', 2.0))
+GATE_SCAN_LOG_MAX_BUFFER = int(os.getenv('GATE_SCAN_LOG_MAX_BUFFER', 10000))
+# Event mode: gate transitions go to a local fsynced journal and are
+# replicated to the database by `manage.py replicate_gate_journal`
+GATE_EVENT_MODE = os.getenv('GATE_EVENT_MODE', 'False') == 'True'
+GATE_JOURNAL_DIR = os.getenv('GATE_JOURNAL_DIR', str(BASE_DIR / 'gate_journal'))
+GATE_REPLICATOR_BATCH = int(os.getenv('GATE_REPLICATOR_BATCH', 500))
+# fsync journal, checkpoint and conflict writes (only disable on throwaway hosts)
+GATE_JOURNAL_FSYNC = os.getenv('GATE_JOURNAL_FSYNC', 'True') == 'True'
+# Seconds the shared "already entered / served" claims of event mode are kept
+GATE_EVENT_STATE_TTL = int(os.getenv('GATE_EVENT_STATE_TTL', 24 * 3600))
+# Live dashboard (SSE under ASGI, polling live/counts/ under WSGI): per-worker
+# snapshot refresh, stream length, reseed period
+GATE_LIVE_POLL_INTERVAL = float(os.getenv('GATE_LIVE_POLL_INTERVAL', 1.0))
+GATE_LIVE_STREAM_SECONDS = int(os.getenv('GATE_LIVE_STREAM_SECONDS', 300))
+GATE_LIVE_RESEED = int(os.getenv('GATE_LIVE_RESEED', 600))
+# Live dashboard: seconds a signed stream token (live/token/) stays valid
+GATE_LIVE_TOKEN_MAX_AGE = int(os.getenv('GATE_LIVE_TOKEN_MAX_AGE', 60))
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -338,4 +409,20 @@ EMAIL_PORT = int(os.getenv("EMAIL_PORT", 587))
 EMAIL_HOST_USER = os.getenv("EMAIL_HOST_USER")
 EMAIL_HOST_PASSWORD = os.getenv("EMAIL_HOST_PASSWORD")
 EMAIL_USE_TLS = True
-DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
\ No newline at end of file
+DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
+# Email outbox: batch size per drain, retry backoff (seconds) and attempts before giving up
+EMAIL_OUTBOX_BATCH_SIZE = int(os.getenv('EMAIL_OUTBOX_BATCH_SIZE', 50))
+EMAIL_OUTBOX_RETRY_BASE = int(os.getenv('EMAIL_OUTBOX_RETRY_BASE', 30))
+EMAIL_OUTBOX_RETRY_MAX = int(os.getenv('EMAIL_OUTBOX_RETRY_MAX', 3600))
+EMAIL_OUTBOX_MAX_ATTEMPTS = int(os.getenv('EMAIL_OUTBOX_MAX_ATTEMPTS', 8))
+# Seconds a worker holds claimed emails; unfinished ones are then claimed again
+EMAIL_OUTBOX_LEASE = int(os.getenv('EMAIL_OUTBOX_LEASE', 300))
+# Admin payment emails: "each" (one per payment) or "digest" (one summary per
+# PAYMENT_DIGEST_INTERVAL minutes; donations of PAYMENT_LARGE_DONATION or more still alert individually)
+PAYMENT_EMAIL_MODE = os.getenv('PAYMENT_EMAIL_MODE', 'each')
+PAYMENT_DIGEST_INTERVAL = int(os.getenv('PAYMENT_DIGEST_INTERVAL', 15))
+PAYMENT_LARGE_DONATION = int(os.getenv('PAYMENT_LARGE_DONATION', 10000))
+# Seconds an Idempotency-Key response is replayed for payment submissions
+PAYMENT_IDEMPOTENCY_TTL = int(os.getenv('PAYMENT_IDEMPOTENCY_TTL', 24 * 3600))
+# Seconds the public donation stats snapshot may serve stale donor names / images
+DONATION_STATS_TTL = int(os.getenv('DONATION_STATS_TTL', 300))
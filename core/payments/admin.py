@@ -1,35 +1,118 @@
-import csv
-from django.contrib import admin
-from django.http import HttpResponse
-from .models import Payment
+from django.contrib import admin, messages
+from django.http import HttpResponseRedirect
+from django.template.response import TemplateResponse
+from django.urls import path, reverse
+from django.utils import timezone
+from core.csv_export import EXPORT_CHUNK_SIZE, stream_csv
+from .approvals import approve_payments
+from .models import EmailOutbox, Payment
+from .pagination import InvalidCursor, keyset_page, parse_limit
+
+# Approval queue: rows per page and the most pending rows counted exactly
+QUEUE_PAGE_SIZE = 100
+QUEUE_COUNT_LIMIT = 1000
 
 @admin.register(Payment)
 class PaymentAdmin(admin.ModelAdmin):
     list_display = ('user', 'phone', 'transaction_id', 'amount', 'payment_type', 'method', 'payment_approved', 'created_at')
     search_fields = ('phone', 'transaction_id', 'user__name')  # search by user name, phone, transaction id
     list_filter = ('payment_type', 'method', 'payment_approved')  # filters
+    list_select_related = ('user',)
+    # Skip the extra unfiltered COUNT(*) on filtered pages
+    show_full_result_count = False
+    change_list_template = 'admin/payments/payment/change_list.html'
 
-    actions = ['export_to_csv']
+    actions = ['export_to_csv', 'approve_selected']
 
     def export_to_csv(self, request, queryset):
         """
-        Export selected payments to CSV
+        Export selected payments to CSV, streamed in chunks
         """
-        meta = self.model._meta
-        field_names = [field.name for field in meta.fields]
+        field_names = [field.name for field in self.model._meta.fields]
+        rows = (
+            [getattr(obj, field) for field in field_names]
+            for obj in queryset.select_related('user').iterator(chunk_size=EXPORT_CHUNK_SIZE)
+        )
+        return stream_csv('payments.csv', field_names, rows)
+
+    export_to_csv.short_description = "Export Selected to CSV"
 
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = f'attachment; filename=payments.csv'
-        writer = csv.writer(response)
+    @admin.action(description="Approve Selected (bulk)", permissions=['change'])
+    def approve_selected(self, request, queryset):
+        """
+        Approve selected payments in one transaction and bulk-create missing tickets
+        """
+        result = approve_payments(queryset)
+        self.message_user(request, result.summary(), level=messages.SUCCESS)
 
-        # header row
-        writer.writerow(field_names)
+    def get_urls(self):
+        urls = [
+            path('approval-queue/', self.admin_site.admin_view(self.approval_queue_view),
+                 name='payments_payment_approval_queue'),
+        ]
+        return urls + super().get_urls()
 
-        # data rows
-        for obj in queryset:
-            row = [getattr(obj, field) for field in field_names]
-            writer.writerow(row)
+    def approval_queue_view(self, request):
+        """
+        Pending payments oldest first, paginated by key (no OFFSET, no COUNT(*))
+        """
+        if request.method == 'POST':
+            if not self.has_change_permission(request):
+                return HttpResponseRedirect(reverse('admin:index'))
+            ids = [int(i) for i in request.POST.getlist('ids') if i.isdigit()]
+            if ids:
+                result = approve_payments(Payment.objects.filter(id__in=ids))
+                self.message_user(request, result.summary(), level=messages.SUCCESS)
+            return HttpResponseRedirect(request.get_full_path())
 
-        return response
+        pending = Payment.objects.filter(payment_approved=False)
+        payment_type = request.GET.get('type')
+        if payment_type in dict(Payment.PAYMENT_TYPE_CHOICES):
+            pending = pending.filter(payment_type=payment_type)
+        try:
+            rows, next_cursor = keyset_page(
+                pending.select_related('user'),
+                parse_limit(request.GET.get('limit'), QUEUE_PAGE_SIZE, QUEUE_PAGE_SIZE * 5),
+                request.GET.get('cursor'),
+                descending=False,
+            )
+        except InvalidCursor:
+            return HttpResponseRedirect(request.path)
+        # Bounded count: reads at most QUEUE_COUNT_LIMIT + 1 index entries
+        pending_count = len(pending.values_list('id', flat=True)[:QUEUE_COUNT_LIMIT + 1])
 
-    export_to_csv.short_description = "Export Selected to CSV"
+        params = request.GET.copy()
+        if next_cursor:
+            params['cursor'] = next_cursor
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Pending approvals (oldest first)',
+            'payments': rows,
+            'payment_type': payment_type,
+            'next_query': params.urlencode() if next_cursor else None,
+            'is_first_page': not request.GET.get('cursor'),
+            'pending_count': min(pending_count, QUEUE_COUNT_LIMIT),
+            'pending_count_capped': pending_count > QUEUE_COUNT_LIMIT,
+        }
+        return TemplateResponse(request, 'admin/payments/payment/approval_queue.html', context)
+
+
+@admin.register(EmailOutbox)
+class EmailOutboxAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'status', 'attempts', 'next_attempt_at', 'created_at', 'sent_at')
+    list_filter = ('status',)
+    search_fields = ('subject', 'payment__transaction_id')
+    readonly_fields = ('payment', 'created_at', 'sent_at', 'last_error')
+
+    actions = ['retry_now']
+
+    def retry_now(self, request, queryset):
+        """
+        Put selected emails back in the queue, due immediately
+        """
+        # Rows being sent are reclaimed automatically once their lease expires
+        count = queryset.exclude(status__in=['sent', 'sending']).update(status='pending', next_attempt_at=timezone.now())
+        self.message_user(request, f"{count} emails queued for retry.", level=messages.SUCCESS)
+
+    retry_now.short_description = "Retry selected now"
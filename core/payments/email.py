@@ -1,16 +1,33 @@
-"""Utilities for sending payment-related emails."""
+"""Utilities for sending payment-related emails.
+
+PAYMENT_EMAIL_MODE chooses how admins hear about new payments:
+
+- "each": one email per payment (the default);
+- "digest": one summary email per PAYMENT_DIGEST_INTERVAL minutes with
+  totals by type and method and the pending approvals. Donations of at
+  least PAYMENT_LARGE_DONATION still get an email of their own.
+"""
 
 import logging
-from typing import Optional
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from typing import List, Optional, Tuple
 
 from django.conf import settings
-from django.core.mail import send_mail
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Sum
 from django.utils import timezone
 
 
 logger = logging.getLogger(__name__)
 
 ADMIN_EMAIL = "excmhsian@gmail.com"
+EACH, DIGEST = "each", "digest"
+# Rows of the pending approvals table in a digest
+DIGEST_PENDING_ROWS = 50
+# Wait this long after a window closes before summarising it, so payments
+# created just before the boundary have committed
+DIGEST_SETTLE_SECONDS = 30
 
 def _get_from_email() -> str:
     """Return a sensible from email address with fallbacks."""
@@ -21,15 +38,8 @@ def _get_from_email() -> str:
     return "no-reply@rbmbians.com"
 
 
-def send_email(payment) -> bool:
-    """Send a notification email for a newly created payment.
-
-    Returns True on success, False otherwise. Any exception is logged and
-    swallowed so payment creation flow can proceed without interruption.
-    """
-
-    if payment is None:
-        return False
+def build_payment_email(payment) -> Tuple[str, str]:
+    """Return (subject, body) of the admin notification for a payment."""
 
     user = getattr(payment, "user", None)
     payment_type = getattr(payment, "payment_type", "").lower()
@@ -66,20 +76,154 @@ def send_email(payment) -> bool:
         f"- Approved: {payment.payment_approved}\n"
         f"- Created At: {created_at_str}\n"
     )
+    return subject, body
 
-    try:
-        send_mail(
-            subject=subject,
-            message=body,
-            from_email=_get_from_email(),
-            recipient_list=[ADMIN_EMAIL],
-            fail_silently=False,
-        )
-        return True
-    except Exception:
-        logger.exception(
-            "Failed to send payment notification email for payment id=%s",
-            getattr(payment, "id", None),
-        )
-        return False
 
+def queue_email(subject: str, body: str, recipients: List[str], payment=None, digest_until=None):
+    """Add an email to the outbox.
+
+    Call inside the transaction that makes the change being reported: the
+    email is only sent (by the outbox worker) if that transaction commits.
+    """
+    from .models import EmailOutbox
+
+    return EmailOutbox.objects.create(
+        subject=subject,
+        body=body,
+        from_email=_get_from_email(),
+        recipients=list(recipients),
+        payment=payment,
+        digest_until=digest_until,
+    )
+
+
+def get_payment_email_mode() -> str:
+    return getattr(settings, "PAYMENT_EMAIL_MODE", EACH)
+
+
+def is_large_donation(payment) -> bool:
+    threshold = getattr(settings, "PAYMENT_LARGE_DONATION", 10000)
+    return payment.payment_type == "donation" and Decimal(payment.amount) >= Decimal(threshold)
+
+
+def queue_payment_email(payment):
+    """Queue the admin notification for a newly created payment.
+
+    In digest mode only large donations are queued here; every other
+    payment is reported by the next digest.
+    """
+    if payment is None:
+        return None
+    if get_payment_email_mode() == DIGEST and not is_large_donation(payment):
+        return None
+    subject, body = build_payment_email(payment)
+    if get_payment_email_mode() == DIGEST:
+        subject = f"Large Donation: {payment.amount}"
+    return queue_email(subject, body, [ADMIN_EMAIL], payment=payment)
+
+
+# ── Digest ──────────────────────────────────────────────────────────
+def _format_time(value) -> str:
+    return timezone.localtime(value).strftime("%Y-%m-%d %H:%M")
+
+
+def build_payment_digest(since, until) -> Optional[Tuple[str, str]]:
+    """Return (subject, body) summarising payments created in [since, until),
+    or None when there were none."""
+    from .models import Payment
+
+    rows = list(
+        Payment.objects.filter(created_at__gte=since, created_at__lt=until)
+        .values("payment_type", "method")
+        .annotate(count=Count("id"), total=Sum("amount"))
+        .order_by("payment_type", "method")
+    )
+    if not rows:
+        return None
+
+    count = sum(row["count"] for row in rows)
+    total = sum((row["total"] for row in rows), Decimal(0))
+    by_type, by_method = {}, {}
+    for row in rows:
+        for group, key in ((by_type, row["payment_type"]), (by_method, row["method"])):
+            entry = group.setdefault(key or "N/A", [0, Decimal(0)])
+            entry[0] += row["count"]
+            entry[1] += row["total"]
+
+    pending = Payment.objects.filter(payment_approved=False)
+    pending_count = pending.count()
+    pending_rows = (
+        pending.select_related("user")
+        .order_by("created_at", "id")
+        .only("transaction_id", "amount", "payment_type", "method", "created_at", "user__name", "user__phone")
+        [:DIGEST_PENDING_ROWS]
+    )
+
+    lines = [
+        "Payments recorded at RBHS Reunion",
+        f"from {_format_time(since)} to {_format_time(until)}.",
+        "",
+        f"New payments: {count}, total {total:.2f}",
+        "",
+        "By type:",
+        *(f"- {key}: {n} payments, {amount:.2f}" for key, (n, amount) in by_type.items()),
+        "",
+        "By method:",
+        *(f"- {key}: {n} payments, {amount:.2f}" for key, (n, amount) in by_method.items()),
+        "",
+        f"Pending approvals: {pending_count}",
+    ]
+    if pending_count:
+        lines.append(f"{'Created':<17} {'Type':<13} {'Method':<7} {'Amount':>10}  {'Transaction ID':<20} Name / Phone")
+        for p in pending_rows:
+            lines.append(
+                f"{_format_time(p.created_at):<17} {p.payment_type or 'N/A':<13} {p.method or 'N/A':<7} "
+                f"{p.amount:>10}  {p.transaction_id:<20} {p.user.name or 'Unknown'} / {p.user.phone}"
+            )
+        if pending_count > DIGEST_PENDING_ROWS:
+            lines.append(f"... and {pending_count - DIGEST_PENDING_ROWS} more")
+
+    subject = f"Payment Digest: {count} new payments ({_format_time(until)})"
+    return subject, "\n".join(lines) + "\n"
+
+
+def _digest_window_end(now):
+    """End of the latest interval window that has closed and settled."""
+    interval = getattr(settings, "PAYMENT_DIGEST_INTERVAL", 15) * 60
+    settled = (now - timedelta(seconds=DIGEST_SETTLE_SECONDS)).timestamp()
+    return datetime.fromtimestamp(settled // interval * interval, tz=dt_timezone.utc)
+
+
+def queue_payment_digest(now=None):
+    """Queue the digest for windows closed since the last digest.
+
+    Windows are aligned to PAYMENT_DIGEST_INTERVAL, so any number of
+    outbox workers can call this: the unique digest_until column lets
+    exactly one of them queue each digest. Returns the queued EmailOutbox
+    row, or None.
+    """
+    from .models import EmailOutbox
+
+    if get_payment_email_mode() != DIGEST:
+        return None
+    until = _digest_window_end(now or timezone.now())
+    last = (
+        EmailOutbox.objects.filter(digest_until__isnull=False)
+        .order_by("-digest_until").values_list("digest_until", flat=True).first()
+    )
+    if last is not None and last >= until:
+        return None
+    interval = timedelta(minutes=getattr(settings, "PAYMENT_DIGEST_INTERVAL", 15))
+    since = last if last is not None else until - interval
+
+    digest = build_payment_digest(since, until)
+    if digest is None:
+        # Nothing new; the next digest starts from the last one anyway
+        return None
+    subject, body = digest
+    try:
+        with transaction.atomic():
+            return queue_email(subject, body, [ADMIN_EMAIL], digest_until=until)
+    except IntegrityError:
+        # Another worker queued this window first
+        return None
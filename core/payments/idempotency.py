@@ -0,0 +1,80 @@
+"""
+Idempotency-Key support for payment submission.
+
+A client sends the same Idempotency-Key header on every retry of one
+submission. The first request claims the key inside its transaction;
+its response is stored with it when it commits. Retries (including ones
+racing the first request, which wait on the unique index) get the stored
+response back with Idempotent-Replayed: true. Reusing a key for a
+different request body is rejected with 422.
+"""
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+
+def get_key(request):
+    key = (request.headers.get(HEADER) or '').strip()
+    return key[:MAX_KEY_LENGTH] or None
+
+
+def request_fingerprint(data):
+    raw = json.dumps(data, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def _expired(record):
+    ttl = getattr(settings, 'PAYMENT_IDEMPOTENCY_TTL', 24 * 3600)
+    return record.created_at < timezone.now() - timedelta(seconds=ttl)
+
+
+def replay(record, fingerprint):
+    """Response for a request that reuses an existing key."""
+    if record.request_hash != fingerprint:
+        return Response(
+            {"detail": f"{HEADER} was already used for a different request."},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+    return Response(record.response, status=record.status_code, headers={'Idempotent-Replayed': 'true'})
+
+
+def claim(user, key, fingerprint):
+    """
+    Claim `key` for this request. Returns (record, None) when the request
+    should run, or (None, response) with the replayed response. Must be
+    called inside the request's transaction.
+    """
+    record = IdempotencyKey.objects.filter(user=user, key=key).first()
+    if record is not None:
+        if not _expired(record):
+            return None, replay(record, fingerprint)
+        record.delete()
+    try:
+        with transaction.atomic():
+            record = IdempotencyKey.objects.create(user=user, key=key, request_hash=fingerprint)
+    except IntegrityError:
+        # A concurrent request with this key committed first
+        record = IdempotencyKey.objects.get(user=user, key=key)
+        return None, replay(record, fingerprint)
+    return record, None
+
+
+def store(record, response):
+    """Save the final response for replays (server errors are not stored)."""
+    if record is None or response.status_code >= 500:
+        return response
+    record.status_code = response.status_code
+    record.response = response.data
+    record.save(update_fields=['status_code', 'response'])
+    return response
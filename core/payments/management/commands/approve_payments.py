@@ -0,0 +1,50 @@
+from datetime import datetime, time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime, parse_date
+
+from payments.approvals import approve_payments
+from payments.models import Payment
+
+
+class Command(BaseCommand):
+    help = "Bulk approve pending payments and create the missing tickets in one transaction."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ids', nargs='+', type=int, help="Only approve these payment ids.")
+        parser.add_argument('--type', dest='payment_type', choices=[c[0] for c in Payment.PAYMENT_TYPE_CHOICES])
+        parser.add_argument('--method', choices=[c[0] for c in Payment.METHOD_CHOICES])
+        parser.add_argument('--created-before', help="Only payments created before this date/datetime (ISO format).")
+        parser.add_argument('--dry-run', action='store_true', help="Only report how many payments would be approved.")
+
+    def handle(self, *args, **options):
+        queryset = Payment.objects.filter(payment_approved=False)
+        if options['ids']:
+            queryset = queryset.filter(id__in=options['ids'])
+        if options['payment_type']:
+            queryset = queryset.filter(payment_type=options['payment_type'])
+        if options['method']:
+            queryset = queryset.filter(method=options['method'])
+        if options['created_before']:
+            value = options['created_before']
+            try:
+                cutoff = parse_datetime(value)
+                if cutoff is None:
+                    day = parse_date(value)
+                    cutoff = day and datetime.combine(day, time.min)
+            except ValueError:
+                cutoff = None
+            if cutoff is None:
+                raise CommandError(f"Invalid --created-before value: {value}")
+            # A bare date means midnight in the project time zone
+            if timezone.is_naive(cutoff):
+                cutoff = timezone.make_aware(cutoff)
+            queryset = queryset.filter(created_at__lt=cutoff)
+
+        if options['dry_run']:
+            self.stdout.write(f"{queryset.count()} pending payments match; nothing approved (dry run).")
+            return
+
+        result = approve_payments(queryset)
+        self.stdout.write(self.style.SUCCESS(result.summary()))
@@ -0,0 +1,52 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, close_old_connections
+
+from payments.outbox import OutboxWorker, outbox_stats
+
+
+class Command(BaseCommand):
+    help = "Send queued emails from the outbox over one SMTP connection (runs until stopped)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Send everything that is due and exit.")
+        parser.add_argument('--batch-size', type=int, help="Emails per batch (default EMAIL_OUTBOX_BATCH_SIZE).")
+        parser.add_argument('--interval', type=float, default=5.0, help="Seconds to wait when nothing is due.")
+        parser.add_argument('--stats', action='store_true', help="Print outbox backlog and lag, then exit.")
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            stats = outbox_stats()
+            for key in ('pending', 'sending', 'due', 'retrying', 'failed', 'sent_last_hour',
+                        'oldest_pending', 'lag_seconds'):
+                self.stdout.write(f"{key}: {stats[key]}")
+            return
+
+        worker = OutboxWorker()
+        try:
+            self._run(worker, options)
+        finally:
+            worker.close()
+
+    def _run(self, worker, options):
+        while True:
+            try:
+                sent, failed = worker.drain_once(options['batch_size'])
+            except DatabaseError as e:
+                if options['once']:
+                    raise CommandError(f"Outbox drain failed: {e}")
+                self.stderr.write(f"Outbox drain failed, retrying: {e}")
+                close_old_connections()
+                time.sleep(options['interval'])
+                continue
+
+            if sent or failed:
+                self.stdout.write(f"sent {sent}, failed {failed}")
+                continue
+            if options['once']:
+                self.stdout.write(self.style.SUCCESS("Outbox drained."))
+                return
+            # Let the SMTP connection go while idle; it is reopened on demand
+            worker.close()
+            time.sleep(options['interval'])
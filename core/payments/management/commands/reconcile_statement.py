@@ -0,0 +1,47 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from payments.models import Payment
+from payments.reconciliation import StatementError, reconcile_file
+
+
+class Command(BaseCommand):
+    help = "Match a bKash/Nagad statement CSV against pending payments and approve the matches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('statement', help="Path to the provider statement (CSV).")
+        parser.add_argument('--method', choices=[c[0] for c in Payment.METHOD_CHOICES],
+                            help="Provider of the statement; also reports pending payments missing from it.")
+        parser.add_argument('--report', help="Write mismatches to this CSV file ('-' for stdout).")
+        parser.add_argument('--trx-column', help="Header of the transaction id column, if not detected.")
+        parser.add_argument('--amount-column', help="Header of the amount column, if not detected.")
+        parser.add_argument('--phone-column', help="Header of the sender number column, if not detected.")
+        parser.add_argument('--no-phone-check', action='store_true', help="Match on transaction id and amount only.")
+        parser.add_argument('--encoding', default='utf-8-sig')
+        parser.add_argument('--dry-run', action='store_true', help="Report only; approve nothing.")
+
+    def handle(self, *args, **options):
+        try:
+            result = reconcile_file(
+                options['statement'],
+                encoding=options['encoding'],
+                trx_column=options['trx_column'],
+                amount_column=options['amount_column'],
+                phone_column=options['phone_column'],
+                method=options['method'],
+                check_phone=not options['no_phone_check'],
+                dry_run=options['dry_run'],
+            )
+        except (OSError, StatementError) as e:
+            raise CommandError(str(e))
+
+        if options['report'] == '-':
+            result.write_report(sys.stdout)
+        elif options['report']:
+            with open(options['report'], 'w', newline='') as f:
+                result.write_report(f)
+
+        if options['dry_run']:
+            self.stdout.write(f"{len(result.matched_ids)} payments match; nothing approved (dry run).")
+        self.stdout.write(self.style.SUCCESS(result.summary()))
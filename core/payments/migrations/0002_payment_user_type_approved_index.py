@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-19 05:23
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['user', 'payment_type', 'payment_approved'], name='payment_user_type_approved'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-19 05:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0003_email_outbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='emailoutbox',
+            name='digest_until',
+            field=models.DateTimeField(blank=True, null=True, unique=True),
+        ),
+    ]
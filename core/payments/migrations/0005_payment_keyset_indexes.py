@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-19 05:53
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0004_email_outbox_digest'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='payment_user_created'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(condition=models.Q(('payment_approved', False)), fields=['created_at', 'id'], name='payment_pending_created'),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.7 on 2026-10-19 05:55
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def check_single_registration(apps, schema_editor):
+    """Fail with the offending users instead of a bare IntegrityError."""
+    Payment = apps.get_model('payments', 'Payment')
+    duplicates = list(
+        Payment.objects.filter(payment_type='registration')
+        .values('user_id').annotate(n=Count('id')).filter(n__gt=1)
+        .order_by('user_id').values_list('user_id', 'n')
+    )
+    if duplicates:
+        listing = ', '.join(f"user {user_id} ({n} payments)" for user_id, n in duplicates[:50])
+        more = f" and {len(duplicates) - 50} more" if len(duplicates) > 50 else ''
+        raise RuntimeError(
+            f"Cannot add payment_one_registration_per_user: {len(duplicates)} users have more than "
+            f"one registration payment: {listing}{more}. Keep one registration payment per user "
+            f"(e.g. change the extra ones to payment_type='donation' or delete them in the admin), "
+            f"then run migrate again."
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0005_payment_keyset_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdempotencyKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=255)),
+                ('request_hash', models.CharField(max_length=64)),
+                ('status_code', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('response', models.JSONField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.RunPython(check_single_registration, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='payment',
+            constraint=models.UniqueConstraint(condition=models.Q(('payment_type', 'registration')), fields=('user',), name='payment_one_registration_per_user'),
+        ),
+        migrations.AddField(
+            model_name='idempotencykey',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddConstraint(
+            model_name='idempotencykey',
+            constraint=models.UniqueConstraint(fields=('user', 'key'), name='idempotency_user_key'),
+        ),
+    ]
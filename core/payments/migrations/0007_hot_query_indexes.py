@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-19 05:57
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0006_idempotency_and_registration_constraint'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['payment_type', 'payment_approved', 'user'], name='payment_type_approved_user'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['created_at'], name='payment_created'),
+        ),
+    ]
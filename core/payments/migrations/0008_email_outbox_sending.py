@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-19 06:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0007_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='emailoutbox',
+            name='status',
+            field=models.CharField(choices=[('pending', 'pending'), ('sending', 'sending'), ('sent', 'sent'), ('failed', 'failed')], default='pending', max_length=10),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.7 on 2026-10-19 06:30
+
+import django.db.models.functions.text
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0008_email_outbox_sending'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(django.db.models.functions.text.Upper(django.db.models.functions.text.Trim('transaction_id')), name='payment_trx_normalized'),
+        ),
+    ]
@@ -1,11 +1,23 @@
-from django.db import models
+from django.db import models, router, transaction
+from django.db.models.functions import Trim, Upper
+from django.utils import timezone
 from accounts.models import User  # make sure this path is correct
 
+def normalized_transaction_id():
+    """
+    Key statement reconciliation matches on: upper case, surrounding spaces
+    removed. reconciliation.normalize_transaction_id() is the same rule in
+    Python; change both together.
+    """
+    return Upper(Trim('transaction_id'))
+
+
 class Payment(models.Model):
     METHOD_CHOICES = [('bkash','bkash'),('nagad','nagad')]
     PAYMENT_TYPE_CHOICES = [('registration','registration'),('donation','donation')]
 
-    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='payments')
+    # No separate index: payment_user_type_approved and payment_user_created lead with user
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='payments', db_index=False)
     phone = models.CharField(max_length=20, null=True, blank=True)
     transaction_id = models.CharField(max_length=255, unique=True)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
@@ -14,5 +26,87 @@ class Payment(models.Model):
     payment_approved = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Gate phone checks / roster: "does this user have an approved registration?"
+            models.Index(fields=['user', 'payment_type', 'payment_approved'], name='payment_user_type_approved'),
+            # Stats views: "approved registrations / donations" (covers user_id, no table lookups)
+            models.Index(fields=['payment_type', 'payment_approved', 'user'], name='payment_type_approved_user'),
+            # Digest windows and date-ordered admin listings
+            models.Index(fields=['created_at'], name='payment_created'),
+            # Keyset pagination: payment history per user, approval queue oldest first
+            models.Index(fields=['user', '-created_at', '-id'], name='payment_user_created'),
+            models.Index(fields=['created_at', 'id'], name='payment_pending_created',
+                         condition=models.Q(payment_approved=False)),
+            # Statement reconciliation looks payments up by the normalised transaction id
+            models.Index(normalized_transaction_id(), name='payment_trx_normalized'),
+        ]
+        constraints = [
+            # One registration payment per user, enforced by the database
+            models.UniqueConstraint(fields=['user'], condition=models.Q(payment_type='registration'),
+                                    name='payment_one_registration_per_user'),
+        ]
+
     def __str__(self):
         return f"{self.user.name} - {self.transaction_id} - ({self.payment_type}) - {self.payment_approved}"
+
+    def save(self, *args, **kwargs):
+        # One transaction from pre_save to post_save: stats.signals locks the
+        # stored row in pre_save and applies its delta in post_save
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using, savepoint=False):
+            super().save(*args, **kwargs)
+
+
+class EmailOutbox(models.Model):
+    """
+    Emails waiting to be sent. Rows are written in the same transaction as
+    the change they report and sent later by `manage.py drain_email_outbox`,
+    so no request ever waits on SMTP.
+    """
+    STATUS_CHOICES = [('pending', 'pending'), ('sending', 'sending'), ('sent', 'sent'), ('failed', 'failed')]
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=255, blank=True)
+    recipients = models.JSONField(default=list)
+    payment = models.ForeignKey(Payment, null=True, blank=True, on_delete=models.SET_NULL, related_name='emails')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    # While status is 'sending': when the worker's lease on the row expires
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    # Payment digests only: end of the window the digest covers (one digest per window)
+    digest_until = models.DateTimeField(null=True, blank=True, unique=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_status_next_attempt'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} ({self.status})"
+
+
+class IdempotencyKey(models.Model):
+    """
+    Stored response of a POST made with an Idempotency-Key header, so a
+    client retrying the same request gets the same answer instead of a
+    second payment or an error.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    key = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='idempotency_user_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} - {self.key}"
@@ -0,0 +1,161 @@
+"""
+Email outbox worker.
+
+Each batch goes through three steps, and no transaction or row lock is
+held while talking to SMTP:
+
+1. claim: a short transaction picks due rows (SELECT ... FOR UPDATE SKIP
+   LOCKED where supported), marks them 'sending' with a lease of
+   EMAIL_OUTBOX_LEASE seconds in next_attempt_at, bumps attempts, commits;
+2. send: the claimed emails go out over one SMTP connection that stays
+   open between batches;
+3. record: a second short transaction writes each outcome back.
+
+Delivery is at-least-once: rows of a worker that dies mid-batch stay
+'sending' until their lease expires, then another worker claims them
+again. The outcome write is fenced on the attempt number, so a worker
+whose lease ran out cannot overwrite the newer claim. Failed sends are
+retried with exponential backoff until EMAIL_OUTBOX_MAX_ATTEMPTS, then
+marked failed. In digest mode (PAYMENT_EMAIL_MODE) each drain also queues
+the payment digest once its window has closed.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import Count, Min, Q
+from django.utils import timezone
+
+from .email import queue_payment_digest
+from .models import EmailOutbox
+
+logger = logging.getLogger(__name__)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def retry_delay(attempts):
+    """Backoff before the next attempt: base * 2^(attempts-1), capped."""
+    base = _setting('EMAIL_OUTBOX_RETRY_BASE', 30)
+    cap = _setting('EMAIL_OUTBOX_RETRY_MAX', 3600)
+    return timedelta(seconds=min(base * 2 ** max(attempts - 1, 0), cap))
+
+
+class OutboxWorker:
+    """Drains the outbox over one persistent SMTP connection."""
+
+    def __init__(self, connection=None):
+        self._connection = connection
+        self._owns_connection = connection is None
+
+    def connection(self):
+        if self._connection is None:
+            self._connection = get_connection(fail_silently=False)
+        # open() is a no-op while the connection is already open
+        self._connection.open()
+        return self._connection
+
+    def _drop_connection(self):
+        if self._connection is not None:
+            try:
+                self._connection.close()
+            except Exception:
+                pass
+            if self._owns_connection:
+                self._connection = None
+
+    def close(self):
+        self._drop_connection()
+
+    def claim(self, batch_size):
+        """Lease up to `batch_size` due rows (including expired leases) and commit."""
+        with transaction.atomic():
+            now = timezone.now()
+            rows = list(
+                EmailOutbox.objects.select_for_update(skip_locked=True)
+                .filter(status__in=['pending', 'sending'], next_attempt_at__lte=now)
+                .order_by('next_attempt_at', 'id')[:batch_size]
+            )
+            lease_until = now + timedelta(seconds=_setting('EMAIL_OUTBOX_LEASE', 300))
+            for row in rows:
+                row.status = 'sending'
+                row.attempts += 1
+                row.next_attempt_at = lease_until
+            EmailOutbox.objects.bulk_update(rows, ['status', 'attempts', 'next_attempt_at'])
+        return rows
+
+    def send(self, row):
+        """Send one claimed row; returns the error, or None on success."""
+        message = EmailMessage(
+            subject=row.subject,
+            body=row.body,
+            from_email=row.from_email or None,
+            to=row.recipients,
+        )
+        try:
+            message.connection = self.connection()
+            message.send()
+        except Exception as e:
+            logger.warning("Outbox email %s failed (attempt %d): %s", row.pk, row.attempts, e)
+            # The connection may be broken; reconnect for the next row
+            self._drop_connection()
+            return e
+        return None
+
+    def record(self, outcomes):
+        """
+        Write back (row, error) outcomes in one short transaction; returns
+        (sent, failed). Rows claimed again since (higher attempt number) are
+        left to the newer claim.
+        """
+        max_attempts = _setting('EMAIL_OUTBOX_MAX_ATTEMPTS', 8)
+        sent = failed = 0
+        with transaction.atomic():
+            for row, error in outcomes:
+                if error is None:
+                    changes = {'status': 'sent', 'sent_at': timezone.now(), 'last_error': ''}
+                    sent += 1
+                elif row.attempts >= max_attempts:
+                    changes = {'status': 'failed', 'last_error': str(error)[:2000]}
+                    failed += 1
+                else:
+                    changes = {
+                        'status': 'pending',
+                        'next_attempt_at': timezone.now() + retry_delay(row.attempts),
+                        'last_error': str(error)[:2000],
+                    }
+                    failed += 1
+                EmailOutbox.objects.filter(
+                    pk=row.pk, status='sending', attempts=row.attempts
+                ).update(**changes)
+        return sent, failed
+
+    def drain_once(self, batch_size=None):
+        """Send one batch of due emails; returns (sent, failed)."""
+        queue_payment_digest()
+        rows = self.claim(batch_size or _setting('EMAIL_OUTBOX_BATCH_SIZE', 50))
+        if not rows:
+            return 0, 0
+        return self.record([(row, self.send(row)) for row in rows])
+
+
+def outbox_stats():
+    """Outbox lag metrics: backlog size, oldest due email and its age."""
+    now = timezone.now()
+    unsent = Q(status__in=['pending', 'sending'])
+    stats = EmailOutbox.objects.aggregate(
+        pending=Count('id', filter=Q(status='pending')),
+        sending=Count('id', filter=Q(status='sending')),
+        due=Count('id', filter=unsent & Q(next_attempt_at__lte=now)),
+        retrying=Count('id', filter=Q(status='pending', attempts__gt=0)),
+        failed=Count('id', filter=Q(status='failed')),
+        sent_last_hour=Count('id', filter=Q(status='sent', sent_at__gte=now - timedelta(hours=1))),
+        oldest_pending=Min('created_at', filter=unsent),
+    )
+    oldest = stats['oldest_pending']
+    stats['lag_seconds'] = (now - oldest).total_seconds() if oldest else 0.0
+    return stats
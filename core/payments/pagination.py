@@ -0,0 +1,71 @@
+"""
+Keyset (cursor) pagination on (created_at, id).
+
+A page is "the next `limit` rows after this (created_at, id)", which an
+index on the same columns answers directly, without OFFSET scans or a
+COUNT(*). The cursor is the key of the last row of the previous page,
+encoded as an opaque URL-safe string.
+"""
+import base64
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(created_at, pk):
+    raw = f"{created_at.isoformat()}|{pk}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return (created_at, id) or raise InvalidCursor."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, pk = raw.split('|')
+        created_at = parse_datetime(created_at)
+        pk = int(pk)
+    except (ValueError, UnicodeDecodeError):
+        raise InvalidCursor("Invalid cursor.")
+    if created_at is None:
+        raise InvalidCursor("Invalid cursor.")
+    return created_at, pk
+
+
+def parse_limit(value, default=DEFAULT_LIMIT, maximum=MAX_LIMIT):
+    try:
+        return max(1, min(int(value), maximum))
+    except (TypeError, ValueError):
+        return default
+
+
+def keyset_page(queryset, limit, cursor=None, descending=True):
+    """
+    One page of `queryset` ordered by (created_at, id), newest first when
+    `descending`. Returns (rows, next_cursor); next_cursor is None on the
+    last page. Fetches limit + 1 rows to know whether another page exists.
+    """
+    if descending:
+        queryset = queryset.order_by('-created_at', '-id')
+    else:
+        queryset = queryset.order_by('created_at', 'id')
+    if cursor:
+        created_at, pk = decode_cursor(cursor)
+        if descending:
+            after = Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk)
+        else:
+            after = Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk)
+        queryset = queryset.filter(after)
+
+    rows = list(queryset[:limit + 1])
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(last.created_at, last.pk)
@@ -0,0 +1,281 @@
+"""
+Bulk reconciliation of bKash / Nagad statements against pending payments.
+
+A provider statement (CSV) is parsed once; payments are looked up with a
+handful of chunked `IN (...)` queries on the normalised transaction id,
+never one query per statement row. Each statement row ends up as:
+
+- matched: a pending payment with the same transaction id, amount and
+  sender phone; these are approved through approve_payments();
+- amount_mismatch / phone_mismatch / method_mismatch: found but disagreeing;
+- already_approved: the payment was approved before;
+- not_found: money received that no payment claims;
+- duplicate: the transaction id appears more than once in the statement.
+
+Pending payments of the statement's method that the statement does not
+contain are reported as not_in_statement.
+"""
+import csv
+import io
+import re
+import time
+from dataclasses import dataclass, field
+from decimal import Decimal, InvalidOperation
+from typing import Dict, List, Optional
+
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Coalesce
+
+from core.chunking import chunks
+from .approvals import approve_payments
+from .models import Payment, normalized_transaction_id
+
+MATCHED = 'matched'
+AMOUNT_MISMATCH = 'amount_mismatch'
+PHONE_MISMATCH = 'phone_mismatch'
+METHOD_MISMATCH = 'method_mismatch'
+ALREADY_APPROVED = 'already_approved'
+NOT_FOUND = 'not_found'
+DUPLICATE = 'duplicate'
+NOT_IN_STATEMENT = 'not_in_statement'
+INVALID = 'invalid'
+
+# Header names used by the providers' exports (compared case-insensitively)
+TRX_COLUMNS = ('trx id', 'trxid', 'transaction id', 'transaction_id', 'txn id', 'txnid')
+AMOUNT_COLUMNS = ('amount', 'transaction amount', 'amount (bdt)')
+PHONE_COLUMNS = ('sender', 'from', 'phone', 'sender number', 'customer', 'account', 'customer msisdn', 'msisdn')
+HEADER_SEARCH_ROWS = 20
+
+REPORT_FIELDS = ['status', 'line', 'transaction_id', 'statement_amount', 'statement_phone',
+                 'payment_id', 'payment_amount', 'payment_phone', 'payment_method', 'detail']
+
+
+class StatementError(ValueError):
+    """The statement cannot be read (no recognisable header)."""
+
+
+@dataclass
+class StatementRow:
+    line: int
+    transaction_id: str
+    amount: Optional[Decimal]
+    phone: str
+
+
+@dataclass
+class ReconciliationResult:
+    rows: int
+    counts: Dict[str, int] = field(default_factory=dict)
+    issues: List[dict] = field(default_factory=list)
+    matched_ids: List[int] = field(default_factory=list)
+    approved: int = 0
+    tickets_created: int = 0
+    seconds: float = 0.0
+
+    def summary(self) -> str:
+        counts = ', '.join(f"{status} {count}" for status, count in sorted(self.counts.items()))
+        return (
+            f"Reconciled {self.rows} statement rows in {self.seconds:.2f}s: {counts or 'nothing'}. "
+            f"Approved {self.approved} payments, created {self.tickets_created} tickets."
+        )
+
+    def write_report(self, out):
+        """Write the rows that need attention as CSV to the file object `out`."""
+        writer = csv.DictWriter(out, fieldnames=REPORT_FIELDS, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(self.issues)
+
+
+def normalize_transaction_id(value) -> str:
+    """
+    models.normalized_transaction_id() in Python: upper case, surrounding
+    spaces removed (SQL TRIM strips spaces only), inner characters kept.
+    """
+    return str(value or '').strip(' ').upper()
+
+
+def normalize_phone(value) -> str:
+    """Digits only, without the 88 country code; '*' kept for masked numbers."""
+    value = re.sub(r'[^0-9*]', '', str(value or ''))
+    if value.startswith('880'):
+        value = value[2:]
+    return value
+
+
+def phones_match(statement_phone, payment_phone) -> bool:
+    """Compare a (possibly masked, e.g. 017****5678) statement number."""
+    statement_phone = normalize_phone(statement_phone)
+    payment_phone = normalize_phone(payment_phone)
+    if not statement_phone:
+        # Statement without sender numbers: nothing to check
+        return True
+    if '*' not in statement_phone:
+        return statement_phone[-10:] == payment_phone[-10:]
+    if len(statement_phone) != len(payment_phone):
+        return False
+    return all(s == '*' or s == p for s, p in zip(statement_phone, payment_phone))
+
+
+def _parse_amount(value) -> Optional[Decimal]:
+    try:
+        return Decimal(re.sub(r'[^0-9.\-]', '', str(value or '')))
+    except InvalidOperation:
+        return None
+
+
+def _find_column(header, names, override=None):
+    lowered = [h.strip().lower() for h in header]
+    for name in ([override.lower()] if override else names):
+        if name in lowered:
+            return lowered.index(name)
+    return None
+
+
+def read_statement(file, trx_column=None, amount_column=None, phone_column=None) -> List[StatementRow]:
+    """
+    Parse a statement CSV (text file object). Provider exports often start
+    with a few lines of account details; the header is the first row that
+    has a transaction id column.
+    """
+    reader = csv.reader(file)
+    header = None
+    for line, row in enumerate(reader, start=1):
+        if _find_column(row, TRX_COLUMNS, trx_column) is not None:
+            header = row
+            break
+        if line >= HEADER_SEARCH_ROWS:
+            break
+    if header is None:
+        raise StatementError("No transaction id column found in the statement header.")
+
+    trx_index = _find_column(header, TRX_COLUMNS, trx_column)
+    amount_index = _find_column(header, AMOUNT_COLUMNS, amount_column)
+    phone_index = _find_column(header, PHONE_COLUMNS, phone_column)
+    if amount_index is None:
+        raise StatementError("No amount column found in the statement header.")
+
+    rows = []
+    for line, row in enumerate(reader, start=line + 1):
+        if len(row) <= max(trx_index, amount_index) or not row[trx_index].strip():
+            continue
+        rows.append(StatementRow(
+            line=line,
+            transaction_id=normalize_transaction_id(row[trx_index]),
+            amount=_parse_amount(row[amount_index]),
+            phone=row[phone_index].strip() if phone_index is not None and phone_index < len(row) else '',
+        ))
+    return rows
+
+
+def normalized_payments():
+    """
+    Payments annotated with `trx`, the normalised transaction id. The
+    expression is the payment_trx_normalized index's, so filtering on trx
+    is an index lookup, not a scan.
+    """
+    return Payment.objects.annotate(trx=normalized_transaction_id())
+
+
+def _payments_by_transaction_id(transaction_ids):
+    """One query per chunk of ids, keyed by the normalised transaction id."""
+    found = {}
+    for chunk in chunks(sorted(transaction_ids)):
+        rows = (
+            normalized_payments()
+            .filter(trx__in=chunk)
+            .values('id', 'trx', 'amount', 'method', 'payment_approved',
+                    payment_phone=Coalesce('phone', F('user__phone')))
+        )
+        for row in rows:
+            found[row['trx']] = row
+    return found
+
+
+def _issue(status, statement_row=None, payment=None, detail=''):
+    issue = {'status': status, 'detail': detail}
+    if statement_row is not None:
+        issue.update(
+            line=statement_row.line,
+            transaction_id=statement_row.transaction_id,
+            statement_amount=statement_row.amount,
+            statement_phone=statement_row.phone,
+        )
+    if payment is not None:
+        issue.update(
+            payment_id=payment['id'],
+            payment_amount=payment['amount'],
+            payment_phone=payment['payment_phone'],
+            payment_method=payment['method'],
+        )
+        issue.setdefault('transaction_id', payment['trx'])
+    return issue
+
+
+def reconcile(statement_rows, method=None, check_phone=True, dry_run=False) -> ReconciliationResult:
+    """
+    Match parsed statement rows against payments and approve the matches
+    (unless dry_run). `method` ('bkash' / 'nagad') flags payments recorded
+    with another method and enables the not_in_statement report.
+    """
+    started = time.perf_counter()
+    result = ReconciliationResult(rows=len(statement_rows))
+
+    def add(status, *args, **kwargs):
+        result.counts[status] = result.counts.get(status, 0) + 1
+        if status != MATCHED:
+            result.issues.append(_issue(status, *args, **kwargs))
+
+    payments = _payments_by_transaction_id({row.transaction_id for row in statement_rows})
+    seen = set()
+    for row in statement_rows:
+        payment = payments.get(row.transaction_id)
+        if row.transaction_id in seen:
+            add(DUPLICATE, row, payment)
+            continue
+        seen.add(row.transaction_id)
+
+        if row.amount is None:
+            add(INVALID, row, payment, detail='unreadable amount')
+        elif payment is None:
+            add(NOT_FOUND, row)
+        elif payment['payment_approved']:
+            add(ALREADY_APPROVED, row, payment)
+        elif method and payment['method'] and payment['method'] != method:
+            add(METHOD_MISMATCH, row, payment, detail=f"statement is {method}")
+        elif payment['amount'] != row.amount:
+            add(AMOUNT_MISMATCH, row, payment, detail=f"difference {row.amount - payment['amount']}")
+        elif check_phone and not phones_match(row.phone, payment['payment_phone']):
+            add(PHONE_MISMATCH, row, payment)
+        else:
+            add(MATCHED, row, payment)
+            result.matched_ids.append(payment['id'])
+
+    if method:
+        # Pending payments are few compared with statement rows: one query
+        missing = (
+            normalized_payments().filter(payment_approved=False, method=method)
+            .values('id', 'trx', 'amount', 'method', payment_phone=Coalesce('phone', F('user__phone')))
+            .order_by('created_at')
+        )
+        for payment in missing:
+            if payment['trx'] not in seen:
+                add(NOT_IN_STATEMENT, payment=payment)
+
+    if result.matched_ids and not dry_run:
+        with transaction.atomic():
+            for chunk in chunks(result.matched_ids):
+                approval = approve_payments(Payment.objects.filter(id__in=chunk))
+                result.approved += approval.approved
+                result.tickets_created += approval.tickets_created
+
+    result.seconds = time.perf_counter() - started
+    return result
+
+
+def reconcile_file(path, encoding='utf-8-sig', **options) -> ReconciliationResult:
+    """Read a statement CSV from `path` and reconcile it."""
+    column_options = {key: options.pop(key) for key in ('trx_column', 'amount_column', 'phone_column') if key in options}
+    with io.open(path, newline='', encoding=encoding) as f:
+        rows = read_statement(f, **column_options)
+    return reconcile(rows, **options)
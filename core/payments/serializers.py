@@ -6,6 +6,8 @@ class PaymentSerializer(serializers.ModelSerializer):
         model = Payment
         fields = "__all__"
         read_only_fields = ['user', 'payment_approved','created_at']
+        # Uniqueness is enforced by the database constraint (see PaymentListCreateView.post)
+        extra_kwargs = {'transaction_id': {'validators': []}}
         
     def validate(self, attrs):
         required_fields = ['phone', 'transaction_id', 'payment_type', 'amount']
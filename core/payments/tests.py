@@ -1,3 +1,499 @@
-from django.test import TestCase
+import io
+from datetime import datetime, timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import Permission
+from django.core import mail
+from django.core.management import call_command
+from django.db import IntegrityError, connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from accounts.models import User
+from core.query_plans import IndexPlanTestCase
+from tickets.models import Ticket
+from .approvals import approve_payments
+from .email import _digest_window_end, queue_payment_digest
+from .models import EmailOutbox, IdempotencyKey, Payment
+from .outbox import OutboxWorker, outbox_stats
+from .reconciliation import normalized_payments, read_statement, reconcile
+from .views import is_duplicate_transaction_id
+
+
+@override_settings(GATE_SCAN_LOG_ENABLED=False)
+class EmailOutboxTests(TestCase):
+    """Payment notifications go through the outbox, never SMTP on the request path."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(phone='01711111111', password='x', name='Guest One', batch='2019')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_payment(self):
+        return self.client.post('/api/payment/get-create/', {
+            'phone': '01711111111', 'transaction_id': 'TX1', 'amount': '500',
+            'payment_type': 'registration', 'method': 'bkash',
+        })
+
+    def test_payment_queues_email_without_sending(self):
+        response = self.create_payment()
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(mail.outbox), 0)
+        email = EmailOutbox.objects.get()
+        self.assertEqual(email.status, 'pending')
+        self.assertEqual(email.payment_id, response.data['id'])
+        self.assertIn('TX1', email.body)
+
+    def test_failed_payment_queues_nothing(self):
+        self.create_payment()
+        EmailOutbox.objects.all().delete()
+        response = self.create_payment()
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(EmailOutbox.objects.exists())
+
+    def test_drain_sends_and_marks_sent(self):
+        self.create_payment()
+        sent, failed = OutboxWorker().drain_once()
+        self.assertEqual((sent, failed), (1, 0))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].subject, 'New Registration Payment Received')
+        email = EmailOutbox.objects.get()
+        self.assertEqual(email.status, 'sent')
+        self.assertIsNotNone(email.sent_at)
+        self.assertEqual(OutboxWorker().drain_once(), (0, 0))
+
+    @override_settings(EMAIL_OUTBOX_RETRY_BASE=30, EMAIL_OUTBOX_MAX_ATTEMPTS=2)
+    def test_failure_backs_off_then_gives_up(self):
+        self.create_payment()
+        worker = OutboxWorker()
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=OSError('down')), \
+                self.assertLogs('payments.outbox', 'WARNING'):
+            self.assertEqual(worker.drain_once(), (0, 1))
+            email = EmailOutbox.objects.get()
+            self.assertEqual((email.status, email.attempts, email.last_error), ('pending', 1, 'down'))
+            self.assertGreater(email.next_attempt_at, timezone.now() + timedelta(seconds=25))
+            # Not due yet
+            self.assertEqual(worker.drain_once(), (0, 0))
+
+            EmailOutbox.objects.update(next_attempt_at=timezone.now())
+            self.assertEqual(worker.drain_once(), (0, 1))
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), ('failed', 2))
+
+        stats = outbox_stats()
+        self.assertEqual((stats['pending'], stats['failed']), (0, 1))
+
+    def test_smtp_runs_outside_any_transaction(self):
+        self.create_payment()
+        depth = len(connection.savepoint_ids)
+        sends = []
+
+        def send_messages(messages):
+            # The claim is committed before SMTP is contacted
+            sends.append((len(connection.savepoint_ids), EmailOutbox.objects.values_list('status', 'attempts').get()))
+            return len(messages)
+
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=send_messages):
+            self.assertEqual(OutboxWorker().drain_once(), (1, 0))
+        self.assertEqual(sends, [(depth, ('sending', 1))])
+        self.assertEqual(EmailOutbox.objects.get().status, 'sent')
+
+    @override_settings(EMAIL_OUTBOX_LEASE=60)
+    def test_expired_lease_is_reclaimed(self):
+        self.create_payment()
+        # A worker claims the row and stalls before recording the outcome
+        stalled = OutboxWorker()
+        claimed = stalled.claim(10)
+        self.assertEqual(OutboxWorker().claim(10), [])
+        self.assertEqual(outbox_stats()['sending'], 1)
+
+        EmailOutbox.objects.update(next_attempt_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(OutboxWorker().drain_once(), (1, 0))
+        email = EmailOutbox.objects.get()
+        self.assertEqual((email.status, email.attempts), ('sent', 2))
+
+        # The stalled worker's late outcome does not overwrite the newer claim
+        stalled.record([(claimed[0], OSError('timed out'))])
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.last_error), ('sent', ''))
+
+
+@override_settings(GATE_SCAN_LOG_ENABLED=False, PAYMENT_EMAIL_MODE='digest',
+                   PAYMENT_DIGEST_INTERVAL=15, PAYMENT_LARGE_DONATION=5000)
+class PaymentDigestTests(TestCase):
+    """Digest mode: one summary per window, individual emails only for large donations."""
+
+    def setUp(self):
+        self.client = APIClient()
+        for i, (payment_type, amount, method) in enumerate([
+            ('registration', '500', 'bkash'),
+            ('registration', '500', 'nagad'),
+            ('donation', '1000', 'bkash'),
+            ('donation', '20000', 'bkash'),
+        ]):
+            user = User.objects.create_user(phone=f'0171111111{i}', password='x', name=f'Guest {i}')
+            self.client.force_authenticate(user)
+            response = self.client.post('/api/payment/get-create/', {
+                'phone': user.phone, 'transaction_id': f'TX{i}', 'amount': amount,
+                'payment_type': payment_type, 'method': method,
+            })
+            self.assertEqual(response.status_code, 201)
+        self.until = _digest_window_end(timezone.now())
+        Payment.objects.update(created_at=self.until - timedelta(minutes=5))
+
+    def test_only_large_donation_is_sent_individually(self):
+        email = EmailOutbox.objects.get()
+        self.assertEqual(email.subject, 'Large Donation: 20000.00')
+        self.assertEqual(email.payment.transaction_id, 'TX3')
+
+    def test_digest_summarises_window_once(self):
+        now = self.until + timedelta(minutes=1)
+        digest = queue_payment_digest(now=now)
+        self.assertEqual(digest.digest_until, self.until)
+        self.assertIn('New payments: 4, total 22000.00', digest.body)
+        self.assertIn('- registration: 2 payments, 1000.00', digest.body)
+        self.assertIn('- bkash: 3 payments, 21500.00', digest.body)
+        self.assertIn('Pending approvals: 4', digest.body)
+        self.assertIn('TX0', digest.body)
+
+        self.assertIsNone(queue_payment_digest(now=now))
+        # Later windows without payments queue nothing
+        self.assertIsNone(queue_payment_digest(now=now + timedelta(hours=1)))
+        self.assertEqual(EmailOutbox.objects.filter(digest_until__isnull=False).count(), 1)
+
+    def test_drain_sends_digest(self):
+        now = self.until + timedelta(minutes=1)
+        with mock.patch('payments.outbox.queue_payment_digest', lambda: queue_payment_digest(now=now)):
+            self.assertEqual(OutboxWorker().drain_once(), (2, 0))
+        self.assertEqual(sorted(m.subject.split(':')[0] for m in mail.outbox), ['Large Donation', 'Payment Digest'])
+
+
+@override_settings(GATE_SCAN_LOG_ENABLED=False)
+class PaymentExportTests(TestCase):
+    def test_export_streams_with_one_query(self):
+        admin_user = User.objects.create_superuser(phone='01900000000', password='x')
+        self.client.force_login(admin_user)
+        for i in range(5):
+            user = User.objects.create_user(phone=f'0171111111{i}', password='x', name=f'Guest {i}')
+            Payment.objects.create(user=user, transaction_id=f'TX{i}', amount=500, payment_type='registration')
+
+        response = self.client.post(reverse('admin:payments_payment_changelist'), {
+            'action': 'export_to_csv',
+            '_selected_action': list(Payment.objects.values_list('pk', flat=True)),
+        })
+        self.assertTrue(response.streaming)
+        with self.assertNumQueries(1):
+            content = b''.join(response.streaming_content).decode()
+        lines = content.splitlines()
+        self.assertTrue(lines[0].startswith('id,user,'))
+        self.assertEqual(len(lines), 6)
+
+
+STATEMENT = """Merchant statement
+Account,01800000000
+
+Date,Trx ID,Sender,Amount (BDT)
+2026-03-01 10:00,tx0,01711111110,500.00
+2026-03-01 10:01,TX1,8801711111111,"1,000.00"
+2026-03-01 10:02,TX2,01711111112,600
+2026-03-01 10:03,TX3,019****9999,500
+2026-03-01 10:04,TX9,01711111119,500
+2026-03-01 10:05,TX0,01711111110,500
+2026-03-01 10:06,TX5,017****1115,500
+"""
+
+
+@override_settings(GATE_SCAN_LOG_ENABLED=False)
+class BulkApprovalTests(TestCase):
+    """approve_payments flips pending rows in bulk and only creates missing tickets."""
+
+    def setUp(self):
+        self.payments = []
+        for i in range(4):
+            user = User.objects.create_user(phone=f'0171111111{i}', password='x')
+            self.payments.append(Payment.objects.create(
+                user=user, transaction_id=f'TX{i}', amount=500, payment_type='registration',
+            ))
+        # Ticket issued by hand before the payment was approved
+        self.existing = Ticket.objects.create(user=self.payments[0].user)
+        self.donation = Payment.objects.create(
+            user=self.payments[1].user, transaction_id='DON1', amount=1000, payment_type='donation',
+        )
+
+    def test_approval_is_idempotent(self):
+        result = approve_payments(Payment.objects.filter(id__in=[p.id for p in self.payments[:3]]))
+        self.assertEqual((result.selected, result.approved, result.already_approved), (3, 3, 0))
+        self.assertEqual(result.tickets_created, 2)
+        self.assertEqual(Ticket.objects.filter(user=self.payments[0].user).get(), self.existing)
+
+        result = approve_payments(Payment.objects.all())
+        self.assertEqual((result.selected, result.approved, result.already_approved), (5, 2, 3))
+        self.assertEqual(result.tickets_created, 1)
+        self.assertEqual(Ticket.objects.count(), 4)
+        for payment in self.payments:
+            self.assertEqual(Ticket.objects.filter(user=payment.user).count(), 1)
+
+        result = approve_payments(Payment.objects.all())
+        self.assertEqual((result.approved, result.already_approved, result.tickets_created), (0, 5, 0))
+
+    def test_command_dry_run_and_created_before(self):
+        cutoff = timezone.make_aware(datetime(2026, 3, 1))
+        Payment.objects.filter(id=self.payments[0].id).update(created_at=cutoff - timedelta(minutes=1))
+        # Just after midnight in the project time zone: not before the date
+        Payment.objects.exclude(id=self.payments[0].id).update(created_at=cutoff + timedelta(minutes=1))
+
+        out = io.StringIO()
+        call_command('approve_payments', '--created-before', '2026-03-01', '--dry-run', stdout=out)
+        self.assertIn('1 pending payments match', out.getvalue())
+        self.assertFalse(Payment.objects.filter(payment_approved=True).exists())
+
+        call_command('approve_payments', '--created-before', '2026-03-01', '--type', 'registration', stdout=out)
+        self.assertEqual(
+            list(Payment.objects.filter(payment_approved=True).values_list('id', flat=True)),
+            [self.payments[0].id],
+        )
+
+    def test_admin_action_requires_change_permission(self):
+        staff = User.objects.create_user(phone='01900000001', password='x', is_staff=True)
+        staff.user_permissions.add(Permission.objects.get(codename='view_payment'))
+        self.client.force_login(staff)
+        url = reverse('admin:payments_payment_changelist')
+        selected = [p.id for p in self.payments]
+
+        self.client.post(url, {'action': 'approve_selected', '_selected_action': selected})
+        self.assertFalse(Payment.objects.filter(payment_approved=True).exists())
+
+        staff.user_permissions.add(Permission.objects.get(codename='change_payment'))
+        self.client.post(url, {'action': 'approve_selected', '_selected_action': selected})
+        self.assertEqual(Payment.objects.filter(payment_approved=True).count(), 4)
+
+
+@override_settings(GATE_SCAN_LOG_ENABLED=False)
+class StatementReconciliationTests(TestCase):
+    def setUp(self):
+        self.payments = {}
+        for i, (amount, method, approved) in enumerate([
+            ('500', 'bkash', False),     # TX0 matches
+            ('1000', 'bkash', False),    # TX1 matches (country code, thousands separator)
+            ('500', 'bkash', False),     # TX2 amount differs
+            ('500', 'bkash', False),     # TX3 masked phone differs
+            ('500', 'bkash', False),     # TX4 not on the statement
+            ('500', 'bkash', True),      # TX5 approved already
+        ]):
+            user = User.objects.create_user(phone=f'0171111111{i}', password='x')
+            self.payments[i] = Payment.objects.create(
+                user=user, phone=user.phone, transaction_id=f'TX{i}', amount=amount,
+                payment_type='registration', method=method, payment_approved=approved,
+            )
+
+    def test_reconcile_approves_matches_and_reports_the_rest(self):
+        rows = read_statement(io.StringIO(STATEMENT))
+        self.assertEqual(len(rows), 7)
+        with self.assertNumQueries(2):
+            result = reconcile(rows, method='bkash', dry_run=True)
+
+        self.assertEqual(result.counts, {
+            'matched': 2, 'amount_mismatch': 1, 'phone_mismatch': 1, 'not_found': 1,
+            'duplicate': 1, 'already_approved': 1, 'not_in_statement': 1,
+        })
+        self.assertEqual(sorted(result.matched_ids), [self.payments[0].id, self.payments[1].id])
+        self.assertFalse(Payment.objects.filter(id__in=result.matched_ids, payment_approved=True).exists())
+
+        result = reconcile(rows, method='bkash')
+        self.assertEqual(result.approved, 2)
+        self.assertEqual(Payment.objects.filter(payment_approved=True).count(), 3)
+        self.assertEqual(result.tickets_created, 2)
+
+        report = io.StringIO()
+        result.write_report(report)
+        lines = report.getvalue().splitlines()
+        self.assertTrue(lines[0].startswith('status,line,transaction_id'))
+        self.assertIn('not_in_statement', report.getvalue())
+        self.assertEqual(len(lines), 1 + 6)
+
+    def test_statement_and_database_normalise_alike(self):
+        user = User.objects.create_user(phone='01711111117', password='x')
+        padded = Payment.objects.create(user=user, phone=user.phone, transaction_id=' tx7 ', amount=500,
+                                        payment_type='registration', method='bkash')
+        rows = read_statement(io.StringIO(
+            "Trx ID,Sender,Amount\n"
+            " TX7 ,01711111117,500\n"
+            "T X1,01711111111,1000\n"
+        ))
+        self.assertEqual([row.transaction_id for row in rows], ['TX7', 'T X1'])
+        result = reconcile(rows, dry_run=True)
+        self.assertEqual(result.matched_ids, [padded.id])
+        # Inner spaces are not stripped on either side: no match with TX1
+        self.assertEqual(result.counts, {'matched': 1, 'not_found': 1})
+
+
+@override_settings(GATE_SCAN_LOG_ENABLED=False)
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(phone='01711111111', password='x')
+        created = timezone.now()
+        for i in range(7):
+            Payment.objects.create(user=self.user, transaction_id=f'TX{i}', amount=100, payment_type='donation')
+        # Ties on created_at are broken by id
+        Payment.objects.update(created_at=created)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_history_pages_by_key(self):
+        seen, cursor = [], None
+        for _ in range(3):
+            params = {'limit': 3}
+            if cursor:
+                params['cursor'] = cursor
+            response = self.client.get('/api/payment/get-create/', params)
+            self.assertEqual(response.status_code, 200)
+            seen += [row['transaction_id'] for row in response.data['results']]
+            cursor = response.data['next_cursor']
+        self.assertIsNone(cursor)
+        self.assertEqual(seen, [f'TX{i}' for i in reversed(range(7))])
+
+        # Without pagination parameters the full list is returned as before
+        response = self.client.get('/api/payment/get-create/')
+        self.assertEqual(len(response.data), 7)
+        self.assertEqual(self.client.get('/api/payment/get-create/', {'cursor': 'junk'}).status_code, 400)
+
+    def test_admin_approval_queue(self):
+        admin_user = User.objects.create_superuser(phone='01900000000', password='x')
+        self.client.force_login(admin_user)
+        url = reverse('admin:payments_payment_approval_queue')
+        with mock.patch('payments.admin.QUEUE_PAGE_SIZE', 5):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual([p.transaction_id for p in response.context['payments']], [f'TX{i}' for i in range(5)])
+            self.assertEqual(response.context['pending_count'], 7)
+
+            response = self.client.get(f"{url}?{response.context['next_query']}")
+            self.assertEqual([p.transaction_id for p in response.context['payments']], ['TX5', 'TX6'])
+            self.assertIsNone(response.context['next_query'])
+
+        ids = Payment.objects.filter(transaction_id__in=['TX0', 'TX1']).values_list('id', flat=True)
+        response = self.client.post(url, {'ids': list(ids)})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Payment.objects.filter(payment_approved=True).count(), 2)
+
+
+@override_settings(GATE_SCAN_LOG_ENABLED=False)
+class IdempotentSubmissionTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(phone='01711111111', password='x')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def post(self, transaction_id='TX1', payment_type='registration', key=None):
+        headers = {'Idempotency-Key': key} if key else {}
+        return self.client.post('/api/payment/get-create/', {
+            'phone': '01711111111', 'transaction_id': transaction_id, 'amount': '500',
+            'payment_type': payment_type, 'method': 'bkash',
+        }, headers=headers)
+
+    def test_retry_with_key_replays_stored_response(self):
+        first = self.post(key='abc')
+        self.assertEqual(first.status_code, 201)
+        # One SELECT; the other two are the view's atomic() savepoint inside TestCase
+        with self.assertNumQueries(3):
+            retry = self.post(key='abc')
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(retry.headers['Idempotent-Replayed'], 'true')
+        self.assertEqual(Payment.objects.count(), 1)
+        self.assertEqual(EmailOutbox.objects.count(), 1)
+
+        # Same key, different body
+        self.assertEqual(self.post(transaction_id='TX2', key='abc').status_code, 422)
+
+    def test_constraints_replace_read_then_write_checks(self):
+        self.assertEqual(self.post().status_code, 201)
+
+        response = self.post(transaction_id='TX2')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['detail'], 'You have already made a registration payment.')
+
+        response = self.post(payment_type='donation')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('transaction_id', response.data)
+
+        self.assertEqual(self.post(transaction_id='TX3', payment_type='donation').status_code, 201)
+        self.assertEqual(Payment.objects.count(), 2)
+
+    def test_violated_constraint_is_identified_by_name_not_message(self):
+        self.post()
+        # A message mentioning transaction_id from the registration constraint
+        cause = Exception('duplicate key value violates unique constraint')
+        cause.diag = mock.Mock(constraint_name='payment_one_registration_per_user')
+        error = IntegrityError('duplicate key (user_id, transaction_id)')
+        error.__cause__ = cause
+        self.assertFalse(is_duplicate_transaction_id(error, 'TX1'))
+
+        # No constraint name (SQLite): the existing row decides
+        error = IntegrityError('UNIQUE constraint failed')
+        self.assertTrue(is_duplicate_transaction_id(error, 'TX1'))
+        self.assertFalse(is_duplicate_transaction_id(error, 'TX9'))
+
+    def test_rejections_are_replayed_too(self):
+        self.post()
+        response = self.post(transaction_id='TX2', key='k2')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(IdempotencyKey.objects.get(key='k2').status_code, 400)
+        self.assertEqual(self.post(transaction_id='TX2', key='k2').headers['Idempotent-Replayed'], 'true')
+
+
+class PaymentIndexTests(IndexPlanTestCase):
+    @classmethod
+    def seed(cls, users):
+        Payment.objects.bulk_create([
+            Payment(user=user, transaction_id=f'TX{i}', amount=500, method='bkash',
+                    payment_type='registration' if i % 4 else 'donation',
+                    payment_approved=i % 10 != 0)
+            for i, user in enumerate(users)
+        ], batch_size=1000)
+        Payment.objects.update(created_at=timezone.now() - timedelta(days=1))
+
+    def test_stats_approved_payments(self):
+        self.assertUsesIndex(
+            Payment.objects.filter(payment_type='registration', payment_approved=True).values_list('user_id'),
+            'payment_type_approved_user',
+        )
+        self.assertUsesIndex(
+            Payment.objects.filter(payment_type='donation', payment_approved=True),
+            'payment_type_approved_user',
+        )
+
+    def test_payments_of_user(self):
+        # The composite indexes lead with user; there is no separate FK index
+        plan = Payment.objects.filter(user=self.user).explain()
+        self.assertRegex(plan, r'payment_user_(type_approved|created)')
+        self.assertNotIn('payments_payment_user_id', plan)
+
+    def test_gate_phone_check(self):
+        self.assertUsesIndex(
+            Payment.objects.filter(user=self.user, payment_type='registration', payment_approved=True),
+            'payment_user_type_approved',
+        )
+
+    def test_payment_history_and_approval_queue(self):
+        self.assertUsesIndex(
+            Payment.objects.filter(user=self.user).order_by('-created_at', '-id')[:20],
+            'payment_user_created',
+        )
+        self.assertUsesIndex(
+            Payment.objects.filter(payment_approved=False).order_by('created_at', 'id')[:100],
+            'payment_pending_created',
+        )
+        now = timezone.now()
+        self.assertUsesIndex(
+            Payment.objects.filter(created_at__gte=now - timedelta(minutes=15), created_at__lt=now),
+            'payment_created',
+        )
+
+    def test_statement_reconciliation_lookup(self):
+        self.assertUsesIndex(
+            normalized_payments().filter(trx__in=['TX1', 'TX20', 'TX300']),
+            'payment_trx_normalized',
+        )
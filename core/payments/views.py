@@ -3,25 +3,76 @@ from rest_framework.response import Response
 from rest_framework import status, permissions
 from .models import Payment
 from .serializers import PaymentSerializer
-from .email import send_email
-from django.db import transaction
+from . import idempotency
+from .email import queue_payment_email
+from .pagination import InvalidCursor, keyset_page, parse_limit
+from django.db import IntegrityError, transaction
 from tickets.models import Ticket
+
+
+def is_duplicate_transaction_id(error, transaction_id):
+    """
+    Whether an IntegrityError from saving a payment came from the unique
+    transaction id. PostgreSQL names the violated constraint, which settles
+    the registration case without a query; otherwise the existing row is
+    looked up.
+    """
+    diag = getattr(error.__cause__, 'diag', None)
+    if getattr(diag, 'constraint_name', None) == 'payment_one_registration_per_user':
+        return False
+    return Payment.objects.filter(transaction_id=transaction_id).exists()
+
+
 class PaymentListCreateView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self,request):
+        """
+        Endpoint: GET /api/payment/get-create/
 
-        try:
-            ticket = Payment.objects.filter(user=request.user).order_by('-created_at')
-            serializer = PaymentSerializer(ticket,many=True)
+        Without query parameters returns every payment of the user, newest
+        first. With ?limit=N (and ?cursor= from the previous page) returns
+        {"results": [...], "next_cursor": ...} using keyset pagination.
+        """
+        payments = Payment.objects.filter(user=request.user)
+        if 'limit' not in request.query_params and 'cursor' not in request.query_params:
+            serializer = PaymentSerializer(payments.order_by('-created_at', '-id'), many=True)
             return Response(serializer.data, status=status.HTTP_200_OK)
-        except Payment.DoesNotExist:
-            return Response({"detail": "No payments found for this user."}, status=status.HTTP_404_NOT_FOUND)
+
+        try:
+            rows, next_cursor = keyset_page(
+                payments,
+                parse_limit(request.query_params.get('limit')),
+                request.query_params.get('cursor'),
+            )
+        except InvalidCursor as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(
+            {"results": PaymentSerializer(rows, many=True).data, "next_cursor": next_cursor},
+            status=status.HTTP_200_OK,
+        )
 
 
 
     @transaction.atomic
     def post(self, request):
+        """
+        Endpoint: POST /api/payment/get-create/
+
+        Send an Idempotency-Key header to make retries safe: a repeated
+        request gets the stored response instead of creating anything.
+        """
+        record = None
+        key = idempotency.get_key(request)
+        if key:
+            record, replayed = idempotency.claim(
+                request.user, key, idempotency.request_fingerprint(request.data)
+            )
+            if replayed is not None:
+                return replayed
+        return idempotency.store(record, self.create_payment(request))
+
+    def create_payment(self, request):
         serializer = PaymentSerializer(data=request.data)
         if not serializer.is_valid():
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -29,19 +80,24 @@ class PaymentListCreateView(APIView):
         payment_type = serializer.validated_data.get("payment_type")
 
         try:
-            # --- Rule enforcement ---
-            if payment_type == "registration":
-                existing_registration = Payment.objects.filter(
-                    user=request.user, payment_type="registration"
-                ).exists()
-                if existing_registration:
+            # --- Create the payment ---
+            # Duplicate transaction ids and second registrations are
+            # rejected by unique constraints, not by reading first
+            try:
+                with transaction.atomic():
+                    payment = serializer.save(user=request.user)
+            except IntegrityError as e:
+                if is_duplicate_transaction_id(e, serializer.validated_data['transaction_id']):
+                    return Response(
+                        {"transaction_id": ["payment with this transaction id already exists."]},
+                        status=status.HTTP_400_BAD_REQUEST,
+                    )
+                if payment_type == "registration":
                     return Response(
                         {"detail": "You have already made a registration payment."},
                         status=status.HTTP_400_BAD_REQUEST,
                     )
-
-            # --- Create the payment ---
-            payment = serializer.save(user=request.user)
+                raise
 
             # If donation → update ticket
             if payment_type == "donation":
@@ -49,8 +105,8 @@ class PaymentListCreateView(APIView):
                 ticket.has_donation = True
                 ticket.save()
 
-            # Send notification email (do not block payment creation)
-            send_email(payment)
+            # Queue the notification; it is only sent if this transaction commits
+            queue_payment_email(payment)
 
             return Response(
                 PaymentSerializer(payment).data,
@@ -62,4 +118,4 @@ class PaymentListCreateView(APIView):
             return Response(
                 {"detail": f"Payment creation failed: {str(e)}"},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            )
\ No newline at end of file
+            )
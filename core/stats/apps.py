@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class StatsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'stats'
+
+    def ready(self):
+        import stats.signals
@@ -0,0 +1,90 @@
+"""
+Cached donation stats for the public donation endpoint.
+
+The total is a database SUM (exact Decimal) and the donor list is read
+once into a snapshot kept in the shared cache, so page views only slice
+it. The snapshot is keyed by a version number that is bumped (after
+commit) whenever a donation is created, approved, changed or deleted;
+a snapshot built while a change commits lands under the old version and
+is never served. Profile name / batch / image changes show up within
+DONATION_STATS_TTL seconds.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Sum
+
+VERSION_KEY = 'stats:donations:version'
+# Bump the prefix when the snapshot's fields change
+SNAPSHOT_KEY = 'stats:donations:v2:%s'
+# Longest leaderboard (?top=N) kept in the snapshot
+TOP_LIMIT = 100
+
+
+def donations():
+    from payments.models import Payment
+
+    return Payment.objects.filter(payment_type='donation', payment_approved=True)
+
+
+def _image_url(user):
+    if not getattr(user, 'profile_image', None):
+        return None
+    try:
+        return user.profile_image.url or None
+    except Exception:  # pragma: no cover - storage misconfigured
+        return None
+
+
+def build_snapshot():
+    """Totals, every donation newest first and the largest ones (two queries)."""
+    totals = donations().aggregate(total=Sum('amount'), count=Count('id'),
+                                   donors=Count('user', distinct=True))
+    rows = (
+        donations().select_related('user')
+        .only('amount', 'transaction_id', 'method', 'created_at',
+              'user__name', 'user__batch', 'user__profile_image')
+        .order_by('-created_at', '-id')
+    )
+    donation_list = [
+        {
+            "name": d.user.name,
+            "batch": d.user.batch,
+            "image": _image_url(d.user),
+            "amount": d.amount,
+            "transaction_id": d.transaction_id,
+            "method": d.method,
+        }
+        for d in rows
+    ]
+    return {
+        'total': totals['total'] or 0,
+        'count': totals['count'],
+        'donors': totals['donors'],
+        'donations': donation_list,
+        'top': sorted(donation_list, key=lambda d: d['amount'], reverse=True)[:TOP_LIMIT],
+    }
+
+
+def get_snapshot():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, 0, None)
+        version = cache.get(VERSION_KEY, 0)
+    key = SNAPSHOT_KEY % version
+    snapshot = cache.get(key)
+    if snapshot is None:
+        snapshot = build_snapshot()
+        cache.set(key, snapshot, getattr(settings, 'DONATION_STATS_TTL', 300))
+    return snapshot
+
+
+def invalidate():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.add(VERSION_KEY, 1, None)
+
+
+def on_commit_invalidate_donations():
+    transaction.on_commit(invalidate)
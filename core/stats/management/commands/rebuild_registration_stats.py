@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from stats.registration import compute, current, diff, rebuild
+
+
+class Command(BaseCommand):
+    help = "Recompute the registration stats table from payments and users, repairing any drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help="Only report drift; change nothing.")
+
+    def handle(self, *args, **options):
+        if options['check']:
+            drift = diff(current(), compute())
+        else:
+            drift = rebuild()
+
+        for (batch, gender), (was, now) in sorted(drift.items()):
+            self.stdout.write(f"{batch or 'N/A'} / {gender or 'unknown'}: stored {was}, actual {now}")
+        if not drift:
+            self.stdout.write(self.style.SUCCESS("Registration stats are up to date."))
+        elif options['check']:
+            self.stdout.write(self.style.WARNING(f"{len(drift)} rows drifted (not repaired: --check)."))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Repaired {len(drift)} rows."))
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.7 on 2026-10-19 06:00
+
+from django.db import migrations, models
+from django.db.models import Count, Exists, OuterRef
+
+
+def populate_registration_stats(apps, schema_editor):
+    User = apps.get_model('accounts', 'User')
+    Payment = apps.get_model('payments', 'Payment')
+    RegistrationStat = apps.get_model('stats', 'RegistrationStat')
+
+    counts = {}
+    rows = (
+        User.objects.filter(Exists(Payment.objects.filter(
+            user=OuterRef('pk'), payment_type='registration', payment_approved=True,
+        )))
+        .values('batch', 'gender').annotate(n=Count('id'))
+    )
+    for row in rows:
+        key = ((row['batch'] or '').strip(), row['gender'] or '')
+        counts[key] = counts.get(key, 0) + row['n']
+    RegistrationStat.objects.bulk_create([
+        RegistrationStat(batch=batch, gender=gender, count=count)
+        for (batch, gender), count in counts.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('accounts', '0005_user_indexes'),
+        ('payments', '0007_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RegistrationStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('batch', models.CharField(blank=True, default='', max_length=255)),
+                ('gender', models.CharField(blank=True, default='', max_length=10)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('batch', 'gender'), name='registration_stat_batch_gender')],
+            },
+        ),
+        migrations.RunPython(populate_registration_stats, migrations.RunPython.noop),
+    ]
@@ -1,3 +1,20 @@
 from django.db import models
 
-# Create your models here.
+
+class RegistrationStat(models.Model):
+    """
+    Number of users with an approved registration, per batch and gender.
+    Maintained by stats.registration on every change that affects it;
+    `manage.py rebuild_registration_stats` recomputes it from scratch.
+    """
+    batch = models.CharField(max_length=255, blank=True, default='')
+    gender = models.CharField(max_length=10, blank=True, default='')
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['batch', 'gender'], name='registration_stat_batch_gender'),
+        ]
+
+    def __str__(self):
+        return f"{self.batch or 'N/A'} / {self.gender or 'unknown'}: {self.count}"
@@ -0,0 +1,128 @@
+"""
+Incrementally maintained registration statistics (RegistrationStat).
+
+A user counts as registered while they have an approved registration
+payment. Every change to that state, or to a registered user's batch or
+gender, applies a +1/-1 delta to the matching (batch, gender) row in the
+same transaction as the change itself:
+
+- Payment saves and deletes (stats.signals, comparing with the stored
+  row, which one indexed read returns);
+- User saves that change batch or gender (stats.signals, using the
+  values loaded in post_init, so logins and profile edits cost nothing);
+- bulk approvals, which bypass signals (payments.approvals calls
+  count_registrations()).
+
+rebuild() recomputes the table from the source rows to repair drift.
+"""
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Exists, F, OuterRef
+
+from .models import RegistrationStat
+
+
+def stat_key(batch, gender):
+    return (batch or '').strip(), gender or ''
+
+
+def apply_deltas(deltas):
+    """Add {(batch, gender): delta} to the stats rows, creating missing rows."""
+    for (batch, gender), delta in sorted(deltas.items()):
+        if not delta:
+            continue
+        rows = RegistrationStat.objects.filter(batch=batch, gender=gender)
+        if rows.update(count=F('count') + delta):
+            continue
+        try:
+            with transaction.atomic():
+                RegistrationStat.objects.create(batch=batch, gender=gender, count=delta)
+        except IntegrityError:
+            # Created concurrently; the row exists now
+            rows.update(count=F('count') + delta)
+
+
+def count_registrations(user_ids, delta=1):
+    """Apply `delta` for each of these users (one grouped query)."""
+    if not user_ids:
+        return
+    from accounts.models import User
+
+    deltas = Counter()
+    rows = User.objects.filter(id__in=user_ids).values('batch', 'gender').annotate(n=Count('id'))
+    for row in rows:
+        deltas[stat_key(row['batch'], row['gender'])] += delta * row['n']
+    apply_deltas(deltas)
+
+
+def registered_users():
+    from accounts.models import User
+    from payments.models import Payment
+
+    return User.objects.filter(Exists(Payment.objects.filter(
+        user=OuterRef('pk'), payment_type='registration', payment_approved=True,
+    )))
+
+
+def compute():
+    """{(batch, gender): count} from the source tables."""
+    counts = Counter()
+    rows = registered_users().values('batch', 'gender').annotate(n=Count('id'))
+    for row in rows:
+        counts[stat_key(row['batch'], row['gender'])] += row['n']
+    return counts
+
+
+def current():
+    return {
+        (batch, gender): count
+        for batch, gender, count in RegistrationStat.objects.values_list('batch', 'gender', 'count')
+        if count
+    }
+
+
+def diff(stored, actual):
+    """{(batch, gender): (stored, actual)} for the rows that disagree."""
+    return {
+        key: (stored.get(key, 0), actual.get(key, 0))
+        for key in set(stored) | set(actual)
+        if stored.get(key, 0) != actual.get(key, 0)
+    }
+
+
+def rebuild():
+    """
+    Replace the stats table with freshly computed counts. Returns the
+    drift that was repaired as {(batch, gender): (stored, actual)}.
+    """
+    with transaction.atomic():
+        # Lock the existing rows so concurrent deltas wait for the rebuild
+        stored = {
+            (batch, gender): count
+            for batch, gender, count in RegistrationStat.objects.select_for_update()
+            .values_list('batch', 'gender', 'count')
+        }
+        actual = compute()
+        RegistrationStat.objects.all().delete()
+        RegistrationStat.objects.bulk_create([
+            RegistrationStat(batch=batch, gender=gender, count=count)
+            for (batch, gender), count in sorted(actual.items())
+        ])
+    return diff(stored, actual)
+
+
+def registration_stats():
+    """Response body of the registration stats endpoint, from one query."""
+    total = 0
+    by_batch, by_gender = Counter(), Counter()
+    for (batch, gender), count in current().items():
+        total += count
+        if batch:
+            by_batch[batch] += count
+        by_gender[gender or 'unknown'] += count
+    return {
+        "total_registered": total,
+        "batch_wise_count": dict(sorted(by_batch.items())),
+        "gender_count": dict(by_gender),
+    }
@@ -0,0 +1,80 @@
+# stats/signals.py
+from django.db.models.signals import post_init, pre_save, post_save, pre_delete, post_delete
+from django.dispatch import receiver
+from accounts.models import User
+from payments.models import Payment
+from .donations import on_commit_invalidate_donations
+from .registration import apply_deltas, count_registrations, registered_users, stat_key
+
+
+def _loaded(instance, *fields):
+    # Deferred fields (only()/defer()) are not read here: that would cost
+    # a query per instance. A save cannot change a field that was not loaded.
+    return all(field in instance.__dict__ for field in fields)
+
+
+def _registered_in_db(payment):
+    """
+    Whether the stored row is an approved registration. Read from the
+    database rather than tracked in post_init: payments are also changed
+    by bulk UPDATEs, which would leave loaded instances stale.
+
+    The row is locked until the save / delete commits (Payment.save and
+    Model.delete run in a transaction), so a concurrent save of the same
+    payment waits and then sees this one's result instead of counting the
+    same transition twice.
+    """
+    if payment._state.adding or payment.pk is None:
+        return False
+    return (
+        Payment.objects.select_for_update()
+        .filter(pk=payment.pk, payment_type='registration', payment_approved=True)
+        .exists()
+    )
+
+
+@receiver(pre_save, sender=Payment)
+def remember_payment_state(sender, instance, **kwargs):
+    instance._stats_registered = _registered_in_db(instance)
+
+
+@receiver(post_save, sender=Payment)
+def count_payment_registration(sender, instance, **kwargs):
+    """An approved registration counts its user; un-approving removes them."""
+    registered = instance.payment_type == 'registration' and instance.payment_approved
+    if registered != instance._stats_registered:
+        count_registrations([instance.user_id], 1 if registered else -1)
+    if instance.payment_type == 'donation':
+        on_commit_invalidate_donations()
+
+
+@receiver(pre_delete, sender=Payment)
+def remember_deleted_payment_state(sender, instance, **kwargs):
+    instance._stats_registered = _registered_in_db(instance)
+
+
+@receiver(post_delete, sender=Payment)
+def uncount_deleted_payment(sender, instance, **kwargs):
+    if instance._stats_registered:
+        count_registrations([instance.user_id], -1)
+    if instance.payment_type == 'donation':
+        on_commit_invalidate_donations()
+
+
+@receiver(post_init, sender=User)
+def remember_user_group(sender, instance, **kwargs):
+    if _loaded(instance, 'batch', 'gender'):
+        instance._stats_key = stat_key(instance.batch, instance.gender)
+    else:
+        instance._stats_key = None
+
+
+@receiver(post_save, sender=User)
+def move_registered_user(sender, instance, created, **kwargs):
+    """A registered user's batch / gender change moves them between rows."""
+    if instance._stats_key is None:
+        return
+    key = stat_key(instance.batch, instance.gender)
+    if not created and key != instance._stats_key and registered_users().filter(pk=instance.pk).exists():
+        apply_deltas({instance._stats_key: -1, key: 1})
+    instance._stats_key = key
@@ -1,3 +1,147 @@
-from django.test import TestCase
+import io
+from decimal import Decimal
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.models.signals import pre_save
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from accounts.models import User
+from payments.approvals import approve_payments
+from payments.models import Payment
+from .models import RegistrationStat
+from .registration import compute, current
+
+
+@override_settings(GATE_SCAN_LOG_ENABLED=False)
+class RegistrationStatTests(TestCase):
+    """The stats table follows every change and matches a full recount."""
+
+    def register(self, i, batch='2019', gender='male', approved=False):
+        user = User.objects.create_user(phone=f'0171111111{i}', password='x', batch=batch, gender=gender)
+        payment = Payment.objects.create(user=user, transaction_id=f'TX{i}', amount=500,
+                                         payment_type='registration', payment_approved=approved)
+        return user, payment
+
+    def assertInSync(self):
+        self.assertEqual(current(), dict(compute()))
+
+    def test_incremental_updates(self):
+        user, payment = self.register(0, approved=True)
+        self.register(1, batch='2020', gender='female')
+        _, pending = self.register(2, batch=' 2020 ', gender='female')
+        Payment.objects.create(user=user, transaction_id='D1', amount=100,
+                               payment_type='donation', payment_approved=True)
+        self.assertEqual(current(), {('2019', 'male'): 1})
+
+        approve_payments(Payment.objects.filter(payment_approved=False))
+        self.assertEqual(current(), {('2019', 'male'): 1, ('2020', 'female'): 2})
+
+        user.batch = '2021'
+        user.save()
+        pending.payment_approved = False
+        pending.save()
+        self.assertEqual(current(), {('2021', 'male'): 1, ('2020', 'female'): 1})
+        self.assertInSync()
+
+        payment.delete()
+        User.objects.get(phone='01711111111').delete()
+        self.assertEqual(current(), {})
+        self.assertInSync()
+
+    def test_view_reads_one_query(self):
+        self.register(0, approved=True)
+        self.register(1, batch='2020', gender='female', approved=True)
+        self.register(2, batch='', gender=None, approved=True)
+        self.register(3)
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/stats/registration-stats/')
+        self.assertEqual(response.json(), {
+            'total_registered': 3,
+            'batch_wise_count': {'2019': 1, '2020': 1},
+            'gender_count': {'male': 1, 'female': 1, 'unknown': 1},
+        })
+
+    def test_rebuild_repairs_drift(self):
+        self.register(0, approved=True)
+        # Bypasses the signals
+        Payment.objects.filter(transaction_id='TX0').update(payment_approved=False)
+        RegistrationStat.objects.create(batch='1999', gender='male', count=4)
+        self.assertNotEqual(current(), dict(compute()))
+
+        call_command('rebuild_registration_stats', stdout=io.StringIO())
+        self.assertInSync()
+        self.assertEqual(RegistrationStat.objects.count(), 0)
+
+
+class RegistrationStatLockTests(TransactionTestCase):
+    """The pre_save read must share the save's transaction to hold its row lock."""
+
+    def test_save_runs_in_one_transaction(self):
+        user = User.objects.create_user(phone='01711111110', password='x', batch='2019', gender='male')
+        payment = Payment.objects.create(user=user, transaction_id='TX0', amount=500,
+                                         payment_type='registration')
+        seen = []
+
+        def record(sender, instance, **kwargs):
+            seen.append(connection.in_atomic_block)
+
+        pre_save.connect(record, sender=Payment)
+        try:
+            payment.payment_approved = True
+            payment.save()
+        finally:
+            pre_save.disconnect(record, sender=Payment)
+        self.assertEqual(seen, [True])
+        self.assertFalse(connection.in_atomic_block)
+        self.assertEqual(current(), {('2019', 'male'): 1})
+
+
+@override_settings(GATE_SCAN_LOG_ENABLED=False)
+class DonationStatsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        for i, amount in enumerate(['100.10', '250.20', '0.30', '1000']):
+            user = User.objects.create_user(phone=f'0171111111{i}', password='x', name=f'Donor {i}', batch='2019')
+            Payment.objects.create(user=user, transaction_id=f'D{i}', amount=amount,
+                                   payment_type='donation', payment_approved=True)
+        Payment.objects.create(user=user, transaction_id='PENDING', amount=5000,
+                               payment_type='donation', payment_approved=False)
+
+    def test_exact_total_pages_and_top(self):
+        with self.assertNumQueries(2):
+            data = self.client.get('/api/stats/donation-stats/').json()
+        self.assertEqual(Decimal(str(data['total_donation_amount'])), Decimal('1350.60'))
+        self.assertEqual(data['donor_count'], 4)
+        self.assertEqual(data['donation_count'], 4)
+        self.assertEqual([d['transaction_id'] for d in data['donations']], ['D3', 'D2', 'D1', 'D0'])
+        self.assertNotIn('next_page', data)
+
+        with self.assertNumQueries(0):
+            data = self.client.get('/api/stats/donation-stats/', {'page_size': 3}).json()
+        self.assertEqual([d['transaction_id'] for d in data['donations']], ['D3', 'D2', 'D1'])
+        self.assertEqual(data['next_page'], 2)
+
+        data = self.client.get('/api/stats/donation-stats/', {'page_size': 3, 'page': 2}).json()
+        self.assertEqual([d['transaction_id'] for d in data['donations']], ['D0'])
+        self.assertIsNone(data['next_page'])
+
+        data = self.client.get('/api/stats/donation-stats/', {'top': 2}).json()
+        self.assertEqual([d['transaction_id'] for d in data['donations']], ['D3', 'D1'])
+
+    def test_snapshot_invalidated_by_donation_changes(self):
+        self.client.get('/api/stats/donation-stats/')
+        with self.captureOnCommitCallbacks(execute=True):
+            approve_payments(Payment.objects.filter(transaction_id='PENDING'))
+        data = self.client.get('/api/stats/donation-stats/').json()
+        # Donor 3's second donation: one more donation, same four donors
+        self.assertEqual(data['donation_count'], 5)
+        self.assertEqual(data['donor_count'], 4)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Payment.objects.get(transaction_id='D0').delete()
+        data = self.client.get('/api/stats/donation-stats/').json()
+        self.assertEqual(data['donation_count'], 4)
+        self.assertEqual(data['donor_count'], 3)
+        self.assertNotIn('D0', [d['transaction_id'] for d in data['donations']])
@@ -1,12 +1,16 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import permissions
-from django.db.models import Count, Sum, Q
+from django.db.models import Sum, Q
 from django.utils import timezone
 from datetime import datetime, timedelta
-from accounts.models import User
-from payments.models import Payment
 from tickets.models import Ticket
+from payments.pagination import parse_limit
+from .donations import TOP_LIMIT, get_snapshot
+from .registration import registration_stats
+
+DONATION_PAGE_SIZE = 50
+DONATION_PAGE_SIZE_MAX = 200
 
 class RegistrationStatsView(APIView):
     """
@@ -15,84 +19,68 @@ class RegistrationStatsView(APIView):
     - batch wise registration count
     - male/female/other count
     Only considers users with approved registration payment.
+
+    Read from the RegistrationStat table (one query), which is kept up to
+    date as payments are approved and users change batch or gender.
     """
     permission_classes = [permissions.AllowAny]  # restrict to admin if needed
 
     def get(self, request):
-        # Get users with approved registration payment
-        registered_user_ids = Payment.objects.filter(
-            payment_type='registration',
-            payment_approved=True
-        ).values_list('user_id', flat=True).distinct()
-
-        users = User.objects.filter(id__in=registered_user_ids)
-
-        total_count = users.count()
-
-        # Clean batch values and group by batch
-        batch_counts = (
-            users.exclude(batch__isnull=True).exclude(batch__exact='')
-            .values('batch')
-            .annotate(count=Count('id'))
-            .order_by('batch')
-        )
-
-        gender_counts = users.values('gender').annotate(count=Count('id'))
-
-        # normalize batch keys as string
-        data = {
-            "total_registered": total_count,
-            "batch_wise_count": {str(b['batch']).strip(): b['count'] for b in batch_counts},
-            "gender_count": {g['gender'] or "unknown": g['count'] for g in gender_counts},
-        }
-
-        return Response(data)
+        return Response(registration_stats())
 
 
 
 
 class DonationStatsView(APIView):
     """
-    Returns a list of all approved donations with:
+    Returns approved donations with:
     - username
     - batch
     - profile image (if available)
     - donation amount
-    - total donation sum
+    - total donation sum (exact, summed by the database)
+    - donor_count (distinct donors) and donation_count
+
+    Endpoint: GET /api/stats/donation-stats/
+    Lists every donation, newest first. With ?page= / ?page_size= only
+    that page is returned (plus next_page); with ?top=N the N largest
+    donations are returned instead (leaderboard).
+    Served from a cached snapshot (see stats.donations).
     """
     permission_classes = [permissions.AllowAny]  # change to IsAdminUser if needed
 
     def get(self, request):
-        # Filter approved donations
-        donations = Payment.objects.filter(
-            payment_type='donation',
-            payment_approved=True
-        ).select_related('user')
-
-        # Prepare donation list
-        donation_list = []
-        total_donation = 0
+        snapshot = get_snapshot()
+        data = {
+            "total_donation_amount": snapshot['total'],
+            "donor_count": snapshot['donors'],
+            "donation_count": snapshot['count'],
+        }
 
-        for d in donations:
-            total_donation += float(d.amount)
-            donation_list.append({
-                "name": d.user.name,
-                "batch": d.user.batch,
-                # use profile_image field from User model (CloudinaryField)
-                "image": (
-                    (d.user.profile_image.url if getattr(d.user, 'profile_image', None) else None)
-                    and (
-                        d.user.profile_image.url
-                        if str(d.user.profile_image.url).startswith('http')
-                        else request.build_absolute_uri(d.user.profile_image.url)
-                    )
-                ),
-                "amount": float(d.amount),
-                "transaction_id": d.transaction_id,
-                "method": d.method,
-            })
+        params = request.query_params
+        top = parse_limit(params.get('top'), None, TOP_LIMIT)
+        if top:
+            rows = snapshot['top'][:top]
+        elif 'page' not in params and 'page_size' not in params:
+            rows = snapshot['donations']
+        else:
+            page_size = parse_limit(params.get('page_size'), DONATION_PAGE_SIZE, DONATION_PAGE_SIZE_MAX)
+            page = parse_limit(params.get('page'), 1, maximum=10 ** 6)
+            start = (page - 1) * page_size
+            rows = snapshot['donations'][start:start + page_size]
+            data.update(
+                page=page,
+                page_size=page_size,
+                next_page=page + 1 if start + page_size < snapshot['count'] else None,
+            )
+
+        data["donations"] = [
+            {**d, "image": self.absolute_image(request, d["image"])} for d in rows
+        ]
+        return Response(data)
 
-        return Response({
-            "total_donation_amount": total_donation,
-            "donations": donation_list
-        })
+    @staticmethod
+    def absolute_image(request, url):
+        if not url or str(url).startswith('http'):
+            return url
+        return request.build_absolute_uri(url)
@@ -1,8 +1,53 @@
 from django.contrib import admin
-from .models import Ticket
+from django.template.response import TemplateResponse
+from django.urls import path
+from .models import Ticket, ScanEvent
+from .scan_log import scan_rate_report
 
 @admin.register(Ticket)
 class TicketAdmin(admin.ModelAdmin):
     list_display = ('ticket_code', 'user', 'food_received', 'has_donation')
     search_fields = ('ticket_code', 'user__phone', 'user__name')
     list_filter = ('food_received', 'has_donation')
+
+
+@admin.register(ScanEvent)
+class ScanEventAdmin(admin.ModelAdmin):
+    list_display = ('created_at', 'scanner_id', 'action', 'source', 'scanned_value', 'result', 'latency_ms', 'admin')
+    search_fields = ('scanned_value', 'ticket_code', 'scanner_id')
+    list_filter = ('action', 'source', 'result', 'scanner_id')
+    date_hierarchy = 'created_at'
+    list_select_related = ('admin',)
+    change_list_template = 'admin/tickets/scanevent/change_list.html'
+
+    # Append-only: events are written by the gate, never edited here
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_urls(self):
+        urls = [
+            path('scan-rate/', self.admin_site.admin_view(self.scan_rate_view), name='tickets_scanevent_scan_rate'),
+        ]
+        return urls + super().get_urls()
+
+    def scan_rate_view(self, request):
+        """
+        Scans per minute per counter
+        """
+        try:
+            minutes = max(1, min(int(request.GET.get('minutes', 60)), 24 * 60))
+        except ValueError:
+            minutes = 60
+        counters, window_start = scan_rate_report(minutes)
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Gate scans per minute per counter',
+            'counters': counters,
+            'minutes': minutes,
+            'window_start': window_start,
+        }
+        return TemplateResponse(request, 'admin/tickets/scanevent/scan_rate.html', context)
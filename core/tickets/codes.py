@@ -0,0 +1,199 @@
+"""
+Ticket code allocation.
+
+Codes are handed out from a counter row (TicketCodeCounter) in reserved
+blocks, so each worker only touches the database once per block and never
+reads the tickets table to find the next code. Concurrent workers serialize
+on the counter row update, so two approvals can never receive the same code.
+
+Two code formats share the same counter numbers (TICKET_CODE_FORMAT):
+
+- 'numeric': zero-padded digits, e.g. 00042 (the original format)
+- 'check':   base-23 letters without look-alikes (no I, L, O) plus one
+             check character, e.g. AAABWH (42)
+
+Check codes contain no digits, so the two formats never overlap.
+
+Because both encode the counter number, a legacy numeric code and its
+check form always name the same ticket (see ticket_code_candidates).
+"""
+import threading
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+COUNTER_NAME = 'ticket_code'
+
+NUMERIC, CHECK = 'numeric', 'check'
+# Letters only, without I/L/O; 23 symbols, a prime, so the weighted check
+# character catches every single substitution and adjacent transposition.
+CODE_ALPHABET = 'ABCDEFGHJKMNPQRSTUVWXYZ'
+_ALPHABET_INDEX = {c: i for i, c in enumerate(CODE_ALPHABET)}
+
+
+def get_code_length():
+    return getattr(settings, 'TICKET_CODE_LENGTH', 5)
+
+
+def get_block_size():
+    return max(1, getattr(settings, 'TICKET_CODE_BLOCK_SIZE', 20))
+
+
+def get_code_format():
+    return getattr(settings, 'TICKET_CODE_FORMAT', NUMERIC)
+
+
+def _check_char(body):
+    total = sum((i + 1) * _ALPHABET_INDEX[c] for i, c in enumerate(body))
+    return CODE_ALPHABET[total % len(CODE_ALPHABET)]
+
+
+def check_code(number, length=None):
+    """Check-format code for a counter number, e.g. 42 -> AAABWH."""
+    base = len(CODE_ALPHABET)
+    digits = []
+    while number:
+        number, rem = divmod(number, base)
+        digits.append(CODE_ALPHABET[rem])
+    body = ''.join(reversed(digits)).rjust(length or get_code_length(), CODE_ALPHABET[0])
+    return body + _check_char(body)
+
+
+def is_check_code(value):
+    return (
+        len(value) > 1
+        and all(c in _ALPHABET_INDEX for c in value)
+        and _check_char(value[:-1]) == value[-1]
+    )
+
+
+def format_ticket_code(number):
+    """Code for a counter number in the configured format, e.g. 1 -> 00001."""
+    if get_code_format() == CHECK:
+        return check_code(number)
+    return str(number).zfill(get_code_length())
+
+
+def parse_code_number(code):
+    """Counter number behind a numeric or check-format code, or None if malformed."""
+    code = (code or '').strip().upper()
+    if code.isdigit():
+        return int(code)
+    if is_check_code(code):
+        number = 0
+        for c in code[:-1]:
+            number = number * len(CODE_ALPHABET) + _ALPHABET_INDEX[c]
+        return number
+    return None
+
+
+def ticket_code_candidates(value):
+    """
+    Stored codes a scanned or typed value may refer to, in both formats, or
+    an empty list when it is malformed (wrong characters or check character),
+    so such input is rejected without any lookup.
+    """
+    code = (value or '').strip().upper()
+    number = parse_code_number(code)
+    if number is None:
+        return []
+    # The scanned code's own width comes first, so codes issued under an
+    # earlier TICKET_CODE_LENGTH keep resolving after the setting changes
+    width = len(code) if code.isdigit() else len(code) - 1
+    lengths = dict.fromkeys([width, get_code_length()])
+    numeric = [str(number).zfill(length) for length in lengths]
+    check = [check_code(number, length) for length in lengths]
+    forms = check + numeric if get_code_format() == CHECK else numeric + check
+    return list(dict.fromkeys(forms))
+
+
+def _highest_existing_code():
+    """Highest ticket code number already stored (used to seed the counter)."""
+    from .models import Ticket
+
+    highest = 0
+    for code in Ticket.objects.exclude(ticket_code__isnull=True).values_list('ticket_code', flat=True).iterator():
+        number = parse_code_number(code)
+        if number is not None:
+            highest = max(highest, number)
+    return highest
+
+
+class TicketCodeAllocator:
+    """
+    Per-process pool of reserved code numbers.
+
+    A reservation bumps the counter row by a whole block inside a
+    transaction. The unused remainder of the block only joins the pool once
+    that transaction commits: if it rolls back, the counter is restored and
+    the numbers were never visible to anyone else.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ranges = []  # list of [next, end) pairs
+
+    def reset(self):
+        with self._lock:
+            self._ranges = []
+
+    def _take_from_pool(self, count):
+        taken = []
+        with self._lock:
+            while self._ranges and len(taken) < count:
+                start, end = self._ranges[0]
+                n = min(count - len(taken), end - start)
+                taken.extend(range(start, start + n))
+                if start + n >= end:
+                    self._ranges.pop(0)
+                else:
+                    self._ranges[0] = (start + n, end)
+        return taken
+
+    def _add_to_pool(self, start, end):
+        if start < end:
+            with self._lock:
+                self._ranges.append((start, end))
+
+    def _reserve(self, size):
+        """Reserve `size` numbers on the counter row; returns (first, end)."""
+        from .models import TicketCodeCounter
+
+        with transaction.atomic():
+            counters = TicketCodeCounter.objects.filter(name=COUNTER_NAME)
+            if not counters.update(last_value=F('last_value') + size):
+                try:
+                    with transaction.atomic():
+                        TicketCodeCounter.objects.create(
+                            name=COUNTER_NAME, last_value=_highest_existing_code() + size
+                        )
+                except IntegrityError:
+                    # Another worker created the row first.
+                    counters.update(last_value=F('last_value') + size)
+            end = counters.values_list('last_value', flat=True).get() + 1
+        return end - size, end
+
+    def allocate(self, count=1):
+        """Return `count` unused code numbers in ascending order."""
+        numbers = self._take_from_pool(count)
+        missing = count - len(numbers)
+        if missing:
+            first, end = self._reserve(max(missing, get_block_size()))
+            numbers.extend(range(first, first + missing))
+            leftover = (first + missing, end)
+            transaction.on_commit(lambda: self._add_to_pool(*leftover))
+        return numbers
+
+
+allocator = TicketCodeAllocator()
+
+
+def allocate_ticket_code():
+    """Allocate a single formatted ticket code."""
+    return format_ticket_code(allocator.allocate(1)[0])
+
+
+def allocate_ticket_codes(count):
+    """Allocate `count` formatted ticket codes at once (for bulk ticket creation)."""
+    return [format_ticket_code(n) for n in allocator.allocate(count)]
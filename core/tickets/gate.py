@@ -0,0 +1,267 @@
+"""
+Gate state transitions.
+
+Set-based, conditional updates for the scan path: a ticket only moves from
+"not served" to "served" once, however many counters or replayed scans try.
+"""
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Case, DateTimeField, Exists, F, OuterRef, Value, When
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from accounts.models import User
+from payments.models import Payment
+from .models import Ticket
+from .live import live_counts, ENTERED as LIVE_ENTERED, FOOD as LIVE_FOOD
+from .roster import roster, on_commit_publish
+
+SUCCESS = 'success'
+ALREADY_MARKED = 'already_marked'
+NOT_FOUND = 'not_found'
+
+ENTER = 'enter'
+FOOD = 'food'
+
+# action -> (field set on the transition, condition that must still hold).
+# A None condition value means "IS NULL".
+TRANSITIONS = {
+    ENTER: ('entered_at', {'entered_at': None}),
+    FOOD: ('food_received_at', {'food_received': False}),
+}
+
+
+def lookup_by_phone(phone):
+    """
+    Answer user, registration approval and ticket state for a phone number
+    in one joined query (users LEFT JOIN tickets, EXISTS over payments).
+
+    Returns None when no user has this phone. ticket_id is None when the
+    user has no ticket.
+    """
+    approved = Payment.objects.filter(
+        user=OuterRef('pk'), payment_type='registration', payment_approved=True
+    )
+    return (
+        User.objects.filter(phone=phone)
+        .annotate(registration_approved=Exists(approved))
+        .values(
+            'id', 'phone', 'name', 'batch', 'profession', 'subject', 'profile_image',
+            'registration_approved',
+            ticket_id=F('tickets__id'),
+            ticket_code=F('tickets__ticket_code'),
+            food_received=F('tickets__food_received'),
+            entered_at=F('tickets__entered_at'),
+            has_donation=F('tickets__has_donation'),
+        )
+        .first()
+    )
+
+
+DUPLICATE_KEY = 'gate:recent:%s:%s'
+
+
+def claim_scan(action, ticket_code, scanner_id=''):
+    """
+    Register a state-changing scan in the shared "recently scanned" registry.
+
+    Returns None when this scan holds the claim and should proceed, or the
+    earlier claim ({'scanner_id', 'scanned_at'}) when the same code was
+    scanned for the same action within GATE_DUPLICATE_WINDOW seconds, on
+    any worker. cache.add is atomic, so of two racing counters only one
+    proceeds to the database.
+    """
+    window = getattr(settings, 'GATE_DUPLICATE_WINDOW', 10)
+    if window <= 0:
+        return None
+    key = DUPLICATE_KEY % (action, ticket_code)
+    claim = {'scanner_id': scanner_id, 'scanned_at': timezone.now().isoformat()}
+    if cache.add(key, claim, window):
+        return None
+    # The earlier claim may have expired in between; then just proceed
+    return cache.get(key)
+
+
+def release_scan(action, ticket_code):
+    """Drop a claim whose scan did not go through, so a retry is not flagged."""
+    cache.delete(DUPLICATE_KEY % (action, ticket_code))
+
+
+RETURNING_COLUMNS = ('id', 'ticket_code', 'user_id', 'food_received', 'entered_at', 'has_donation')
+
+
+def _update_returning(table, assignments, where):
+    """
+    Run `UPDATE ... SET ... WHERE ... RETURNING` and return the first row as
+    a dict, or None when no row matched. Only used where
+    _supports_update_returning() is true.
+    """
+    qn = connection.ops.quote_name
+    set_sql = ', '.join(f'{qn(col)} = %s' for col in assignments)
+    where_sql = ' AND '.join(
+        f'{qn(col)} IS NULL' if value is None else f'{qn(col)} = %s'
+        for col, value in where.items()
+    )
+    returning = ', '.join(qn(col) for col in RETURNING_COLUMNS)
+    sql = f'UPDATE {qn(table)} SET {set_sql} WHERE {where_sql} RETURNING {returning}'
+    params = [*assignments.values(), *(v for v in where.values() if v is not None)]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        row = cursor.fetchone()
+    return dict(zip(RETURNING_COLUMNS, row)) if row else None
+
+
+def _supports_update_returning():
+    """
+    PostgreSQL and SQLite >= 3.35 support UPDATE ... RETURNING. Checked by
+    vendor: MariaDB returns columns from INSERT but not from UPDATE.
+    """
+    if connection.vendor == 'postgresql':
+        return True
+    return connection.vendor == 'sqlite' and connection.Database.sqlite_version_info >= (3, 35)
+
+
+def on_commit_count_live(action, ticket_codes):
+    """Bump the live dashboard counters once the transition is committed."""
+    metric = LIVE_ENTERED if action == ENTER else LIVE_FOOD
+
+    def count():
+        records = (roster.get_by_code(code) for code in ticket_codes)
+        live_counts.count_transitions(metric, [getattr(r, 'batch', None) for r in records])
+
+    transaction.on_commit(count)
+
+
+def _returned_datetime(value):
+    # Raw RETURNING values skip Django's converters; SQLite hands back text
+    if value is None or isinstance(value, datetime):
+        return value
+    value = parse_datetime(value)
+    return value if timezone.is_aware(value) else timezone.make_aware(value, dt_timezone.utc)
+
+
+def _condition_filters(condition):
+    """ORM filter kwargs for a TRANSITIONS condition (None means IS NULL)."""
+    return {
+        f'{name}__isnull' if value is None else name: True if value is None else value
+        for name, value in condition.items()
+    }
+
+
+def apply_transition(action, ticket_code=None, user_id=None):
+    """
+    Atomically apply a one-way gate transition (ENTER or FOOD) to one ticket.
+
+    Identify the ticket by ticket_code or by user_id. Returns (result, row):
+    SUCCESS when this call won the transition, ALREADY_MARKED when another
+    scan got there first, NOT_FOUND when no ticket matches. On backends with
+    UPDATE ... RETURNING the winning row comes back in the same round trip;
+    only losing calls need a second query to tell the two failures apart.
+    """
+    stamp_field, condition = TRANSITIONS[action]
+    lookup = {'ticket_code': ticket_code} if ticket_code is not None else {'user_id': user_id}
+    now = timezone.now()
+    changes = {stamp_field: now, 'updated_at': now}
+    if action == FOOD:
+        changes['food_received'] = True
+    if _supports_update_returning():
+        meta = Ticket._meta
+        db_now = connection.ops.adapt_datetimefield_value(now)
+        assignments = {
+            meta.get_field(name).column: db_now if value is now else value
+            for name, value in changes.items()
+        }
+        where = {
+            meta.get_field(name).column: value
+            for name, value in {**lookup, **condition}.items()
+        }
+        row = _update_returning(meta.db_table, assignments, where)
+        if row is not None:
+            row['id'] = meta.pk.to_python(row['id'])
+            row['food_received'] = bool(row['food_received'])
+            row['entered_at'] = _returned_datetime(row['entered_at'])
+            on_commit_count_live(action, [row['ticket_code']])
+            return SUCCESS, row
+    elif Ticket.objects.filter(**lookup, **_condition_filters(condition)).update(**changes):
+        row = Ticket.objects.filter(**lookup).values(*RETURNING_COLUMNS).first()
+        on_commit_count_live(action, [row['ticket_code']])
+        return SUCCESS, row
+
+    row = Ticket.objects.filter(**lookup).values(*RETURNING_COLUMNS).first()
+    if row is None:
+        return NOT_FOUND, None
+    return ALREADY_MARKED, row
+
+
+def mark_food_received(ticket_code=None, user_id=None):
+    """Atomically move one ticket from food_received=False to True."""
+    return apply_transition(FOOD, ticket_code=ticket_code, user_id=user_id)
+
+
+def mark_entered(ticket_code=None, user_id=None):
+    """Atomically record the ticket's first entry; later scans are ALREADY_MARKED."""
+    return apply_transition(ENTER, ticket_code=ticket_code, user_id=user_id)
+
+
+def apply_transition_batch(action, scans, count_live=True):
+    """
+    Apply a gate transition (ENTER or FOOD) to many tickets at once.
+
+    `scans` is a list of (ticket_code, scanned_at) pairs in client order;
+    scanned_at may be None. The earliest scan time of each code is stored.
+    Returns a list of (ticket_code, result) in the same order, where result
+    is SUCCESS, ALREADY_MARKED or NOT_FOUND. A code repeated within the
+    batch is SUCCESS at most once. Re-applying the same scans is harmless:
+    they all come back ALREADY_MARKED.
+    """
+    stamp_field, condition = TRANSITIONS[action]
+    state_field = 'food_received' if action == FOOD else 'entered_at'
+    now = timezone.now()
+    earliest = {}
+    for code, scanned_at in scans:
+        scanned_at = min(scanned_at or now, now)
+        if code not in earliest or scanned_at < earliest[code]:
+            earliest[code] = scanned_at
+
+    with transaction.atomic():
+        state = dict(
+            Ticket.objects.select_for_update()
+            .filter(ticket_code__in=list(earliest))
+            .values_list('ticket_code', state_field)
+        )
+        to_mark = [code for code, done in state.items() if not done]
+        if to_mark:
+            changes = {
+                stamp_field: Case(
+                    *[When(ticket_code=code, then=Value(earliest[code])) for code in to_mark],
+                    default=Value(now),
+                    output_field=DateTimeField(),
+                ),
+                'updated_at': now,
+            }
+            if action == FOOD:
+                changes['food_received'] = True
+            Ticket.objects.filter(ticket_code__in=to_mark, **_condition_filters(condition)).update(**changes)
+            on_commit_publish(ticket_code__in=to_mark)
+            if count_live:
+                on_commit_count_live(action, to_mark)
+
+    marked = set(to_mark)
+    results = []
+    for code, _ in scans:
+        if code not in state:
+            results.append((code, NOT_FOUND))
+        elif code in marked:
+            results.append((code, SUCCESS))
+            marked.discard(code)
+        else:
+            results.append((code, ALREADY_MARKED))
+    return results
+
+
+def mark_food_received_batch(scans):
+    """Mark food received for many tickets at once (see apply_transition_batch)."""
+    return apply_transition_batch(FOOD, scans)
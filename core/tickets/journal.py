@@ -0,0 +1,312 @@
+"""
+Event-day write-behind journal for gate transitions (GATE_EVENT_MODE).
+
+With event mode on, an enter/food scan is not written to the database on
+the request path. Instead:
+
+1. a shared-cache state claim (cache.add) decides which scan is first,
+   across workers (requires the Redis cache when running several workers);
+2. the transition is appended to a local JSON-lines journal and fsynced;
+3. the scan is acknowledged and the roster record published right away.
+
+The `replicate_gate_journal` command applies the journal to the database
+in batches with the same conditional updates as the online path, then
+advances a checkpoint (a byte offset). Replaying entries is harmless, so a
+crash between a commit and the checkpoint write only re-applies a batch
+that comes back ALREADY_MARKED; entries whose own timestamp is already
+stored were applied by that earlier run and are skipped. Entries the
+database disagrees with (the ticket was already marked elsewhere, or no
+longer exists) are kept as conflicts: the earliest database state wins and the entry is written to
+the conflicts file for review. `gate_journal_lag` reports how far the
+replicator is behind.
+"""
+import json
+import logging
+import os
+import threading
+import uuid
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX development machines
+    fcntl = None
+
+from .gate import SUCCESS, ALREADY_MARKED, TRANSITIONS, apply_transition_batch, on_commit_count_live
+from .models import Ticket
+
+logger = logging.getLogger(__name__)
+
+STATE_KEY = 'gate:state:%s:%s'
+JOURNAL_NAME = 'gate-journal.jsonl'
+CHECKPOINT_NAME = 'gate-journal.checkpoint'
+CONFLICTS_NAME = 'gate-journal.conflicts.jsonl'
+LOCK_NAME = 'gate-journal.lock'
+
+
+def event_mode_enabled():
+    return getattr(settings, 'GATE_EVENT_MODE', False)
+
+
+def journal_dir():
+    return Path(getattr(settings, 'GATE_JOURNAL_DIR', None) or Path(settings.BASE_DIR) / 'gate_journal')
+
+
+def _fsync_enabled():
+    return getattr(settings, 'GATE_JOURNAL_FSYNC', True)
+
+
+def _write_atomic(path, data):
+    tmp = path.with_suffix(path.suffix + '.tmp')
+    with open(tmp, 'w') as f:
+        f.write(data)
+        f.flush()
+        if _fsync_enabled():
+            os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class GateJournal:
+    """Append-only, fsynced JSON-lines journal shared by all workers on a host."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._fd = None
+        self._pid = None
+        self._path = None
+
+    def path(self):
+        return journal_dir() / JOURNAL_NAME
+
+    def _open(self):
+        path = self.path()
+        if self._fd is not None and self._pid == os.getpid() and self._path == path:
+            return self._fd
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        # A crash mid-write can leave a torn last line; terminate it so the
+        # next entry starts on a line of its own (the replicator skips it).
+        size = os.fstat(fd).st_size
+        if size:
+            with open(path, 'rb') as f:
+                f.seek(size - 1)
+                if f.read(1) != b'\n':
+                    os.write(fd, b'\n')
+        self._fd, self._pid, self._path = fd, os.getpid(), path
+        return fd
+
+    def append(self, entries):
+        """Durably append entries (dicts); one write() and one fsync per call."""
+        data = ''.join(json.dumps(e, separators=(',', ':')) + '\n' for e in entries).encode()
+        with self._lock:
+            fd = self._open()
+            os.write(fd, data)
+            if _fsync_enabled():
+                os.fsync(fd)
+
+    def reset(self):
+        with self._lock:
+            if self._fd is not None and self._pid == os.getpid():
+                os.close(self._fd)
+            self._fd = self._pid = self._path = None
+
+
+journal = GateJournal()
+
+
+def _claim_state(action, ticket_code):
+    timeout = getattr(settings, 'GATE_EVENT_STATE_TTL', 24 * 3600)
+    return cache.add(STATE_KEY % (action, ticket_code), True, timeout)
+
+
+def _release_state(action, ticket_code):
+    cache.delete(STATE_KEY % (action, ticket_code))
+
+
+def record_transitions(action, scans, scanner_id=''):
+    """
+    Event-mode counterpart of gate.apply_transition_batch for codes already
+    validated against the roster. Returns [(ticket_code, result)] in input
+    order with SUCCESS or ALREADY_MARKED; the winning entries are journaled
+    before this returns. Raises OSError if the journal cannot be written
+    (the claims are released, so the caller can fall back to the database).
+    """
+    now = timezone.now()
+    results, entries = [], []
+    for code, scanned_at in scans:
+        if _claim_state(action, code):
+            entries.append({
+                'id': uuid.uuid4().hex,
+                'action': action,
+                'code': code,
+                'at': min(scanned_at or now, now).isoformat(),
+                'scanner': scanner_id,
+            })
+            results.append((code, SUCCESS))
+        else:
+            results.append((code, ALREADY_MARKED))
+    if entries:
+        try:
+            journal.append(entries)
+        except OSError:
+            for entry in entries:
+                _release_state(action, entry['code'])
+            raise
+        on_commit_count_live(action, [entry['code'] for entry in entries])
+    return results
+
+
+# ── Replication ─────────────────────────────────────────────────────
+def read_checkpoint():
+    path = journal_dir() / CHECKPOINT_NAME
+    try:
+        return json.loads(path.read_text()).get('offset', 0)
+    except (OSError, ValueError):
+        return 0
+
+
+def write_checkpoint(offset):
+    _write_atomic(
+        journal_dir() / CHECKPOINT_NAME,
+        json.dumps({'offset': offset, 'updated_at': timezone.now().isoformat()}),
+    )
+
+
+def read_pending(offset, limit=None):
+    """
+    Complete journal lines after `offset`: returns (entries, end_offset).
+    An unterminated last line (being written, or torn by a crash) is left
+    for later; lines that are not valid JSON are logged and skipped.
+    """
+    path = journal_dir() / JOURNAL_NAME
+    entries = []
+    try:
+        f = open(path, 'rb')
+    except FileNotFoundError:
+        return entries, offset
+    with f:
+        f.seek(offset)
+        for line in f:
+            if not line.endswith(b'\n'):
+                break
+            offset += len(line)
+            if not line.strip():
+                continue
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                logger.error("Skipping corrupt gate journal line at offset %d", offset - len(line))
+            if limit and len(entries) >= limit:
+                break
+    return entries, offset
+
+
+def _record_conflicts(conflicts):
+    path = journal_dir() / CONFLICTS_NAME
+    with open(path, 'a') as f:
+        for entry, result in conflicts:
+            f.write(json.dumps({**entry, 'result': result, 'replicated_at': timezone.now().isoformat()}) + '\n')
+        f.flush()
+        if _fsync_enabled():
+            os.fsync(f.fileno())
+
+
+class ReplicatorLock:
+    """Only one replicator per journal directory (advisory file lock)."""
+
+    def __enter__(self):
+        journal_dir().mkdir(parents=True, exist_ok=True)
+        self._file = open(journal_dir() / LOCK_NAME, 'w')
+        if fcntl is not None:
+            try:
+                fcntl.flock(self._file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                self._file.close()
+                raise RuntimeError("Another gate journal replicator is running.")
+        return self
+
+    def __exit__(self, *exc):
+        self._file.close()
+
+
+def _applied_stamps(action, entries):
+    """Stored transition timestamp per ticket code for ALREADY_MARKED entries."""
+    if not entries:
+        return {}
+    stamp_field, _ = TRANSITIONS[action]
+    return dict(
+        Ticket.objects.filter(ticket_code__in={e['code'] for e in entries})
+        .values_list('ticket_code', stamp_field)
+    )
+
+
+def replicate_once(batch_size=None):
+    """
+    Apply the next batch of journal entries. Returns a dict with the number
+    of entries read, applied and in conflict, and the new checkpoint offset.
+    """
+    batch_size = batch_size or getattr(settings, 'GATE_REPLICATOR_BATCH', 500)
+    offset = read_checkpoint()
+    entries, end = read_pending(offset, batch_size)
+    stats = {'read': len(entries), 'applied': 0, 'replayed': 0, 'conflicts': 0, 'offset': end}
+    if not entries:
+        if end != offset:
+            write_checkpoint(end)
+        return stats
+
+    by_action = {}
+    for entry in entries:
+        by_action.setdefault(entry['action'], []).append(entry)
+
+    conflicts = []
+    with transaction.atomic():
+        for action, action_entries in by_action.items():
+            scans = [(e['code'], parse_datetime(e['at'])) for e in action_entries]
+            # Live counts were bumped when the scan was acknowledged
+            results = apply_transition_batch(action, scans, count_live=False)
+            marked = [entry for entry, (_, result) in zip(action_entries, results) if result == ALREADY_MARKED]
+            applied_before = _applied_stamps(action, marked)
+            for entry, (_, result) in zip(action_entries, results):
+                if result == SUCCESS:
+                    stats['applied'] += 1
+                elif applied_before.get(entry['code']) == parse_datetime(entry['at']):
+                    # Applied by a run that crashed before its checkpoint
+                    stats['replayed'] += 1
+                else:
+                    conflicts.append((entry, result))
+
+    if conflicts:
+        _record_conflicts(conflicts)
+        stats['conflicts'] = len(conflicts)
+    write_checkpoint(end)
+    return stats
+
+
+def journal_lag():
+    """How far the replicator is behind the journal."""
+    path = journal_dir() / JOURNAL_NAME
+    size = path.stat().st_size if path.exists() else 0
+    offset = read_checkpoint()
+    pending, _ = read_pending(offset)
+    oldest = parse_datetime(pending[0]['at']) if pending else None
+    conflicts_path = journal_dir() / CONFLICTS_NAME
+    conflicts = 0
+    if conflicts_path.exists():
+        with open(conflicts_path, 'rb') as f:
+            conflicts = sum(1 for _ in f)
+    return {
+        'journal': str(path),
+        'journal_bytes': size,
+        'checkpoint': offset,
+        'pending_bytes': max(size - offset, 0),
+        'pending_entries': len(pending),
+        'oldest_pending_at': oldest,
+        'lag_seconds': (timezone.now() - oldest).total_seconds() if oldest else 0.0,
+        'conflicts': conflicts,
+    }
@@ -0,0 +1,171 @@
+"""
+Live gate / attendance counters for the organizer dashboard.
+
+Counts are kept in the shared cache and bumped from the scan path when a
+transition actually happens, so watching them never runs the aggregate
+queries behind stats/registration-stats:
+
+- entered / food served / tickets in total and per batch,
+- scans per minute (one bucket per minute, kept for an hour),
+- a version number bumped on every change.
+
+The counters are seeded from one aggregate query when missing and reseeded
+every GATE_LIVE_RESEED seconds (or after bulk changes) to correct drift.
+Within a process, viewers share one snapshot that is refreshed at most
+once per GATE_LIVE_POLL_INTERVAL, so fifty open dashboards cost one cache
+read per second per worker.
+"""
+import threading
+import time
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Q
+
+PREFIX = 'gate:live:'
+SEED_KEY = PREFIX + 'seeded'
+VERSION_KEY = PREFIX + 'version'
+BATCHES_KEY = PREFIX + 'batches'
+TOTAL_KEY = PREFIX + 'total:%s'
+BATCH_KEY = PREFIX + 'batch:%s:%s'
+SCANS_KEY = PREFIX + 'scans:%d'
+SCAN_BUCKET_TTL = 3600
+SCAN_MINUTES = 15
+
+ENTERED, FOOD, TICKETS = 'entered', 'food', 'tickets'
+METRICS = (TICKETS, ENTERED, FOOD)
+
+
+def _incr(key, delta=1, timeout=None):
+    try:
+        return cache.incr(key, delta)
+    except ValueError:
+        if cache.add(key, delta, timeout):
+            return delta
+        return cache.incr(key, delta)
+
+
+def _batch_key(batch, metric):
+    return BATCH_KEY % (quote(batch or '', safe=''), metric)
+
+
+class LiveCounts:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._checked_at = 0.0
+
+    # ── Seeding ─────────────────────────────────────────────────────
+    def seed(self):
+        """Recompute every counter from one aggregate query."""
+        from .models import Ticket
+
+        rows = Ticket.objects.values('user__batch').annotate(
+            tickets=Count('id'),
+            entered=Count('id', filter=Q(entered_at__isnull=False)),
+            food=Count('id', filter=Q(food_received=True)),
+        )
+        values = {TOTAL_KEY % metric: 0 for metric in METRICS}
+        batches = []
+        for row in rows:
+            batch = row['user__batch'] or ''
+            batches.append(batch)
+            for metric in METRICS:
+                values[TOTAL_KEY % metric] += row[metric]
+                values[_batch_key(batch, metric)] = row[metric]
+        values[BATCHES_KEY] = sorted(batches)
+        cache.set_many(values, None)
+        cache.set(SEED_KEY, True, getattr(settings, 'GATE_LIVE_RESEED', 600))
+        self._bump_version()
+
+    def _ensure_seeded(self):
+        """Seed if needed; returns True when the counters were just recomputed."""
+        if cache.get(SEED_KEY):
+            return False
+        self.seed()
+        return True
+
+    def invalidate(self):
+        """Force a reseed on next use (after bulk ticket changes)."""
+        cache.delete(SEED_KEY)
+        self._bump_version()
+
+    def _bump_version(self):
+        _incr(VERSION_KEY)
+
+    # ── Scan path ───────────────────────────────────────────────────
+    def count_transitions(self, metric, batches):
+        """Count committed transitions; `batches` holds one batch name per ticket."""
+        if not batches or self._ensure_seeded():
+            # A fresh seed already includes these committed rows
+            return
+        _incr(TOTAL_KEY % metric, len(batches))
+        per_batch = {}
+        for batch in batches:
+            per_batch[batch or ''] = per_batch.get(batch or '', 0) + 1
+        known = cache.get(BATCHES_KEY) or []
+        for batch, count in per_batch.items():
+            _incr(_batch_key(batch, metric), count)
+            if batch not in known:
+                cache.set(BATCHES_KEY, sorted({*known, batch}), None)
+        self._bump_version()
+
+    def count_scans(self, count=1):
+        minute = int(time.time() // 60)
+        _incr(SCANS_KEY % minute, count, SCAN_BUCKET_TTL)
+        self._bump_version()
+
+    # ── Reading ─────────────────────────────────────────────────────
+    def _read(self, version):
+        self._ensure_seeded()
+        batches = cache.get(BATCHES_KEY) or []
+        minute = int(time.time() // 60)
+        minutes = range(minute - SCAN_MINUTES + 1, minute + 1)
+        keys = [TOTAL_KEY % metric for metric in METRICS]
+        keys += [_batch_key(batch, metric) for batch in batches for metric in METRICS]
+        keys += [SCANS_KEY % m for m in minutes]
+        values = cache.get_many(keys)
+        return {
+            "version": version,
+            **{metric: values.get(TOTAL_KEY % metric, 0) for metric in METRICS},
+            "batches": {
+                batch or 'N/A': {metric: values.get(_batch_key(batch, metric), 0) for metric in METRICS}
+                for batch in batches
+            },
+            "scans_per_minute": [
+                [m * 60, values.get(SCANS_KEY % m, 0)] for m in minutes
+            ],
+        }
+
+    def snapshot(self):
+        """
+        Current counts. Shared by all viewers in this process and refreshed
+        at most once per GATE_LIVE_POLL_INTERVAL; the counters themselves
+        are only re-read when the version moved.
+        """
+        interval = getattr(settings, 'GATE_LIVE_POLL_INTERVAL', 1.0)
+        with self._lock:
+            now = time.monotonic()
+            if self._snapshot is not None and now - self._checked_at < interval:
+                return self._snapshot
+            version = cache.get(VERSION_KEY)
+            if version is None or self._snapshot is None or version != self._snapshot['version']:
+                # A change made while reading moves the version again, so
+                # the next check simply re-reads
+                self._snapshot = self._read(version)
+            self._checked_at = now
+            return self._snapshot
+
+    def reset(self):
+        with self._lock:
+            self._snapshot = None
+            self._checked_at = 0.0
+
+
+live_counts = LiveCounts()
+
+
+def on_commit_invalidate_counts():
+    transaction.on_commit(live_counts.invalidate)
@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from tickets.qr_signing import get_keys, sign_ticket_code, verify_ticket_payload
+
+
+class Command(BaseCommand):
+    help = "Benchmark signing and verifying ticket QR payloads (no database access)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=100_000)
+
+    def _time(self, label, func, payloads):
+        started = time.perf_counter()
+        for payload in payloads:
+            func(payload)
+        elapsed = time.perf_counter() - started
+        per_op = elapsed / len(payloads) * 1_000_000
+        self.stdout.write(f"{label:<18} {per_op:8.2f} us/op  {len(payloads) / elapsed:12,.0f} ops/s")
+
+    def handle(self, *args, **options):
+        n = max(options['iterations'], 1)
+        keys = get_keys()
+        codes = [str(i % 100_000).zfill(5) for i in range(n)]
+        signed = [sign_ticket_code(code) for code in codes]
+        forged = [payload[:-1] + ('A' if payload[-1] != 'A' else 'B') for payload in signed]
+
+        self.stdout.write(f"{n:,} payloads, {len(keys)} key(s), e.g. {signed[0]}")
+        self._time("sign", sign_ticket_code, codes)
+        self._time("verify (valid)", lambda p: verify_ticket_payload(p, keys), signed)
+        self._time("verify (forged)", lambda p: verify_ticket_payload(p, keys), forged)
+
+        rejected = sum(verify_ticket_payload(p, keys) is None for p in forged)
+        self.stdout.write(self.style.SUCCESS(f"forged payloads rejected: {rejected:,}/{n:,}"))
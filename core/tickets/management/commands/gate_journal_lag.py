@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from tickets.journal import journal_lag
+
+
+class Command(BaseCommand):
+    help = "Show how far the gate journal replicator is behind."
+
+    def handle(self, *args, **options):
+        lag = journal_lag()
+        self.stdout.write(f"journal:          {lag['journal']} ({lag['journal_bytes']} bytes)")
+        self.stdout.write(f"checkpoint:       {lag['checkpoint']}")
+        self.stdout.write(f"pending entries:  {lag['pending_entries']} ({lag['pending_bytes']} bytes)")
+        oldest = lag['oldest_pending_at']
+        self.stdout.write(f"oldest pending:   {oldest.isoformat() if oldest else '-'}")
+        self.stdout.write(f"lag:              {lag['lag_seconds']:.1f}s")
+        self.stdout.write(f"conflicts so far: {lag['conflicts']}")
@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, close_old_connections
+
+from tickets.journal import ReplicatorLock, replicate_once
+
+
+class Command(BaseCommand):
+    help = "Apply the event-mode gate journal to the database in batches (runs until stopped)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Drain the journal once and exit.")
+        parser.add_argument('--batch-size', type=int, help="Entries per transaction (default GATE_REPLICATOR_BATCH).")
+        parser.add_argument('--interval', type=float, default=1.0, help="Seconds to wait when the journal is drained.")
+
+    def handle(self, *args, **options):
+        try:
+            with ReplicatorLock():
+                self._run(options)
+        except RuntimeError as e:
+            raise CommandError(str(e))
+
+    def _run(self, options):
+        while True:
+            try:
+                stats = replicate_once(options['batch_size'])
+            except DatabaseError as e:
+                # Database unreachable: the journal keeps the entries; retry
+                if options['once']:
+                    raise CommandError(f"Replication failed: {e}")
+                self.stderr.write(f"Replication failed, retrying: {e}")
+                close_old_connections()
+                time.sleep(options['interval'])
+                continue
+
+            if stats['read']:
+                self.stdout.write(
+                    f"applied {stats['applied']}, replayed {stats['replayed']}, "
+                    f"conflicts {stats['conflicts']}, "
+                    f"checkpoint {stats['offset']}"
+                )
+                continue
+            if options['once']:
+                self.stdout.write(self.style.SUCCESS("Journal drained."))
+                return
+            time.sleep(options['interval'])
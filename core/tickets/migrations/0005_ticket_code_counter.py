@@ -0,0 +1,37 @@
+# Generated by Django 5.2.7 on 2026-10-19 11:17
+
+from django.db import migrations, models
+
+
+def seed_counter(apps, schema_editor):
+    Ticket = apps.get_model('tickets', 'Ticket')
+    TicketCodeCounter = apps.get_model('tickets', 'TicketCodeCounter')
+    highest = 0
+    for code in Ticket.objects.exclude(ticket_code__isnull=True).values_list('ticket_code', flat=True):
+        if code.isdigit():
+            highest = max(highest, int(code))
+    TicketCodeCounter.objects.get_or_create(name='ticket_code', defaults={'last_value': highest})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0004_remove_ticket_ticket_image_url'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TicketCodeCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('last_value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='ticket',
+            name='ticket_code',
+            field=models.CharField(editable=False, max_length=16, null=True, unique=True),
+        ),
+        migrations.RunPython(seed_counter, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-19 05:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0005_ticket_code_counter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ticket',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
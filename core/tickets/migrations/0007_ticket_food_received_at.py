@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-19 05:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0006_ticket_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ticket',
+            name='food_received_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
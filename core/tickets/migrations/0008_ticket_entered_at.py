@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-19 05:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0007_ticket_food_received_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ticket',
+            name='entered_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.7 on 2026-10-19 05:30
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0008_ticket_entered_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScanEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('action', models.CharField(choices=[('check', 'Check'), ('enter', 'Enter'), ('food', 'Food')], max_length=10)),
+                ('source', models.CharField(choices=[('qr', 'QR'), ('phone', 'Phone'), ('batch', 'Batch')], max_length=10)),
+                ('scanned_value', models.CharField(blank=True, max_length=64)),
+                ('ticket_code', models.CharField(blank=True, max_length=16, null=True)),
+                ('result', models.CharField(max_length=20)),
+                ('http_status', models.PositiveSmallIntegerField()),
+                ('scanner_id', models.CharField(blank=True, max_length=64)),
+                ('latency_ms', models.FloatField()),
+                ('admin', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['scanner_id', 'created_at'], name='scanevent_scanner_created')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-19 05:57
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0009_scan_event'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(condition=models.Q(('food_received', True)), fields=['user'], name='ticket_food_served'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(condition=models.Q(('entered_at__isnull', False)), fields=['user'], name='ticket_entered'),
+        ),
+    ]
@@ -1,5 +1,6 @@
 import uuid
 from django.db import models
+from django.utils import timezone
 from accounts.models import User
 
 class Ticket(models.Model):
@@ -7,19 +8,74 @@ class Ticket(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='tickets')
     # gift_received = models.BooleanField(default=False)
     food_received = models.BooleanField(default=False)
+    food_received_at = models.DateTimeField(null=True, blank=True)
+    entered_at = models.DateTimeField(null=True, blank=True)
     has_donation = models.BooleanField(default=False)
-    ticket_code = models.CharField(max_length=5, unique=True, editable=False,null=True)
+    ticket_code = models.CharField(max_length=16, unique=True, editable=False,null=True)
+    # Roster sync cursor: bumped whenever anything shown at the gate changes
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            # Attendance counts: only the (few) marked tickets are indexed
+            models.Index(fields=['user'], name='ticket_food_served', condition=models.Q(food_received=True)),
+            models.Index(fields=['user'], name='ticket_entered', condition=models.Q(entered_at__isnull=False)),
+        ]
 
     def save(self, *args, **kwargs):
         if not self.ticket_code:
-            # Generate sequential unique ticket code
-            last_ticket = Ticket.objects.order_by('-ticket_code').first()
-            if last_ticket and last_ticket.ticket_code.isdigit():
-                new_code = int(last_ticket.ticket_code) + 1
-            else:
-                new_code = 1
-            self.ticket_code = str(new_code).zfill(5)  # e.g., 00001, 00002
+            # Sequential unique ticket code from the block allocator, e.g. 00001
+            from .codes import allocate_ticket_code
+            self.ticket_code = allocate_ticket_code()
         super().save(*args, **kwargs)
 
     def __str__(self):
         return f"Ticket {self.ticket_code} for {self.user.phone}"
+
+
+class TicketCodeCounter(models.Model):
+    """
+    Counter row behind the ticket code allocator. `last_value` is the highest
+    code number handed out to any worker; workers reserve blocks above it.
+    """
+    name = models.CharField(max_length=50, unique=True)
+    last_value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name}: {self.last_value}"
+
+
+class ScanEvent(models.Model):
+    """
+    Append-only log of gate scans. Rows are buffered in memory and written
+    in bulk by tickets.scan_log, never on the request path.
+    """
+    ACTION_CHOICES = [
+        ('check', 'Check'),
+        ('enter', 'Enter'),
+        ('food', 'Food'),
+    ]
+    SOURCE_CHOICES = [
+        ('qr', 'QR'),
+        ('phone', 'Phone'),
+        ('batch', 'Batch'),
+    ]
+
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    source = models.CharField(max_length=10, choices=SOURCE_CHOICES)
+    scanned_value = models.CharField(max_length=64, blank=True)
+    ticket_code = models.CharField(max_length=16, null=True, blank=True)
+    result = models.CharField(max_length=20)
+    http_status = models.PositiveSmallIntegerField()
+    scanner_id = models.CharField(max_length=64, blank=True)
+    admin = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL, related_name='+')
+    latency_ms = models.FloatField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['scanner_id', 'created_at'], name='scanevent_scanner_created'),
+        ]
+
+    def __str__(self):
+        return f"{self.action} {self.scanned_value} -> {self.result}"
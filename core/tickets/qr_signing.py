@@ -0,0 +1,106 @@
+"""
+Signed ticket QR payloads.
+
+A signed payload is the ticket code plus a short HMAC tag:
+
+    <ticket_code>.<key_id>.<tag>        e.g. 00042.K1.7KQ3M9ZD
+
+Every character is in the QR alphanumeric set, so the payload still fits a
+small QR. The tag is a truncated HMAC-SHA256 of the code, base32 encoded, so
+a forged or mistyped code is rejected before any roster or database lookup.
+
+Keys come from TICKET_QR_KEYS ({key_id: secret}); new payloads are signed
+with TICKET_QR_ACTIVE_KEY. To rotate, add a new key, make it active, and
+remove the old one once the tickets printed with it are no longer in use.
+With no keys configured a single key K1 is derived from SECRET_KEY.
+"""
+import base64
+import hashlib
+import hmac
+
+from django.conf import settings
+from django.utils.crypto import salted_hmac
+
+SEPARATOR = '.'
+DEFAULT_KEY_ID = 'K1'
+TAG_BYTES = 5  # 40 bits -> 8 base32 characters
+
+_derived = {}
+
+
+def get_keys():
+    """Configured verification keys as {key_id: secret bytes}."""
+    configured = getattr(settings, 'TICKET_QR_KEYS', None) or {}
+    if not configured:
+        cache_key = (DEFAULT_KEY_ID, settings.SECRET_KEY)
+        if cache_key not in _derived:
+            _derived[cache_key] = salted_hmac(
+                'tickets.qr_signing', DEFAULT_KEY_ID, algorithm='sha256'
+            ).digest()
+        return {DEFAULT_KEY_ID: _derived[cache_key]}
+    return {
+        kid.upper(): secret.encode() if isinstance(secret, str) else secret
+        for kid, secret in configured.items()
+    }
+
+
+def get_active_key_id():
+    keys = get_keys()
+    active = (getattr(settings, 'TICKET_QR_ACTIVE_KEY', None) or '').upper()
+    if active in keys:
+        return active
+    return next(iter(keys))
+
+
+def _tag(secret, ticket_code):
+    digest = hmac.new(secret, ticket_code.encode(), hashlib.sha256).digest()
+    return base64.b32encode(digest[:TAG_BYTES]).decode()
+
+
+def sign_ticket_code(ticket_code, key_id=None):
+    """Signed QR payload for a ticket code, using the active key by default."""
+    keys = get_keys()
+    key_id = (key_id or get_active_key_id()).upper()
+    return SEPARATOR.join((ticket_code, key_id, _tag(keys[key_id], ticket_code)))
+
+
+def is_signed_payload(value):
+    return SEPARATOR in (value or '')
+
+
+def verify_ticket_payload(payload, keys=None):
+    """
+    Return the ticket code from a signed payload, or None if the payload is
+    malformed, uses an unknown key id, or the tag does not match.
+    """
+    parts = (payload or '').strip().upper().split(SEPARATOR)
+    if len(parts) != 3:
+        return None
+    ticket_code, key_id, tag = parts
+    secret = (keys or get_keys()).get(key_id)
+    if secret is None or not ticket_code:
+        return None
+    if not hmac.compare_digest(tag, _tag(secret, ticket_code)):
+        return None
+    return ticket_code
+
+
+def qr_payload(ticket_code):
+    """What the ticket QR encodes: signed payload or the bare code (TICKET_QR_SIGNED)."""
+    if ticket_code and getattr(settings, 'TICKET_QR_SIGNED', False):
+        return sign_ticket_code(ticket_code)
+    return ticket_code
+
+
+def resolve_scanned_code(value):
+    """
+    Ticket code for a scanned value, or None when it must be rejected.
+
+    Signed payloads are verified; bare codes are accepted unless
+    TICKET_QR_REQUIRE_SIGNED is set.
+    """
+    if is_signed_payload(value):
+        return verify_ticket_payload(value)
+    if getattr(settings, 'TICKET_QR_REQUIRE_SIGNED', False):
+        return None
+    return value
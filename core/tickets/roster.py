@@ -0,0 +1,326 @@
+"""
+Per-process gate roster index.
+
+Maps ticket_code and normalized phone to a compact RosterRecord so gate
+validity checks are answered from memory. Every worker loads the roster
+once; afterwards changes are shared through the cache:
+
+- a version counter (VERSION_KEY) is bumped for every roster change, and
+- the changed record is stored under CHANGE_KEY % version,
+
+so other workers replay just the changed records instead of reloading.
+If a change entry has expired, or the roster is older than
+GATE_ROSTER_MAX_AGE seconds, the worker falls back to a full reload.
+"""
+import re
+import threading
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+
+VERSION_KEY = 'gate:roster:version'
+CHANGE_KEY = 'gate:roster:change:%d'
+CHANGE_TTL = 600
+MAX_REPLAY = 500
+
+RosterRecord = namedtuple('RosterRecord', [
+    'ticket_id', 'ticket_code', 'user_id', 'name', 'batch', 'phone',
+    'profession', 'subject', 'profile_image', 'food_received', 'entered',
+    'has_donation', 'registration_approved', 'thumbnail',
+])
+
+_PUT, _DROP, _RELOAD = 'put', 'drop', 'reload'
+
+
+def normalize_phone(phone):
+    """Normalize a Bangladeshi phone number to its local 01XXXXXXXXX form."""
+    digits = re.sub(r'\D', '', phone or '')
+    if digits.startswith('880'):
+        digits = '0' + digits[3:]
+    elif digits.startswith('1') and len(digits) == 10:
+        digits = '0' + digits
+    return digits
+
+
+def _image_url(image):
+    if not image:
+        return None
+    try:
+        return image.url
+    except Exception:
+        return str(image)
+
+
+def _thumbnail_url(image):
+    """Pre-sized square Cloudinary thumbnail for the scanner screen."""
+    if not image:
+        return None
+    size = getattr(settings, 'GATE_THUMBNAIL_SIZE', 96)
+    try:
+        return image.build_url(
+            width=size, height=size, crop='fill', gravity='face',
+            fetch_format='auto', quality='auto', secure=True,
+        )
+    except Exception:
+        return _image_url(image)
+
+
+def annotated_tickets():
+    """Tickets annotated with whether the user's registration payment is approved."""
+    from payments.models import Payment
+    from .models import Ticket
+
+    approved = Payment.objects.filter(
+        user=OuterRef('user_id'), payment_type='registration', payment_approved=True
+    )
+    return Ticket.objects.annotate(registration_approved=Exists(approved))
+
+
+def roster_queryset():
+    """Ticket rows in roster shape, including registration payment approval."""
+    return annotated_tickets().values_list(
+        'id', 'ticket_code', 'user_id', 'user__name', 'user__batch', 'user__phone',
+        'user__profession', 'user__subject', 'user__profile_image', 'food_received',
+        'entered_at', 'has_donation', 'registration_approved',
+    )
+
+
+def _to_record(row):
+    # Image URLs are generated once here, not on every scan
+    row = list(row)
+    image = row[8]
+    row[8] = _image_url(image)
+    row[10] = row[10] is not None
+    return RosterRecord(*row, thumbnail=_thumbnail_url(image))
+
+
+class RosterIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._by_id = {}
+        self._by_code = {}
+        self._by_phone = {}
+        self._version = None
+        self._loaded_at = None
+
+    # ── Loading / syncing ───────────────────────────────────────────
+    def _max_age(self):
+        return getattr(settings, 'GATE_ROSTER_MAX_AGE', 300)
+
+    def _reload(self, version):
+        records = [_to_record(row) for row in roster_queryset().iterator()]
+        self._by_id, self._by_code, self._by_phone = {}, {}, {}
+        for record in records:
+            self._put(record)
+        self._version = version
+        self._loaded_at = time.monotonic()
+
+    def _put(self, record):
+        self._drop(record.ticket_id)
+        self._by_id[record.ticket_id] = record
+        if record.ticket_code:
+            self._by_code[record.ticket_code] = record
+        if record.phone:
+            self._by_phone[normalize_phone(record.phone)] = record
+
+    def _drop(self, ticket_id):
+        old = self._by_id.pop(ticket_id, None)
+        if old is None:
+            return
+        if self._by_code.get(old.ticket_code) is old:
+            del self._by_code[old.ticket_code]
+        phone = normalize_phone(old.phone)
+        if self._by_phone.get(phone) is old:
+            del self._by_phone[phone]
+
+    def _apply(self, change):
+        kind, payload = change
+        if kind == _PUT:
+            self._put(RosterRecord(*payload))
+        elif kind == _DROP:
+            self._drop(payload)
+
+    def _shared_version(self):
+        version = cache.get(VERSION_KEY)
+        if version is None:
+            cache.add(VERSION_KEY, 0, None)
+            version = cache.get(VERSION_KEY, 0)
+        return version
+
+    def reset(self):
+        """Forget the loaded roster; the next lookup reloads it."""
+        with self._lock:
+            self._by_id, self._by_code, self._by_phone = {}, {}, {}
+            self._version = None
+            self._loaded_at = None
+
+    def sync(self):
+        """Bring the local index up to the shared version."""
+        shared = self._shared_version()
+        with self._lock:
+            expired = (
+                self._loaded_at is None
+                or time.monotonic() - self._loaded_at > self._max_age()
+            )
+            if expired:
+                self._reload(shared)
+                return
+            if shared == self._version:
+                return
+            if shared < self._version or shared - self._version > MAX_REPLAY:
+                self._reload(shared)
+                return
+            keys = [CHANGE_KEY % v for v in range(self._version + 1, shared + 1)]
+            changes = cache.get_many(keys)
+            if len(changes) != len(keys) or any(changes[k][0] == _RELOAD for k in keys):
+                self._reload(shared)
+                return
+            for key in keys:
+                self._apply(changes[key])
+            self._version = shared
+
+    # ── Lookups ─────────────────────────────────────────────────────
+    def get_by_code(self, ticket_code):
+        self.sync()
+        return self._by_code.get(ticket_code)
+
+    def get_by_phone(self, phone):
+        self.sync()
+        return self._by_phone.get(normalize_phone(phone))
+
+    def records(self):
+        self.sync()
+        with self._lock:
+            return list(self._by_id.values())
+
+    # ── Publishing changes ──────────────────────────────────────────
+    def _publish(self, change):
+        try:
+            version = cache.incr(VERSION_KEY)
+        except ValueError:
+            cache.add(VERSION_KEY, 0, None)
+            version = cache.incr(VERSION_KEY)
+        cache.set(CHANGE_KEY % version, change, CHANGE_TTL)
+        with self._lock:
+            if self._loaded_at is None:
+                return
+            if change[0] == _RELOAD:
+                self._loaded_at = None
+                return
+            self._apply(change)
+            if self._version == version - 1:
+                self._version = version
+
+    def publish_tickets(self, **filters):
+        """Re-read the matching tickets and publish their current records."""
+        for row in roster_queryset().filter(**filters):
+            self._publish((_PUT, tuple(_to_record(row))))
+
+    def publish_record(self, record):
+        """Publish a record the caller already holds (no database read)."""
+        self._publish((_PUT, tuple(record)))
+
+    def publish_removal(self, ticket_id):
+        self._publish((_DROP, ticket_id))
+
+    def invalidate(self):
+        """Ask every worker to reload (used after bulk changes)."""
+        self._publish((_RELOAD, None))
+
+
+roster = RosterIndex()
+
+
+def on_commit_publish(**filters):
+    transaction.on_commit(lambda: roster.publish_tickets(**filters))
+
+
+def on_commit_publish_record(record):
+    transaction.on_commit(lambda: roster.publish_record(record))
+
+
+def record_from_phone_row(row):
+    """Build a roster record from a gate.lookup_by_phone() row."""
+    return RosterRecord(
+        ticket_id=row['ticket_id'],
+        ticket_code=row['ticket_code'],
+        user_id=row['id'],
+        name=row['name'],
+        batch=row['batch'],
+        phone=row['phone'],
+        profession=row['profession'],
+        subject=row['subject'],
+        profile_image=_image_url(row['profile_image']),
+        thumbnail=_thumbnail_url(row['profile_image']),
+        food_received=row['food_received'],
+        entered=row['entered_at'] is not None,
+        has_donation=row['has_donation'],
+        registration_approved=row['registration_approved'],
+    )
+
+
+def record_by_code(ticket_codes):
+    """Database read for a code the roster does not know yet (one query)."""
+    row = roster_queryset().filter(ticket_code__in=ticket_codes).first()
+    return _to_record(row) if row is not None else None
+
+
+def on_commit_invalidate():
+    transaction.on_commit(roster.invalidate)
+
+
+# ── Offline scanner sync ────────────────────────────────────────────
+SYNC_FIELDS = ['code', 'name', 'batch', 'phone', 'food', 'approved', 'entered']
+
+
+def sync_cursor(dt):
+    """Encode a timestamp as the opaque roster sync cursor (epoch microseconds)."""
+    return str(int(dt.timestamp() * 1_000_000))
+
+
+def parse_sync_cursor(cursor):
+    """Decode a sync cursor; returns None when it is malformed."""
+    from datetime import datetime, timezone as dt_timezone
+
+    try:
+        return datetime.fromtimestamp(int(cursor) / 1_000_000, tz=dt_timezone.utc)
+    except (TypeError, ValueError, OverflowError, OSError):
+        return None
+
+
+def sync_rows(queryset):
+    """Compact positional rows (see SYNC_FIELDS) for the scanner roster."""
+    return [
+        [code, name, batch, normalize_phone(phone), food, approved, entered_at is not None]
+        for code, name, batch, phone, food, approved, entered_at in queryset.values_list(
+            'ticket_code', 'user__name', 'user__batch', 'user__phone',
+            'food_received', 'registration_approved', 'entered_at',
+        ).iterator()
+    ]
+
+
+def gate_payload(record, thumbnail=False):
+    """
+    Compact gate representation of a roster record: only what the scanner
+    shows. With thumbnail=True the pre-sized thumbnail URL is included too.
+    """
+    user = {
+        "name": record.name,
+        "phone": record.phone,
+        "batch": record.batch,
+        "profession": record.profession,
+        "subject": record.subject,
+        "profile_image": record.profile_image,
+    }
+    if thumbnail:
+        user["thumbnail"] = record.thumbnail
+    return {
+        "ticket_code": record.ticket_code,
+        "food_received": record.food_received,
+        "entered": record.entered,
+        "user": user,
+    }
@@ -0,0 +1,251 @@
+"""
+Buffered gate scan event log.
+
+Gate views call `scan_log.record(...)`, which only appends an unsaved
+ScanEvent to an in-memory buffer. A background thread per process writes
+the buffer with one bulk INSERT every GATE_SCAN_LOG_FLUSH_INTERVAL seconds,
+or sooner once GATE_SCAN_LOG_BATCH_SIZE events are waiting. The request
+path never waits on the insert.
+
+With GATE_SCAN_LOG_ASYNC=False no thread is started: full batches are
+written inline and the rest on flush() (used by tests and commands).
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, DataError, IntegrityError, close_old_connections, transaction
+from django.db.models import Avg, Count, Q
+from django.db.models.functions import TruncMinute
+from django.utils import timezone
+
+from .live import live_counts
+from .models import ScanEvent
+
+logger = logging.getLogger(__name__)
+
+
+class ScanEventWriter:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buffer = []
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+        self.dropped = 0
+
+    def _setting(self, name, default):
+        return getattr(settings, name, default)
+
+    def _batch_size(self):
+        return self._setting('GATE_SCAN_LOG_BATCH_SIZE', 200)
+
+    def _trim(self):
+        """Keep the newest GATE_SCAN_LOG_MAX_BUFFER events. Call with the lock held."""
+        overflow = len(self._buffer) - self._setting('GATE_SCAN_LOG_MAX_BUFFER', 10000)
+        if overflow > 0:
+            del self._buffer[:overflow]
+            self.dropped += overflow
+        return max(overflow, 0)
+
+    def _ensure_thread(self):
+        # Started lazily and restarted after fork (e.g. gunicorn --preload)
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='scan-log-writer', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self._setting('GATE_SCAN_LOG_FLUSH_INTERVAL', 2.0))
+            self._wakeup.clear()
+            close_old_connections()
+            self.flush()
+
+    def record(self, **fields):
+        """Queue one unsaved scan event (no database access in async mode)."""
+        if not self._setting('GATE_SCAN_LOG_ENABLED', True):
+            return
+        event = ScanEvent(**fields)
+        with self._lock:
+            # Database unavailable for a long time: keep the newest events
+            self._buffer.append(event)
+            self._trim()
+            full = len(self._buffer) >= self._batch_size()
+
+        if self._setting('GATE_SCAN_LOG_ASYNC', True):
+            self._ensure_thread()
+            if full:
+                self._wakeup.set()
+        elif full:
+            self.flush()
+
+    def reset(self):
+        """Drop buffered events without writing them."""
+        with self._lock:
+            self._buffer = []
+
+    def pending(self):
+        with self._lock:
+            return len(self._buffer)
+
+    def _write(self, events):
+        """
+        Insert `events`; returns how many were written. A batch the database
+        rejects for its contents (DataError / IntegrityError) is split in
+        halves so only the offending events are dropped; other database
+        errors propagate and the caller keeps the events.
+        """
+        try:
+            with transaction.atomic():
+                ScanEvent.objects.bulk_create(events, batch_size=self._batch_size())
+            return len(events)
+        except (DataError, IntegrityError):
+            for event in events:
+                event.pk = None
+            if len(events) == 1:
+                logger.warning("Dropped a gate scan event the database rejected: %r", events[0].scanned_value)
+                with self._lock:
+                    self.dropped += 1
+                return 0
+            middle = len(events) // 2
+            return self._write(events[:middle]) + self._write(events[middle:])
+
+    def flush(self):
+        """Write all buffered events; returns how many were written."""
+        with self._lock:
+            events, self._buffer = self._buffer, []
+        if not events:
+            return 0
+        try:
+            return self._write(events)
+        except DatabaseError:
+            logger.exception("Could not write %d gate scan events; keeping them for the next flush", len(events))
+            with self._lock:
+                self._buffer[:0] = events
+                dropped = self._trim()
+            if dropped:
+                logger.warning("Gate scan log buffer full; dropped the %d oldest events", dropped)
+            return 0
+
+
+scan_log = ScanEventWriter()
+atexit.register(scan_log.flush)
+
+
+class ScanLogMixin:
+    """
+    Records a ScanEvent for every response of a gate APIView.
+
+    Views set `scan_action` and `scan_source`; the scanned value is taken
+    from the `ticket_code` or `phone` URL kwarg (a phone kwarg makes the
+    source 'phone'), the counter from the X-Scanner-Id header.
+    """
+    scan_action = 'check'
+    scan_source = 'qr'
+
+    def initial(self, request, *args, **kwargs):
+        started = time.perf_counter()
+        super().initial(request, *args, **kwargs)
+        self._scan_started = started
+
+    def get_scan_action(self, request, response):
+        return self.scan_action
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        started = getattr(self, '_scan_started', None)
+        if started is None:
+            # Rejected before the handler ran (authentication / permissions)
+            return response
+        try:
+            self._record_scan(request, response, kwargs, (time.perf_counter() - started) * 1000)
+        except Exception:
+            logger.exception("Could not record gate scan event")
+        return response
+
+    def _record_scan(self, request, response, kwargs, latency_ms):
+        data = response.data if isinstance(getattr(response, 'data', None), dict) else {}
+        common = {
+            'action': self.get_scan_action(request, response),
+            'source': 'phone' if kwargs.get('phone') else self.scan_source,
+            'http_status': response.status_code,
+            'scanner_id': (request.headers.get('X-Scanner-Id') or '')[:64],
+            'admin_id': getattr(request.user, 'pk', None),
+            'latency_ms': latency_ms,
+        }
+        if 'results' in data:
+            live_counts.count_scans(len(data['results']))
+            # Batch views set `resolved_codes`: the stored code of each scan,
+            # which differs from the scanned value for signed payloads
+            resolved = getattr(self, 'resolved_codes', None) or [None] * len(data['results'])
+            for item, code in zip(data['results'], resolved):
+                scan_log.record(
+                    scanned_value=str(item['ticket_code'])[:64],
+                    ticket_code=code if item['status'] != 'not_found' else None,
+                    result=item['status'],
+                    **common,
+                )
+            return
+        live_counts.count_scans()
+        ticket = data.get('ticket') or {}
+        scan_log.record(
+            scanned_value=str(kwargs.get('ticket_code') or kwargs.get('phone') or '')[:64],
+            ticket_code=ticket.get('ticket_code') or data.get('ticket_code'),
+            result=str(data.get('status') or response.status_code)[:20],
+            **common,
+        )
+
+
+def scan_rate_report(minutes=60):
+    """
+    Scans per minute per counter over the last `minutes` minutes.
+
+    Returns (counters, window_start): one dict per scanner_id with totals,
+    the average and peak per-minute rate, duplicates (already_marked),
+    rejections (HTTP 4xx) and average latency, plus per-minute counts.
+    """
+    window_start = timezone.now() - timedelta(minutes=minutes)
+    rows = (
+        ScanEvent.objects.filter(created_at__gte=window_start)
+        .annotate(minute=TruncMinute('created_at'))
+        .values('scanner_id', 'minute')
+        .annotate(
+            total=Count('id'),
+            duplicates=Count('id', filter=Q(result='already_marked')),
+            rejected=Count('id', filter=Q(http_status__gte=400)),
+            latency=Avg('latency_ms'),
+        )
+        .order_by('scanner_id', 'minute')
+    )
+
+    counters = {}
+    for row in rows:
+        counter = counters.setdefault(row['scanner_id'], {
+            'scanner_id': row['scanner_id'] or '(unknown)',
+            'total': 0, 'duplicates': 0, 'rejected': 0, 'peak': 0,
+            'latency_sum': 0.0, 'minutes': [],
+        })
+        counter['total'] += row['total']
+        counter['duplicates'] += row['duplicates']
+        counter['rejected'] += row['rejected']
+        counter['peak'] = max(counter['peak'], row['total'])
+        counter['latency_sum'] += (row['latency'] or 0) * row['total']
+        counter['minutes'].append((row['minute'], row['total']))
+
+    result = []
+    for counter in counters.values():
+        active = len(counter['minutes'])
+        counter['per_minute'] = round(counter['total'] / active, 1) if active else 0
+        counter['avg_latency_ms'] = round(counter.pop('latency_sum') / counter['total'], 1)
+        result.append(counter)
+    result.sort(key=lambda c: -c['total'])
+    return result, window_start
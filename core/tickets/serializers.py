@@ -7,4 +7,17 @@ class TicketSerializer(serializers.ModelSerializer):
     class Meta:
         model = Ticket
         fields = "__all__"
-        read_only_fields = ['user', 'id','has_donation']
\ No newline at end of file
+        read_only_fields = ['user', 'id','has_donation']
+
+class FoodScanSerializer(serializers.Serializer):
+    ticket_code = serializers.CharField(max_length=64)
+    scanned_at = serializers.DateTimeField(required=False, allow_null=True)
+
+
+class FoodScanBatchSerializer(serializers.Serializer):
+    scans = FoodScanSerializer(many=True, allow_empty=False, max_length=1000)
+
+
+class GateActionSerializer(serializers.Serializer):
+    action = serializers.ChoiceField(choices=['check', 'enter', 'food'], default='check')
+    dry_run = serializers.BooleanField(default=False)
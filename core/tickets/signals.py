@@ -0,0 +1,68 @@
+# tickets/signals.py
+from django.db import transaction
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from accounts.models import User
+from payments.models import Payment
+from .models import Ticket
+from .live import on_commit_invalidate_counts
+from .roster import roster, on_commit_publish
+
+
+@receiver(post_save, sender=Ticket)
+def publish_ticket_to_roster(sender, instance, created, **kwargs):
+    """Keep every worker's gate roster in step with ticket state changes."""
+    on_commit_publish(id=instance.pk)
+    if created:
+        on_commit_invalidate_counts()
+
+
+@receiver(post_delete, sender=Ticket)
+def remove_ticket_from_roster(sender, instance, **kwargs):
+    ticket_id = instance.pk
+    transaction.on_commit(lambda: roster.publish_removal(ticket_id))
+    on_commit_invalidate_counts()
+
+
+# User fields shown at the gate (see roster.RosterRecord)
+ROSTER_USER_FIELDS = ('name', 'batch', 'phone', 'profession', 'subject', 'profile_image')
+
+
+def _roster_fields(user):
+    # Deferred fields are left out rather than loaded with a query each
+    return {
+        field: str(user.__dict__[field] or '') if field == 'profile_image' else user.__dict__[field]
+        for field in ROSTER_USER_FIELDS if field in user.__dict__
+    }
+
+
+@receiver(post_init, sender=User)
+def remember_roster_fields(sender, instance, **kwargs):
+    instance._roster_fields = _roster_fields(instance)
+
+
+@receiver(post_save, sender=User)
+def publish_user_to_roster(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Name / batch / phone changes show up at the gate. Saves that touch
+    nothing the gate shows (last_login, password) publish nothing.
+    """
+    before, after = instance._roster_fields, _roster_fields(instance)
+    instance._roster_fields = after
+    if created:
+        return
+    if update_fields is not None and not set(update_fields) & set(ROSTER_USER_FIELDS):
+        return
+    if all(field in before and before[field] == value for field, value in after.items()):
+        return
+    Ticket.objects.filter(user_id=instance.pk).update(updated_at=timezone.now())
+    on_commit_publish(user_id=instance.pk)
+
+
+@receiver(post_save, sender=Payment)
+def publish_payment_to_roster(sender, instance, **kwargs):
+    """Registration approval state is part of the roster record."""
+    if instance.payment_type == 'registration':
+        Ticket.objects.filter(user_id=instance.user_id).update(updated_at=timezone.now())
+        on_commit_publish(user_id=instance.user_id)
@@ -1,3 +1,800 @@
-from django.test import TestCase
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import cloudinary
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.db import DatabaseError, connection, transaction
+from django.test import AsyncClient, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from accounts.models import User
+from core.query_plans import IndexPlanTestCase
+from payments.models import Payment
+from .codes import allocate_ticket_codes, allocator, ticket_code_candidates
+from .gate import ALREADY_MARKED, NOT_FOUND, SUCCESS, lookup_by_phone, mark_food_received
+from .journal import journal, journal_lag, replicate_once, write_checkpoint
+from .live import live_counts
+from .models import Ticket, ScanEvent, TicketCodeCounter
+from .qr_signing import sign_ticket_code, verify_ticket_payload
+from .roster import CHANGE_KEY, VERSION_KEY, RosterIndex, roster
+from .scan_log import scan_log, scan_rate_report
+
+
+@override_settings(GATE_SCAN_LOG_ENABLED=False)
+class GateTestCase(TestCase):
+    """
+    Staff client plus one guest (01711111111) with an approved registration
+    and therefore a ticket. The roster is synced unless `sync_roster` is off.
+    """
+    sync_roster = True
+
+    def setUp(self):
+        cache.clear()
+        roster.reset()
+        live_counts.reset()
+        self.admin = User.objects.create_superuser(phone='01900000000', password='x')
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        self.guest = self.create_guest('01711111111', name='Guest One', batch='2019')
+        self.ticket = Ticket.objects.get(user=self.guest)
+        self.code = self.ticket.ticket_code
+        if self.sync_roster:
+            roster.sync()
+
+    def create_guest(self, phone, approved=True, transaction_id=None, **fields):
+        guest = User.objects.create_user(phone=phone, password='x', **fields)
+        Payment.objects.create(
+            user=guest, transaction_id=transaction_id or f'TX{phone}', amount=500,
+            payment_type='registration', payment_approved=approved,
+        )
+        return guest
+
+
+class TicketPreviewTests(GateTestCase):
+    """The preview is rendered once per ticket state; repeats are answered 304."""
+    url = '/api/ticket/preview/'
+    sync_roster = False
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.guest)
+
+    def test_etag_and_not_modified(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertTrue(response.content.startswith(b'\xff\xd8'))
+        etag = response['ETag']
+
+        with mock.patch('tickets.views.render_ticket_image') as render:
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertIn('private', response['Cache-Control'])
+        render.assert_not_called()
+
+        # Anything printed on the ticket changes the ETag
+        User.objects.filter(pk=self.guest.pk).update(name='Guest Renamed')
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_no_ticket(self):
+        self.client.force_authenticate(self.create_guest('01722222222', approved=False))
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+
+class RosterReplicationTests(GateTestCase):
+    """Workers replay published roster changes from the cache instead of reloading."""
+
+    def setUp(self):
+        super().setUp()
+        # A second worker's roster, loaded at the same version
+        self.other = RosterIndex()
+        self.other.sync()
+
+    def test_published_record_is_replayed_without_queries(self):
+        record = roster.get_by_code(self.code)
+        roster.publish_record(record._replace(food_received=True))
+        self.assertTrue(roster.get_by_code(self.code).food_received)
+
+        with self.assertNumQueries(0):
+            self.assertTrue(self.other.get_by_code(self.code).food_received)
+            self.assertTrue(self.other.get_by_phone('+8801711111111').food_received)
+
+        roster.publish_removal(self.ticket.pk)
+        with self.assertNumQueries(0):
+            self.assertIsNone(self.other.get_by_code(self.code))
+
+    def test_missing_change_falls_back_to_reload(self):
+        roster.publish_record(roster.get_by_code(self.code)._replace(name='Changed'))
+        cache.delete(CHANGE_KEY % cache.get(VERSION_KEY))
+        with self.assertNumQueries(1):
+            record = self.other.get_by_code(self.code)
+        # Reloaded from the database, which never saw the change
+        self.assertEqual(record.name, 'Guest One')
+
+    def test_unknown_code_falls_back_to_database(self):
+        # Issued on another worker: its change notice never reached this one
+        other = self.create_guest('01733333333', name='Guest Two')
+        code = Ticket.objects.get(user=other).ticket_code
+        self.assertIsNone(self.other.get_by_code(code))
+
+        response = self.client.get(f'/api/ticket/check-entrance/{code}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['ticket']['user']['name'], 'Guest Two')
+        # Published, so neither worker reads the database for it again
+        with self.assertNumQueries(0):
+            self.assertEqual(roster.get_by_code(code).name, 'Guest Two')
+            self.assertEqual(self.other.get_by_code(code).name, 'Guest Two')
+
+    def test_user_saves_publish_only_gate_fields(self):
+        guest = User.objects.get(pk=self.guest.pk)
+        with self.captureOnCommitCallbacks() as callbacks, self.assertNumQueries(1):
+            guest.last_login = timezone.now()
+            guest.set_password('y')
+            guest.save()
+        self.assertEqual(callbacks, [])
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            guest.name = 'Guest Renamed'
+            guest.save()
+        self.assertEqual(len(callbacks), 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.other.get_by_code(self.code).name, 'Guest Renamed')
+
+        # A deferred instance still publishes when a gate field is saved
+        guest = User.objects.only('id', 'batch').get(pk=self.guest.pk)
+        with self.captureOnCommitCallbacks() as callbacks:
+            guest.batch = '2020'
+            guest.save(update_fields=['batch'])
+        self.assertEqual(len(callbacks), 1)
+
+
+class RosterSyncTests(GateTestCase):
+    """Offline scanners pull the roster incrementally and poll it with ETags."""
+    url = '/api/ticket/roster/'
+
+    def setUp(self):
+        super().setUp()
+        self.other = self.create_guest('01722222222', batch='2020')
+        Ticket.objects.update(updated_at=timezone.now() - timedelta(hours=1))
+
+    def test_since_cursor_returns_only_changed_rows(self):
+        response = self.client.get(self.url)
+        self.assertTrue(response.data['full'])
+        self.assertEqual(len(response.data['rows']), 2)
+        code = response.data['fields'].index('code')
+
+        response = self.client.get(self.url, {'since': response.data['cursor']})
+        self.assertFalse(response.data['full'])
+        self.assertEqual(response.data['rows'], [])
+
+        other_code = Ticket.objects.get(user=self.other).ticket_code
+        Ticket.objects.filter(user=self.other).update(food_received=True, updated_at=timezone.now())
+        response = self.client.get(self.url, {'since': response.data['cursor']})
+        self.assertEqual([row[code] for row in response.data['rows']], [other_code])
+        self.assertTrue(response.data['rows'][0][response.data['fields'].index('food')])
+
+        response = self.client.get(self.url, {'since': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_unchanged_roster_is_not_modified(self):
+        response = self.client.get(self.url)
+        etag = response['ETag']
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+        Ticket.objects.filter(user=self.other).update(entered_at=timezone.now(), updated_at=timezone.now())
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class FoodScanBatchTests(GateTestCase):
+    """Queued scanner scans are applied in one transaction with per-code results."""
+    url = '/api/ticket/mark-food-received-batch/'
+
+    def setUp(self):
+        super().setUp()
+        self.served = Ticket.objects.get(user=self.create_guest('01722222222'))
+        Ticket.objects.filter(pk=self.served.pk).update(food_received=True)
+        self.future = Ticket.objects.get(user=self.create_guest('01733333333'))
+        roster.reset()
+        roster.sync()
+
+    def test_duplicate_unknown_and_served_codes(self):
+        earlier = timezone.now() - timedelta(minutes=10)
+        scans = [
+            {'ticket_code': self.code, 'scanned_at': (earlier + timedelta(minutes=5)).isoformat()},
+            {'ticket_code': '99999'},
+            {'ticket_code': self.served.ticket_code},
+            {'ticket_code': self.code, 'scanned_at': earlier.isoformat()},
+            {'ticket_code': self.future.ticket_code, 'scanned_at': (timezone.now() + timedelta(days=1)).isoformat()},
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(self.url, {'scans': scans}, format='json')
+        self.assertEqual(
+            [r['status'] for r in response.data['results']],
+            ['success', 'not_found', 'already_marked', 'already_marked', 'success'],
+        )
+        self.assertEqual(response.data['summary'], {'success': 2, 'already_marked': 2, 'not_found': 1})
+
+        # The earliest scan time of a repeated code is kept; future times are clamped
+        self.ticket.refresh_from_db()
+        self.assertEqual(self.ticket.food_received_at, earlier)
+        self.future.refresh_from_db()
+        self.assertLessEqual(self.future.food_received_at, timezone.now())
+
+        # Replaying the same batch changes nothing
+        response = self.client.post(self.url, {'scans': scans}, format='json')
+        self.assertEqual(response.data['summary'], {'success': 0, 'already_marked': 4, 'not_found': 1})
+        self.ticket.refresh_from_db()
+        self.assertEqual(self.ticket.food_received_at, earlier)
+
+
+@override_settings(GATE_DUPLICATE_WINDOW=0)
+class CompetingScanTests(GateTestCase):
+    """Two counters marking the same ticket: the conditional UPDATE lets one win."""
+
+    def test_only_one_mark_food_received_succeeds(self):
+        first, row = mark_food_received(ticket_code=self.code)
+        second, again = mark_food_received(ticket_code=self.code)
+        self.assertEqual((first, second), (SUCCESS, ALREADY_MARKED))
+        self.assertEqual(row['ticket_code'], self.code)
+        self.assertTrue(again['food_received'])
+        self.assertEqual(mark_food_received(ticket_code='99999'), (NOT_FOUND, None))
+
+    def test_only_one_succeeds_without_returning(self):
+        # e.g. MariaDB: INSERT ... RETURNING only
+        with mock.patch.object(connection, 'vendor', 'mysql'):
+            first, _ = mark_food_received(user_id=self.guest.pk)
+            second, _ = mark_food_received(user_id=self.guest.pk)
+        self.assertEqual((first, second), (SUCCESS, ALREADY_MARKED))
+
+    def test_counters_with_stale_rosters(self):
+        # The roster publish is left uncommitted, so the second counter
+        # still sees the ticket as unserved and reaches the database
+        url = f'/api/ticket/mark-food-received/{self.code}/'
+        response = self.client.post(url)
+        self.assertEqual(response.data['status'], 'success')
+        self.assertFalse(roster.get_by_code(self.code).food_received)
+        response = self.client.post(url)
+        self.assertEqual(response.data['status'], 'already_marked')
+        self.assertNotIn('duplicate', response.data)
+
+
+class PhoneFallbackQueryTests(GateTestCase):
+    """The phone fallback at the gate must stay a single joined query."""
+    sync_roster = False
+
+    def setUp(self):
+        super().setUp()
+        self.pending = self.create_guest('01722222222', approved=False)
+
+    def test_lookup_by_phone_is_one_query(self):
+        with self.assertNumQueries(1):
+            row = lookup_by_phone('01711111111')
+        self.assertTrue(row['registration_approved'])
+        self.assertEqual(row['ticket_code'], self.ticket.ticket_code)
+        self.assertFalse(row['food_received'])
+
+        with self.assertNumQueries(1):
+            self.assertIsNone(lookup_by_phone('01799999999'))
+
+    def test_check_entrance_phone_rejections(self):
+        roster.sync()
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/ticket/check-entrance-phone/01722222222/')
+        self.assertEqual(response.status_code, 403)
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/ticket/check-entrance-phone/01799999999/')
+        self.assertEqual(response.status_code, 404)
+
+    def test_mark_food_by_phone(self):
+        roster.sync()
+        with self.captureOnCommitCallbacks(execute=True), self.assertNumQueries(1):
+            response = self.client.post('/api/ticket/mark-food-received-phone/01711111111/')
+        self.assertEqual(response.data['status'], 'success')
+
+        with self.assertNumQueries(0):
+            response = self.client.post('/api/ticket/mark-food-received-phone/01711111111/')
+        self.assertEqual(response.data['status'], 'already_marked')
+
+        self.ticket.refresh_from_db()
+        self.assertTrue(self.ticket.food_received)
+
+    def test_mark_food_by_phone_without_roster_entry(self):
+        roster.sync()
+        Ticket.objects.filter(pk=self.ticket.pk).delete()
+        roster.reset()
+        roster.sync()
+        with self.assertNumQueries(1):
+            response = self.client.post('/api/ticket/mark-food-received-phone/01711111111/')
+        self.assertEqual(response.status_code, 404)
+
+
+class GateActionTests(GateTestCase):
+    """Combined check-and-act endpoint: one call, post-state in the response."""
+
+    def setUp(self):
+        super().setUp()
+        self.url = f'/api/ticket/gate/{self.code}/'
+
+    def test_dry_run_writes_nothing(self):
+        with self.assertNumQueries(0):
+            response = self.client.post(self.url, {'action': 'enter', 'dry_run': True})
+        self.assertEqual(response.data['status'], 'would_succeed')
+        self.assertFalse(response.data['ticket']['entered'])
+
+    def test_enter_once(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(self.url, {'action': 'enter'})
+        self.assertEqual(response.data['status'], 'success')
+        self.assertTrue(response.data['ticket']['entered'])
+        self.assertFalse(response.data['ticket']['food_received'])
+
+        response = self.client.post(self.url, {'action': 'enter'})
+        self.assertEqual(response.data['status'], 'already_marked')
+        self.ticket.refresh_from_db()
+        self.assertIsNotNone(self.ticket.entered_at)
+
+    def test_food_by_phone(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/ticket/gate-phone/01711111111/', {'action': 'food'})
+        self.assertEqual(response.data['status'], 'success')
+        self.assertTrue(response.data['ticket']['food_received'])
+
+
+class GatePayloadTests(GateTestCase):
+    """Gate responses carry only what the scanner shows; the thumbnail is opt-in."""
+
+    def test_slim_payload_and_thumbnail(self):
+        cloud_name = mock.patch.object(cloudinary.config(), 'cloud_name', 'demo')
+        cloud_name.start()
+        self.addCleanup(cloud_name.stop)
+        User.objects.filter(pk=self.guest.pk).update(profile_image='profiles/guest-one')
+        roster.reset()
+        url = f'/api/ticket/check-entrance/{self.code}/'
+
+        ticket = self.client.get(url).data['ticket']
+        self.assertEqual(set(ticket), {'ticket_code', 'food_received', 'entered', 'user'})
+        self.assertEqual(
+            set(ticket['user']), {'name', 'phone', 'batch', 'profession', 'subject', 'profile_image'}
+        )
+        self.assertEqual(ticket['user']['name'], 'Guest One')
+
+        with self.assertNumQueries(0):
+            ticket = self.client.get(url, {'thumbnail': '1'}).data['ticket']
+        thumbnail = ticket['user']['thumbnail']
+        self.assertIn('profiles/guest-one', thumbnail)
+        self.assertIn('w_96', thumbnail)
+        self.assertIn('c_fill', thumbnail)
+
+        response = self.client.post(
+            f'/api/ticket/gate/{self.code}/?thumbnail=1', {'action': 'check'}
+        )
+        self.assertEqual(response.data['ticket']['user']['thumbnail'], thumbnail)
+
+
+class SignedQRTests(GateTestCase):
+    """Signed QR payloads are checked before the roster or the database."""
+
+    def test_round_trip_and_tampering(self):
+        payload = sign_ticket_code(self.code)
+        self.assertEqual(verify_ticket_payload(payload), self.code)
+        self.assertEqual(verify_ticket_payload(payload.lower()), self.code)
+        other = str(int(self.code) + 1).zfill(len(self.code))
+        self.assertIsNone(verify_ticket_payload(other + payload[len(self.code):]))
+        self.assertIsNone(verify_ticket_payload(self.code + '.K9.AAAAAAAA'))
+
+    def test_key_rotation(self):
+        with override_settings(TICKET_QR_KEYS={'K1': 'old', 'K2': 'new'}, TICKET_QR_ACTIVE_KEY='K2'):
+            old = sign_ticket_code(self.code, key_id='K1')
+            new = sign_ticket_code(self.code)
+            self.assertIn('.K2.', new)
+            self.assertEqual(verify_ticket_payload(old), self.code)
+        with override_settings(TICKET_QR_KEYS={'K2': 'new'}):
+            self.assertIsNone(verify_ticket_payload(old))
+            self.assertEqual(verify_ticket_payload(new), self.code)
+
+    def test_gate_rejects_forged_payload_without_queries(self):
+        forged = sign_ticket_code(self.code)[:-1] + '0'
+        with self.assertNumQueries(0):
+            response = self.client.get(f'/api/ticket/check-entrance/{forged}/')
+        self.assertEqual(response.status_code, 404)
+
+        response = self.client.get(f'/api/ticket/check-entrance/{sign_ticket_code(self.code)}/')
+        self.assertEqual(response.data['ticket']['ticket_code'], self.code)
+
+    @override_settings(TICKET_QR_REQUIRE_SIGNED=True)
+    def test_bare_codes_rejected_when_signing_required(self):
+        response = self.client.get(f'/api/ticket/check-entrance/{self.code}/')
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(GATE_SCAN_LOG_ENABLED=True, GATE_SCAN_LOG_ASYNC=False)
+class ScanLogTests(GateTestCase):
+    """Gate scans are buffered and written in bulk, off the request path."""
+
+    def setUp(self):
+        super().setUp()
+        scan_log.reset()
+        self.addCleanup(scan_log.reset)
+
+    def test_scans_are_buffered_then_bulk_written(self):
+        with self.assertNumQueries(0):
+            self.client.get(f'/api/ticket/check-entrance/{self.code}/', HTTP_X_SCANNER_ID='gate-1')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/ticket/mark-food-received/{self.code}/', HTTP_X_SCANNER_ID='gate-1')
+        self.client.post(f'/api/ticket/mark-food-received/{self.code}/', HTTP_X_SCANNER_ID='gate-2')
+        self.client.get('/api/ticket/check-entrance/99999/', HTTP_X_SCANNER_ID='gate-2')
+        self.assertEqual(ScanEvent.objects.count(), 0)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(scan_log.flush(), 4)
+        self.assertEqual(sum(q['sql'].startswith('INSERT') for q in queries), 1)
+        results = list(ScanEvent.objects.order_by('id').values_list('scanner_id', 'action', 'result'))
+        self.assertEqual(results, [
+            ('gate-1', 'check', 'valid'),
+            ('gate-1', 'food', 'success'),
+            ('gate-2', 'food', 'already_marked'),
+            ('gate-2', 'check', 'invalid'),
+        ])
+
+        counters, _ = scan_rate_report(60)
+        by_counter = {c['scanner_id']: c for c in counters}
+        self.assertEqual(by_counter['gate-2']['duplicates'], 1)
+        self.assertEqual(by_counter['gate-2']['rejected'], 1)
+
+        self.client.force_login(self.admin)
+        response = self.client.get('/admin/tickets/scanevent/scan-rate/')
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(GATE_SCAN_LOG_MAX_BUFFER=3, GATE_SCAN_LOG_BATCH_SIZE=100)
+    def test_failed_flush_keeps_the_buffer_capped(self):
+        def record(value):
+            scan_log.record(scanned_value=value, action='check', result='valid', http_status=200, latency_ms=1)
+
+        def scans_arrive_then_fail(*args, **kwargs):
+            # New scans are buffered while the failing insert is in flight
+            for i in range(2):
+                record(f'new-{i}')
+            raise DatabaseError
+
+        dropped = scan_log.dropped
+        for i in range(3):
+            record(f'old-{i}')
+        with mock.patch.object(ScanEvent.objects, 'bulk_create', side_effect=scans_arrive_then_fail), \
+                self.assertLogs('tickets.scan_log', 'WARNING'):
+            self.assertEqual(scan_log.flush(), 0)
+        self.assertEqual(scan_log.pending(), 3)
+        self.assertEqual(scan_log.dropped - dropped, 2)
+
+        self.assertEqual(scan_log.flush(), 3)
+        self.assertEqual(
+            list(ScanEvent.objects.order_by('id').values_list('scanned_value', flat=True)),
+            ['old-2', 'new-0', 'new-1'],
+        )
+
+    def test_batch_logs_resolved_codes(self):
+        payload = sign_ticket_code(self.code)
+        self.client.post('/api/ticket/mark-food-received-batch/',
+                         {'scans': [{'ticket_code': payload}, {'ticket_code': '99999'}]}, format='json')
+        self.assertEqual(scan_log.flush(), 2)
+        self.assertEqual(
+            list(ScanEvent.objects.order_by('id').values_list('scanned_value', 'ticket_code', 'result')),
+            [(payload, self.code, 'success'), ('99999', None, 'not_found')],
+        )
+
+    def test_rejected_event_does_not_block_the_buffer(self):
+        dropped = scan_log.dropped
+        for i in range(4):
+            # NOT NULL violation for the third event only
+            scan_log.record(scanned_value=f'scan-{i}', action='check', result='valid',
+                            http_status=None if i == 2 else 200, latency_ms=1)
+        with self.assertLogs('tickets.scan_log', 'WARNING'):
+            self.assertEqual(scan_log.flush(), 3)
+        self.assertEqual(scan_log.pending(), 0)
+        self.assertEqual(scan_log.dropped - dropped, 1)
+        self.assertEqual(
+            list(ScanEvent.objects.order_by('id').values_list('scanned_value', flat=True)),
+            ['scan-0', 'scan-1', 'scan-3'],
+        )
+
+
+@override_settings(GATE_LIVE_POLL_INTERVAL=0, GATE_LIVE_STREAM_SECONDS=0)
+class LiveDashboardTests(GateTestCase):
+    """Live counts are bumped from the scan path, not recomputed per viewer."""
+    sync_roster = False
+
+    def setUp(self):
+        super().setUp()
+        self.create_guest('01711111112', batch='2019')
+        self.create_guest('01711111113', batch='2020')
+        roster.sync()
+
+    def test_counts_follow_scans_without_queries(self):
+        snapshot = live_counts.snapshot()
+        self.assertEqual((snapshot['tickets'], snapshot['entered'], snapshot['food']), (3, 0, 0))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/ticket/gate/{self.code}/', {'action': 'enter'})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/ticket/gate/{self.code}/', {'action': 'enter'})
+
+        with self.assertNumQueries(0):
+            snapshot = live_counts.snapshot()
+        self.assertEqual(snapshot['entered'], 1)
+        self.assertEqual(snapshot['batches']['2019'], {'tickets': 2, 'entered': 1, 'food': 0})
+        self.assertEqual(sum(count for _, count in snapshot['scans_per_minute']), 2)
+
+    async def _stream(self, url):
+        response = await AsyncClient().get(url)
+        if not response.streaming:
+            return response, None
+        return response, ''.join([chunk.decode() async for chunk in response.streaming_content])
+
+    def test_stream_requires_signed_stream_token(self):
+        stream = async_to_sync(self._stream)
+        response, _ = stream('/api/ticket/live/')
+        self.assertEqual(response.status_code, 401)
+        # Access tokens are not accepted in the URL
+        response, _ = stream(f'/api/ticket/live/?token={AccessToken.for_user(self.admin)}')
+        self.assertEqual(response.status_code, 401)
+
+        token = self.client.post('/api/ticket/live/token/').data['token']
+        response, body = stream(f'/api/ticket/live/?token={token}')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertIn('event: counts', body)
+        self.assertIn('"tickets": 3', body)
+
+        with self.settings(GATE_LIVE_TOKEN_MAX_AGE=-1):
+            response, _ = stream(f'/api/ticket/live/?token={token}')
+        self.assertEqual(response.status_code, 401)
+
+    def test_wsgi_clients_poll_counts(self):
+        token = self.client.post('/api/ticket/live/token/').data['token']
+        response = self.client.get(f'/api/ticket/live/?token={token}')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json()['counts_url'], '/api/ticket/live/counts/')
+
+        live_counts.snapshot()  # seed the shared counters
+        response = self.client.get('/api/ticket/live/counts/')
+        self.assertEqual(response.data['tickets'], 3)
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/ticket/live/counts/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+        self.client.force_authenticate(self.guest)
+        self.assertEqual(self.client.get('/api/ticket/live/counts/').status_code, 403)
+        self.assertEqual(self.client.post('/api/ticket/live/token/').status_code, 403)
+
+
+class DuplicateScanWindowTests(GateTestCase):
+    """A repeat scan within the window is flagged before reaching the database."""
+
+    def setUp(self):
+        super().setUp()
+        self.url = f'/api/ticket/mark-food-received/{self.code}/'
+
+    def test_repeat_scan_is_flagged_without_queries(self):
+        # The roster publish is left uncommitted, as on another worker
+        response = self.client.post(self.url, HTTP_X_SCANNER_ID='gate-1')
+        self.assertEqual(response.data['status'], 'success')
+
+        with self.assertNumQueries(0):
+            response = self.client.post(self.url, HTTP_X_SCANNER_ID='gate-2')
+        self.assertEqual(response.data['status'], 'already_marked')
+        self.assertTrue(response.data['duplicate'])
+        self.assertEqual(response.data['first_scan']['scanner_id'], 'gate-1')
+
+    @override_settings(GATE_DUPLICATE_WINDOW=0)
+    def test_window_can_be_disabled(self):
+        self.client.post(self.url)
+        response = self.client.post(self.url)
+        self.assertEqual(response.data['status'], 'already_marked')
+        self.assertNotIn('duplicate', response.data)
+
+
+@override_settings(TICKET_CODE_FORMAT='numeric', TICKET_CODE_BLOCK_SIZE=10)
+class TicketCodeAllocationTests(TestCase):
+    """Codes come from reserved counter blocks, never from reading the tickets table."""
+
+    def setUp(self):
+        allocator.reset()
+        self.addCleanup(allocator.reset)
+        self.user = User.objects.create_user(phone='01711111111', password='x')
+
+    def test_counter_continues_after_legacy_codes(self):
+        # No counter row yet (as before migration 0005 seeded one): it is
+        # created from the highest code already stored
+        TicketCodeCounter.objects.all().delete()
+        Ticket.objects.create(user=self.user, ticket_code='00041')
+        Ticket.objects.create(user=self.user, ticket_code='00007')
+
+        self.assertEqual(allocate_ticket_codes(2), ['00042', '00043'])
+        self.assertEqual(TicketCodeCounter.objects.get().last_value, 51)
+
+    def test_save_assigns_a_code(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            ticket = Ticket.objects.create(user=self.user)
+        self.assertEqual(ticket.ticket_code, '00001')
+        self.assertEqual(Ticket.objects.create(user=self.user).ticket_code, '00002')
+        # An explicit code is kept
+        self.assertEqual(Ticket.objects.create(user=self.user, ticket_code='00500').ticket_code, '00500')
+
+    def test_bulk_allocation_returns_distinct_codes(self):
+        codes = allocate_ticket_codes(25)
+        self.assertEqual(len(codes), 25)
+        self.assertEqual(len(set(codes)), 25)
+        self.assertEqual(codes, sorted(codes))
+
+    def test_rolled_back_reservation_is_not_reused(self):
+        try:
+            with transaction.atomic():
+                rolled_back = allocate_ticket_codes(1)
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        # The counter and the pool are untouched by the rolled-back block
+        self.assertEqual(TicketCodeCounter.objects.get().last_value, 0)
+        self.assertEqual(allocator._take_from_pool(1), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first = allocate_ticket_codes(1)
+        self.assertEqual(first, rolled_back)
+        # The committed block's remainder is served from memory
+        with self.assertNumQueries(0):
+            second = allocate_ticket_codes(1)
+        self.assertEqual(second, ['00002'])
+
+        try:
+            with transaction.atomic():
+                allocate_ticket_codes(20)
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        with self.captureOnCommitCallbacks(execute=True):
+            later = allocate_ticket_codes(20)
+        self.assertNotIn(first[0], later)
+        self.assertNotIn(second[0], later)
+        self.assertEqual(len(set(later)), 20)
+
+
+@override_settings(TICKET_CODE_FORMAT='check')
+class CheckCodeFormatTests(GateTestCase):
+    """Check-format codes: typos are rejected before any lookup, old codes keep working."""
+    sync_roster = False
+
+    def test_new_codes_carry_a_check_character(self):
+        code = self.ticket.ticket_code
+        self.assertTrue(code.isalpha())
+        self.assertEqual(ticket_code_candidates(code.lower())[0], code)
+        typo = code[:-1] + ('B' if code[-1] != 'B' else 'C')
+        self.assertEqual(ticket_code_candidates(typo), [])
+
+    def test_malformed_code_is_rejected_without_lookups(self):
+        roster.sync()
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/ticket/check-entrance/AAAAAB/')
+        self.assertEqual(response.status_code, 404)
+        # Malformed codes get the endpoints' JSON not-found body, not an HTML 404
+        for malformed in ('AA-AB', 'AA%20AB', 'x' * 100):
+            response = self.client.get(f'/api/ticket/check-entrance/{malformed}/')
+            self.assertEqual(response.status_code, 404)
+            self.assertEqual(response.json()['status'], 'invalid')
+        response = self.client.post('/api/ticket/mark-food-received/AA-AB/')
+        self.assertEqual(response.json(), {'status': 'error', 'detail': 'Ticket not found'})
+
+    def test_legacy_numeric_code_still_resolves(self):
+        Ticket.objects.filter(pk=self.ticket.pk).update(ticket_code='00042')
+        legacy = '00042'
+        roster.sync()
+        for scanned in (legacy, ticket_code_candidates(legacy)[0]):
+            response = self.client.get(f'/api/ticket/check-entrance/{scanned}/')
+            self.assertEqual(response.data['ticket']['ticket_code'], legacy)
+
+    def test_codes_survive_a_code_length_change(self):
+        Ticket.objects.filter(pk=self.ticket.pk).update(ticket_code='00042')
+        check = ticket_code_candidates('00042')[0]
+        self.assertEqual(len(check), 6)
+        roster.sync()
+        with self.settings(TICKET_CODE_LENGTH=7):
+            candidates = ticket_code_candidates('00042')
+            self.assertEqual(candidates[0], check)
+            self.assertIn('00042', candidates)
+            self.assertIn('0000042', candidates)
+            for scanned in ('00042', check):
+                response = self.client.get(f'/api/ticket/check-entrance/{scanned}/')
+                self.assertEqual(response.data['ticket']['ticket_code'], '00042')
+
+
+@override_settings(GATE_EVENT_MODE=True, GATE_DUPLICATE_WINDOW=0)
+class EventModeJournalTests(GateTestCase):
+    """Event mode acknowledges from a local journal; the replicator applies it later."""
+
+    def setUp(self):
+        super().setUp()
+        self.journal_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.journal_dir)
+        self.addCleanup(journal.reset)
+        settings_override = override_settings(GATE_JOURNAL_DIR=self.journal_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        journal.reset()
+        self.url = f'/api/ticket/mark-food-received/{self.code}/'
+        live_counts.seed()
+
+    def test_scan_is_journaled_then_replicated(self):
+        with self.assertNumQueries(0):
+            response = self.client.post(self.url)
+        self.assertEqual(response.data['status'], 'success')
+        response = self.client.post(self.url)
+        self.assertEqual(response.data['status'], 'already_marked')
+
+        self.ticket.refresh_from_db()
+        self.assertFalse(self.ticket.food_received)
+        self.assertEqual(journal_lag()['pending_entries'], 1)
+
+        stats = replicate_once()
+        self.assertEqual((stats['read'], stats['applied'], stats['conflicts']), (1, 1, 0))
+        self.ticket.refresh_from_db()
+        self.assertTrue(self.ticket.food_received)
+        self.assertEqual(journal_lag()['pending_entries'], 0)
+        self.assertEqual(replicate_once()['read'], 0)
+
+    def test_replay_after_crash_is_not_a_conflict(self):
+        self.client.post(self.url)
+        replicate_once()
+        # Crash before the checkpoint write: the batch is read again
+        write_checkpoint(0)
+        stats = replicate_once()
+        self.assertEqual((stats['read'], stats['applied'], stats['replayed'], stats['conflicts']), (1, 0, 1, 0))
+        self.assertEqual(journal_lag()['conflicts'], 0)
+
+    def test_conflicts_and_torn_lines_are_handled(self):
+        self.client.post(self.url)
+        # Marked through another path before replication: the database wins
+        Ticket.objects.filter(pk=self.ticket.pk).update(food_received=True)
+        with open(journal.path(), 'ab') as f:
+            f.write(b'{"id": "torn", "act')
+
+        stats = replicate_once()
+        self.assertEqual((stats['applied'], stats['conflicts']), (0, 1))
+        self.assertEqual(journal_lag()['conflicts'], 1)
+
+        # The next writer terminates the torn line; its own entry replicates
+        journal.reset()
+        other = self.create_guest('01722222222')
+        roster.reset()
+        code = Ticket.objects.get(user=other).ticket_code
+        self.client.post(f'/api/ticket/gate/{code}/', {'action': 'enter'})
+        with self.assertLogs('tickets.journal', 'ERROR'):
+            stats = replicate_once()
+        self.assertEqual((stats['read'], stats['applied']), (1, 1))
+        self.assertIsNotNone(Ticket.objects.get(user=other).entered_at)
+
+
+class TicketIndexTests(IndexPlanTestCase):
+    @classmethod
+    def seed(cls, users):
+        now = timezone.now()
+        Ticket.objects.bulk_create([
+            Ticket(user=user, ticket_code=f'{i:05d}', food_received=i % 10 == 0,
+                   entered_at=now if i % 10 == 0 else None)
+            for i, user in enumerate(users)
+        ], batch_size=1000)
+
+    def test_attendance_counts(self):
+        self.assertUsesIndex(Ticket.objects.filter(food_received=True), 'ticket_food_served')
+        self.assertUsesIndex(Ticket.objects.filter(entered_at__isnull=False), 'ticket_entered')
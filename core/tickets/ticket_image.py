@@ -11,6 +11,8 @@ import qrcode
 from PIL import Image, ImageDraw, ImageFont, ImageFilter
 from django.conf import settings
 
+from .qr_signing import qr_payload
+
 
 # ── Colour helpers ──────────────────────────────────────────────────
 def hex_to_rgb(h):
@@ -216,17 +218,22 @@ def _download_image(url):
 
 
 # ── QR code generation ──────────────────────────────────────────────
-def generate_qr_image(data, size=120):
+def generate_qr_image(data, size=120, fast=False):
+    """
+    Build the QR image. fast=True skips the mask-pattern search and uses a
+    nearest-neighbour resize (still a valid, scannable code) for previews.
+    """
     qr = qrcode.QRCode(
         version=1,
         error_correction=qrcode.constants.ERROR_CORRECT_L,
-        box_size=10,
+        box_size=4 if fast else 10,
         border=1,
+        mask_pattern=0 if fast else None,
     )
     qr.add_data(data)
     qr.make(fit=True)
     img = qr.make_image(fill_color="black", back_color="white").convert('RGB')
-    return img.resize((size, size), Image.LANCZOS)
+    return img.resize((size, size), Image.NEAREST if fast else Image.LANCZOS)
 
 
 # ── Constants matching HTML exactly ─────────────────────────────────
@@ -238,39 +245,76 @@ CENTER_W = TICKET_W - LEFT_W - RIGHT_W   # 585
 FOOTER_H = 28        # ~py-1.5 + text height
 CORNER_R = 16        # border-radius: 16px
 OUTPUT_SCALE = 1.35  # upscale factor for crisper exports
+PREVIEW_SCALE = 0.75 # downscale factor for quick on-screen previews
+PREVIEW_QUALITY = 80 # JPEG quality used for previews
+
+FOOTER_LEFT = "Powered by: "
+FOOTER_LEFT_BOLD = "CMHS ALUMNI ASSOCIATION"
+FOOTER_RIGHT = "System Generated \u2022 Dev: Reshad (2019) \u2022 www.reshad.dev"
+
+# Right section geometry (QR column)
+QR_SIZE = 120        # .qr-inner img { width:120px; height:120px }
+QR_PADDING = 12      # .qr-inner padding: 12px
+QR_BORDER_PAD = 2    # .qr-border padding: 2px
+QR_BLOCK = QR_SIZE + QR_PADDING * 2 + QR_BORDER_PAD * 2   # 148
+
+# Center section geometry (info box)
+INFO_PAD_Y = 16      # py-4
+INFO_PAD_X = 20      # px-5
+INFO_GAP = 24        # gap-6 = 1.5rem = 24px (between EACH flex child)
+INFO_SEP_H = 40      # h-10 = 2.5rem = 40px
+INFO_MIN_W = 470
+CENTER_PAD_X = 40    # px-10 = 2.5rem = 40px
+CENTER_PAD_Y = 32    # py-8  = 2rem   = 32px
+
+
+def _load_fonts():
+    """Fonts (sizes match HTML css px exactly)."""
+    return {
+        'title':       get_font('PlayfairDisplay-Black', 60),       # heavier headline weight
+        'subtitle':    get_font('CormorantGaramond-Italic', 30),    # .subtitle-text 30px italic
+        'label':       get_font('PTSans-Regular', 9),               # info labels 9px
+        'name':        get_font('PTSans-Bold', 24),                 # .guest-name 24px
+        'batch':       get_font('PTSans-Bold', 20),                 # .batch-val 20px
+        'contact':     get_font('PTSans-Regular', 14),              # .contact-val 14px
+        'detail_lbl':  get_font('PTSans-Regular', 9),               # detail labels 9px
+        'detail_val':  get_font('PTSans-Bold', 20),                 # .detail-value 20px
+        'footer':      get_font('PTSans-Regular', 10),              # footer larger for readability
+        'footer_bold': get_font('PTSans-Bold', 10),
+        'entry':       get_font('PTSans-Bold', 8),                  # .entry-pass 8px
+        'code_label':  get_font('PTSans-Regular', 8),               # .code-label 7px
+        'code_val':    get_font('PTSans-Regular', 9),               # .code-value 7px mono
+        'scan':        get_font('PTSans-Regular', 9),               # .scan-text 7px
+    }
+
+
+def _draw_gradient_separator(draw, x, top, bottom):
+    """Vertical 1px separator: sky-200/30 -> blue-300/50 -> sky-200/30."""
+    for sy in range(top, bottom):
+        st = (sy - top) / max(bottom - top - 1, 1)
+        if st < 0.5:
+            sa = int(lerp_color((76,), (128,), st * 2)[0])
+        else:
+            sa = int(lerp_color((128,), (76,), (st - 0.5) * 2)[0])
+        draw.point((x, sy), fill=(166, 213, 253, sa))
+
+
+# ── Static ticket template ──────────────────────────────────────────
+# Everything that does not depend on the guest (backgrounds, logo, titles,
+# event details, footer and the empty QR frame) is rendered once per process
+# and copied for each ticket.
+_TEMPLATE = None
 
 
-def render_ticket_image(ticket):
+def _build_template(fonts):
     """
-    Render a ticket as a Pillow Image (RGBA -> RGB PNG bytes).
+    Render the guest-independent part of the ticket.
 
     Returns:
-        bytes - PNG image data
+        (Image, dict, bool) - RGBA template, layout positions used by the
+        per-ticket pass, and whether every remote asset was available.
     """
-    user = ticket.user
-    raw_name = (user.name or 'Guest').strip()
-    name_parts = raw_name.split()
-    name = ' '.join(name_parts[:2]) if len(name_parts) > 2 else raw_name
-    batch = user.batch or 'N/A'
-    phone = user.phone or ''
-    ticket_code = ticket.ticket_code or ''
-    qr_data = str(ticket_code)
-
-    # ── Fonts (sizes match HTML css px exactly) ─────────────────────
-    font_title       = get_font('PlayfairDisplay-Black', 60)       # heavier headline weight
-    font_subtitle    = get_font('CormorantGaramond-Italic', 30)    # .subtitle-text 30px italic
-    font_label       = get_font('PTSans-Regular', 9)               # info labels 9px
-    font_name        = get_font('PTSans-Bold', 24)                 # .guest-name 24px
-    font_batch       = get_font('PTSans-Bold', 20)                 # .batch-val 20px
-    font_contact     = get_font('PTSans-Regular', 14)              # .contact-val 14px
-    font_detail_lbl  = get_font('PTSans-Regular', 9)               # detail labels 9px
-    font_detail_val  = get_font('PTSans-Bold', 20)                 # .detail-value 20px
-    font_footer      = get_font('PTSans-Regular', 10)              # footer larger for readability
-    font_footer_bold = get_font('PTSans-Bold', 10)
-    font_entry       = get_font('PTSans-Bold', 8)                  # .entry-pass 8px
-    font_code_label  = get_font('PTSans-Regular', 8)               # .code-label 7px
-    font_code_val    = get_font('PTSans-Regular', 9)               # .code-value 7px mono
-    font_scan        = get_font('PTSans-Regular', 9)               # .scan-text 7px
+    complete = True
 
     # ================================================================
     #  LAYER 1 - Base gradient  (#2d1b4e -> #5d3a7a -> #2d1b4e  135deg)
@@ -286,8 +330,6 @@ def render_ticket_image(ticket):
     )
     img.putalpha(mask)
 
-    draw = ImageDraw.Draw(img)
-
     # ================================================================
     #  LAYER 2 - Background image overlay at 20% opacity
     # ================================================================
@@ -298,7 +340,8 @@ def render_ticket_image(ticket):
         a = a.point(lambda p: int(p * 0.20))
         bg_img = Image.merge('RGBA', (r, g, b, a))
         img = Image.alpha_composite(img, bg_img)
-        draw = ImageDraw.Draw(img)
+    else:
+        complete = False
 
     # ================================================================
     #  LAYER 3 - Islamic geometric pattern (diamonds + circles)
@@ -395,8 +438,6 @@ def render_ticket_image(ticket):
             ov3d.line([(x, 0), (x, TICKET_H - 1)], fill=(0, 0, 0, a))
     img = Image.alpha_composite(img, ov3)
 
-    draw = ImageDraw.Draw(img)
-
     # ================================================================
     #  LAYER 6 - Lanterns bar at top (height 100px, offset -15px, 50%)
     # ================================================================
@@ -411,7 +452,8 @@ def render_ticket_image(ticket):
         while x < TICKET_W:
             img.paste(lantern_tile, (x, -15), lantern_tile)
             x += lw_target
-        draw = ImageDraw.Draw(img)
+    else:
+        complete = False
 
     # ================================================================
     #  LEFT SECTION - Logo column (bg black/20, border-right)
@@ -445,6 +487,8 @@ def render_ticket_image(ticket):
         ly = lcy - logo_sz // 2
         img.paste(logo_resized, (lx, ly), logo_resized)
         draw = ImageDraw.Draw(img)
+    else:
+        complete = False
 
     # ================================================================
     #  RIGHT SECTION - QR column (bg black/20, border-left)
@@ -457,98 +501,65 @@ def render_ticket_image(ticket):
     draw.line([(rx0, 0), (rx0, TICKET_H)], fill=(186, 230, 253, 102), width=1)
 
     # -- Vertically center all right-section content --
-    qr_size = 120        # .qr-inner img { width:120px; height:120px }
-    qr_padding = 12      # .qr-inner padding: 12px
-    qr_outer = qr_size + qr_padding * 2             # 144
-    qr_border_pad = 2    # .qr-border padding: 2px
-    qr_block = qr_outer + qr_border_pad * 2          # 148
-
     entry_h = 10
     gap1 = 16
     gap2 = 16
     code_section_h = 30
     gap3 = 10
     scan_h = 10
-    total_content = entry_h + gap1 + qr_block + gap2 + code_section_h + gap3 + scan_h
+    total_content = entry_h + gap1 + QR_BLOCK + gap2 + code_section_h + gap3 + scan_h
     start_y = (TICKET_H - FOOTER_H - total_content) // 2
 
     # "ENTRY PASS"
     entry_text = "ENTRY PASS"
-    eb = draw.textbbox((0, 0), entry_text, font=font_entry)
+    eb = draw.textbbox((0, 0), entry_text, font=fonts['entry'])
     ew = eb[2] - eb[0]
     draw.text(
         (rx0 + (RIGHT_W - ew) // 2, start_y),
-        entry_text, fill=(255, 255, 255, 128), font=font_entry
+        entry_text, fill=(255, 255, 255, 128), font=fonts['entry']
     )
 
-    # QR code block: gradient border -> white bg -> QR image
+    # QR code block: gradient border -> white bg (QR image pasted per ticket)
     qr_y = start_y + entry_h + gap1
-    qr_border_img = Image.new('RGBA', (qr_block, qr_block), (0, 0, 0, 0))
+    qr_border_img = Image.new('RGBA', (QR_BLOCK, QR_BLOCK), (0, 0, 0, 0))
     qbd = ImageDraw.Draw(qr_border_img)
     qbd.rounded_rectangle(
-        [0, 0, qr_block - 1, qr_block - 1],
+        [0, 0, QR_BLOCK - 1, QR_BLOCK - 1],
         radius=16, fill=(166, 213, 253, 100)
     )
     qbd.rounded_rectangle(
-        [qr_border_pad, qr_border_pad,
-         qr_block - 1 - qr_border_pad, qr_block - 1 - qr_border_pad],
+        [QR_BORDER_PAD, QR_BORDER_PAD,
+         QR_BLOCK - 1 - QR_BORDER_PAD, QR_BLOCK - 1 - QR_BORDER_PAD],
         radius=14, fill=(255, 255, 255, 255)
     )
-    qr_img = generate_qr_image(qr_data, size=qr_size).convert('RGBA')
-    qr_border_img.paste(qr_img, (qr_border_pad + qr_padding, qr_border_pad + qr_padding))
-
-    qr_x = rx0 + (RIGHT_W - qr_block) // 2
+    qr_x = rx0 + (RIGHT_W - QR_BLOCK) // 2
     img.paste(qr_border_img, (qr_x, qr_y), qr_border_img)
     draw = ImageDraw.Draw(img)
 
     # "CODE" label
-    code_y = qr_y + qr_block + gap2
+    code_y = qr_y + QR_BLOCK + gap2
     code_label = "CODE"
-    clb = draw.textbbox((0, 0), code_label, font=font_code_label)
+    clb = draw.textbbox((0, 0), code_label, font=fonts['code_label'])
     clw = clb[2] - clb[0]
     draw.text(
         (rx0 + (RIGHT_W - clw) // 2, code_y),
-        code_label, fill=(255, 255, 255, 102), font=font_code_label
+        code_label, fill=(255, 255, 255, 102), font=fonts['code_label']
     )
 
-    # Code box with value
+    # Code box position (glass panel + value drawn per ticket)
     code_box_w = RIGHT_W - 48
     code_box_h = 22
     code_box_x = rx0 + 24
     code_box_y = code_y + 12
-    code_rect = (code_box_x, code_box_y, code_box_x + code_box_w, code_box_y + code_box_h)
-    apply_glass_panel(
-        img,
-        code_rect,
-        radius=8,
-        tint_rgb=(4, 6, 12),
-        tint_strength=0.35,
-        blur_radius=4,
-        opacity=190,
-    )
-    draw.rounded_rectangle(
-        code_rect,
-        radius=8,
-        outline=(255, 255, 255, 25)
-    )
-    display_code = ticket_code[:18] if len(ticket_code) > 18 else ticket_code
-    cvb = draw.textbbox((0, 0), display_code, font=font_code_val)
-    cvw = cvb[2] - cvb[0]
-    cvh = cvb[3] - cvb[1]
-    draw.text(
-        (code_box_x + (code_box_w - cvw) // 2,
-         code_box_y + (code_box_h - cvh) // 2),
-        display_code, fill=(255, 255, 255, 204), font=font_code_val
-    )
 
     # "Scan at entry"
     scan_y = code_box_y + code_box_h + gap3
     scan_text = "SCAN AT ENTRY"
-    sb = draw.textbbox((0, 0), scan_text, font=font_scan)
+    sb = draw.textbbox((0, 0), scan_text, font=fonts['scan'])
     sw = sb[2] - sb[0]
     draw.text(
         (rx0 + (RIGHT_W - sw) // 2, scan_y),
-        scan_text, fill=(255, 255, 255, 128), font=font_scan
+        scan_text, fill=(255, 255, 255, 128), font=fonts['scan']
     )
 
     # ================================================================
@@ -556,46 +567,28 @@ def render_ticket_image(ticket):
     #  CSS: flex-1 px-10 py-8 flex flex-col justify-between
     # ================================================================
     cx0 = LEFT_W
-    pad_x = 40   # px-10 = 2.5rem = 40px
-    pad_y = 32   # py-8  = 2rem   = 32px
-    usable_h = TICKET_H - FOOTER_H - pad_y * 2  # 400-28-64 = 308
+    usable_h = TICKET_H - FOOTER_H - CENTER_PAD_Y * 2  # 400-28-64 = 308
 
     # --- Measure each group's height ---
     # Group 1: title block (mb-6 wrapper + title + subtitle row)
     title_text = "CMHS Grand Iftar"
-    tb = draw.textbbox((0, 0), title_text, font=font_title)
+    tb = draw.textbbox((0, 0), title_text, font=fonts['title'])
     title_h = tb[3] - tb[1]
 
     sub_text = "Mahfil 2026"
-    stb = draw.textbbox((0, 0), sub_text, font=font_subtitle)
+    stb = draw.textbbox((0, 0), sub_text, font=fonts['subtitle'])
     sub_h = stb[3] - stb[1]
     title_gap = 12  # slightly larger separation between title and subtitle row
     group1_h = title_h + title_gap + sub_h
 
-    # Group 2: info box
-    # HTML: bg-black/40 rounded-xl px-5 py-4 border inline-block
-    #   inner: flex items-center gap-6
-    #   children: [name_col, sep(1px h-10), batch_col, sep(1px h-10), phone_col]
-    info_pad_y = 16   # py-4
-    info_pad_x = 20   # px-5
-    info_gap = 24     # gap-6 = 1.5rem = 24px (between EACH flex child)
-    sep_h = 40        # h-10 = 2.5rem = 40px
-
-    name_bb = draw.textbbox((0, 0), name, font=font_name)
-    name_h = name_bb[3] - name_bb[1]
-    label_bb = draw.textbbox((0, 0), "GUEST NAME", font=font_label)
-    label_h = label_bb[3] - label_bb[1]
-    label_gap = 4   # mb-1
-
-    # Row inner height = max(column content heights, separator h-10)
-    col_content_h = label_h + label_gap + name_h
-    row_h = max(col_content_h, sep_h)
-    group2_h = info_pad_y * 2 + row_h
+    # Group 2: info box — the label + value column always fits inside the
+    # h-10 separator, so the row height is the separator height.
+    group2_h = INFO_PAD_Y * 2 + INFO_SEP_H
 
     # Group 3: details row
-    det_lbl_bb = draw.textbbox((0, 0), "X", font=font_detail_lbl)
+    det_lbl_bb = draw.textbbox((0, 0), "X", font=fonts['detail_lbl'])
     det_lbl_h = det_lbl_bb[3] - det_lbl_bb[1]
-    det_val_bb = draw.textbbox((0, 0), "March 18, 2026", font=font_detail_val)
+    det_val_bb = draw.textbbox((0, 0), "March 18, 2026", font=fonts['detail_val'])
     det_val_h = det_val_bb[3] - det_val_bb[1]
     det_content_h = det_lbl_h + 4 + det_val_h
     det_sep_h = 32   # h-8 = 2rem = 32px
@@ -605,23 +598,23 @@ def render_ticket_image(ticket):
     gap = max(remaining // 2, 10)
 
     # --- Y positions (justify-between) ---
-    g1_y = pad_y
+    g1_y = CENTER_PAD_Y
     g2_y = g1_y + group1_h + gap
     g3_y = g2_y + group2_h + gap
 
     # ── Draw Group 1: Title ─────────────────────────────────────────
     draw.text(
-        (cx0 + pad_x, g1_y),
+        (cx0 + CENTER_PAD_X, g1_y),
         title_text,
         fill=hex_to_rgb('#e0f2fe'),
-        font=font_title,
+        font=fonts['title'],
         stroke_width=1,
         stroke_fill=hex_to_rgb('#cbd5ff')
     )
 
     # Subtitle row: decorative line (w-12 = 48px) + gap-3 (12px) + text
     sub_y = g1_y + title_h + title_gap
-    line_x = cx0 + pad_x
+    line_x = cx0 + CENTER_PAD_X
     line_cy = sub_y + sub_h // 2
     draw.line(
         [(line_x, line_cy), (line_x + 48, line_cy)],
@@ -629,46 +622,174 @@ def render_ticket_image(ticket):
     )
     draw.text(
         (line_x + 48 + 12, sub_y),
-        sub_text, fill=hex_to_rgb('#dbeafe'), font=font_subtitle
+        sub_text, fill=hex_to_rgb('#dbeafe'), font=fonts['subtitle']
     )
 
-    # ── Draw Group 2: Info Box ──────────────────────────────────────
+    # ── Draw Group 3: Details Row ───────────────────────────────────
+    # HTML: flex items-center gap-10 opacity-80
+    # Children: [date_col, sep(1px h-8), time_col, sep(1px h-8), venue_col]
+    # gap-10 = 40px between each flex child
+    det_gap = 40  # gap-10 = 2.5rem = 40px
+    dy = g3_y
+    dx = cx0 + CENTER_PAD_X
+    detail_lbl_color = (255, 255, 255, 153)
+    detail_val_color = (255, 255, 255, 204)   # opacity 0.8
+    det_row_cy = dy + group3_h // 2  # vertical center
+
+    details = [
+        ("DATE", "March 18, 2026"),
+        ("TIME", "03:00 PM"),
+        ("VENUE", "CMHS Campus"),
+    ]
+
+    for i, (lbl, val) in enumerate(details):
+        if i > 0:
+            # Separator: 1px wide, h-8 (32px), centered vertically, gradient
+            sep_t = det_row_cy - det_sep_h // 2
+            _draw_gradient_separator(draw, dx, sep_t, sep_t + det_sep_h)
+            dx += 1 + det_gap  # past separator + gap
+
+        det_top = det_row_cy - det_content_h // 2
+        draw.text((dx, det_top), lbl, fill=detail_lbl_color, font=fonts['detail_lbl'])
+        draw.text((dx, det_top + det_lbl_h + 4), val, fill=detail_val_color, font=fonts['detail_val'])
+
+        vbb = draw.textbbox((0, 0), val, font=fonts['detail_val'])
+        lbb = draw.textbbox((0, 0), lbl, font=fonts['detail_lbl'])
+        dx += max(vbb[2] - vbb[0], lbb[2] - lbb[0]) + det_gap
+
+    # ================================================================
+    #  FOOTER
+    # ================================================================
+    footer_y = TICKET_H - FOOTER_H
+    draw.rectangle([(0, footer_y), (TICKET_W, TICKET_H)], fill=(0, 0, 0, 153))
+    draw.line([(0, footer_y), (TICKET_W, footer_y)], fill=(255, 255, 255, 25), width=1)
+
+    flb = draw.textbbox((0, 0), FOOTER_LEFT, font=fonts['footer'])
+    fl_w = flb[2] - flb[0]
+    fl_y = footer_y + (FOOTER_H - (flb[3] - flb[1])) // 2
+    draw.text((24, fl_y), FOOTER_LEFT, fill=(255, 255, 255, 255), font=fonts['footer'])
+    draw.text((24 + fl_w, fl_y), FOOTER_LEFT_BOLD, fill=(255, 255, 255, 255), font=fonts['footer_bold'])
+
+    frb = draw.textbbox((0, 0), FOOTER_RIGHT, font=fonts['footer'])
+    fr_w = frb[2] - frb[0]
+    draw.text(
+        (TICKET_W - fr_w - 24, fl_y),
+        FOOTER_RIGHT, fill=(255, 255, 255, 255), font=fonts['footer']
+    )
+
+    layout = {
+        'qr_pos': (qr_x + QR_BORDER_PAD + QR_PADDING, qr_y + QR_BORDER_PAD + QR_PADDING),
+        'code_box': (code_box_x, code_box_y, code_box_w, code_box_h),
+        'info_box_origin': (cx0 + CENTER_PAD_X, g2_y),
+        'info_box_h': group2_h,
+    }
+    return img, layout, complete
+
+
+def _get_template():
+    """Return (fonts, template image copy, layout), building the template once."""
+    global _TEMPLATE
+    if _TEMPLATE is None:
+        fonts = _load_fonts()
+        img, layout, complete = _build_template(fonts)
+        if not complete:
+            # Remote assets were unreachable; do not pin a degraded template.
+            return fonts, img, layout
+        _TEMPLATE = (fonts, img, layout)
+    fonts, img, layout = _TEMPLATE
+    return fonts, img.copy(), layout
+
+
+def _ticket_fields(ticket):
+    user = ticket.user
+    raw_name = (user.name or 'Guest').strip()
+    name_parts = raw_name.split()
+    name = ' '.join(name_parts[:2]) if len(name_parts) > 2 else raw_name
+    batch = user.batch or 'N/A'
+    phone = user.phone or ''
+    ticket_code = ticket.ticket_code or ''
+    return name, batch, phone, ticket_code
+
+
+def _draw_ticket_details(img, fonts, layout, name, batch, phone, ticket_code, fast=False):
+    """Draw the per-guest parts (QR, code box, info box) onto a template copy."""
+    # ── QR code ─────────────────────────────────────────────────────
+    qr_img = generate_qr_image(str(qr_payload(ticket_code)), size=QR_SIZE, fast=fast).convert('RGBA')
+    img.paste(qr_img, layout['qr_pos'])
+    draw = ImageDraw.Draw(img)
+
+    # ── Code box with value ─────────────────────────────────────────
+    code_box_x, code_box_y, code_box_w, code_box_h = layout['code_box']
+    code_rect = (code_box_x, code_box_y, code_box_x + code_box_w, code_box_y + code_box_h)
+    apply_glass_panel(
+        img,
+        code_rect,
+        radius=8,
+        tint_rgb=(4, 6, 12),
+        tint_strength=0.35,
+        blur_radius=4,
+        opacity=190,
+    )
+    draw.rounded_rectangle(
+        code_rect,
+        radius=8,
+        outline=(255, 255, 255, 25)
+    )
+    display_code = ticket_code[:18] if len(ticket_code) > 18 else ticket_code
+    cvb = draw.textbbox((0, 0), display_code, font=fonts['code_val'])
+    cvw = cvb[2] - cvb[0]
+    cvh = cvb[3] - cvb[1]
+    draw.text(
+        (code_box_x + (code_box_w - cvw) // 2,
+         code_box_y + (code_box_h - cvh) // 2),
+        display_code, fill=(255, 255, 255, 204), font=fonts['code_val']
+    )
+
+    # ── Info Box ────────────────────────────────────────────────────
+    # HTML: bg-black/40 rounded-xl px-5 py-4 border inline-block
+    #   inner: flex items-center gap-6
+    #   children: [name_col, sep(1px h-10), batch_col, sep(1px h-10), phone_col]
+    name_bb = draw.textbbox((0, 0), name, font=fonts['name'])
+    name_h = name_bb[3] - name_bb[1]
+    label_bb = draw.textbbox((0, 0), "GUEST NAME", font=fonts['label'])
+    label_h = label_bb[3] - label_bb[1]
+    label_gap = 4   # mb-1
+    col_content_h = label_h + label_gap + name_h
+    row_h = INFO_SEP_H
+
     # Measure column text widths
     name_w = name_bb[2] - name_bb[0]
-    lbl_name_bb = draw.textbbox((0, 0), "GUEST NAME", font=font_label)
-    lbl_name_w = lbl_name_bb[2] - lbl_name_bb[0]
+    lbl_name_w = label_bb[2] - label_bb[0]
     col1_w = max(name_w, lbl_name_w)
 
-    batch_bb = draw.textbbox((0, 0), batch, font=font_batch)
+    batch_bb = draw.textbbox((0, 0), batch, font=fonts['batch'])
     batch_w = batch_bb[2] - batch_bb[0]
-    lbl_batch_bb = draw.textbbox((0, 0), "BATCH", font=font_label)
+    lbl_batch_bb = draw.textbbox((0, 0), "BATCH", font=fonts['label'])
     lbl_batch_w = lbl_batch_bb[2] - lbl_batch_bb[0]
     col2_w = max(batch_w, lbl_batch_w)
 
-    phone_bb = draw.textbbox((0, 0), phone, font=font_contact)
+    phone_bb = draw.textbbox((0, 0), phone, font=fonts['contact'])
     phone_w = phone_bb[2] - phone_bb[0]
-    lbl_phone_bb = draw.textbbox((0, 0), "CONTACT", font=font_label)
+    lbl_phone_bb = draw.textbbox((0, 0), "CONTACT", font=fonts['label'])
     lbl_phone_w = lbl_phone_bb[2] - lbl_phone_bb[0]
     col3_w = max(phone_w, lbl_phone_w)
 
     def _info_box_width(gap_value):
-        return (info_pad_x * 2
+        return (INFO_PAD_X * 2
                 + col1_w + gap_value + 1 + gap_value
                 + col2_w + gap_value + 1 + gap_value
                 + col3_w)
 
-    info_gap_actual = info_gap
+    info_gap_actual = INFO_GAP
     total_box_w = _info_box_width(info_gap_actual)
-    min_box_w = 470
-    if total_box_w < min_box_w:
-        extra = min_box_w - total_box_w
-        info_gap_actual = info_gap + extra / 4
+    if total_box_w < INFO_MIN_W:
+        extra = INFO_MIN_W - total_box_w
+        info_gap_actual = INFO_GAP + extra / 4
         total_box_w = _info_box_width(info_gap_actual)
 
-    box_x0 = cx0 + pad_x
-    box_y0 = g2_y
+    box_x0, box_y0 = layout['info_box_origin']
     box_x1 = box_x0 + total_box_w
-    box_y1 = box_y0 + group2_h
+    box_y1 = box_y0 + layout['info_box_h']
 
     apply_glass_panel(
         img,
@@ -689,134 +810,78 @@ def render_ticket_image(ticket):
     val_color = (255, 255, 255, 255)
 
     # Vertical center offset for text within the row (items-center)
-    row_center_y = box_y0 + info_pad_y + row_h // 2
+    row_center_y = box_y0 + INFO_PAD_Y + row_h // 2
 
     # Column 1 — Guest Name
-    c1x = box_x0 + info_pad_x
+    c1x = box_x0 + INFO_PAD_X
     c1_top = row_center_y - col_content_h // 2
-    draw.text((c1x, c1_top), "GUEST NAME", fill=lbl_color, font=font_label)
-    draw.text((c1x, c1_top + label_h + label_gap), name, fill=val_color, font=font_name)
+    draw.text((c1x, c1_top), "GUEST NAME", fill=lbl_color, font=fonts['label'])
+    draw.text((c1x, c1_top + label_h + label_gap), name, fill=val_color, font=fonts['name'])
 
     # Separator 1 — gradient vertical line (h-10 centered)
     gap_value = info_gap_actual
     sep1_x = c1x + col1_w + gap_value
-    sep_top = row_center_y - sep_h // 2
-    sep_bot = sep_top + sep_h
-    sep1_x_int = int(round(sep1_x))
-    # Draw gradient: sky-200/30 → blue-300/50 → sky-200/30
-    for sy in range(sep_top, sep_bot):
-        st = (sy - sep_top) / max(sep_bot - sep_top - 1, 1)
-        if st < 0.5:
-            sa = int(lerp_color((76,), (128,), st * 2)[0])
-        else:
-            sa = int(lerp_color((128,), (76,), (st - 0.5) * 2)[0])
-        draw.point((sep1_x_int, sy), fill=(166, 213, 253, sa))
+    sep_top = row_center_y - INFO_SEP_H // 2
+    sep_bot = sep_top + INFO_SEP_H
+    _draw_gradient_separator(draw, int(round(sep1_x)), sep_top, sep_bot)
 
     # Column 2 — Batch
     c2x = sep1_x + 1 + gap_value
-    batch_content_h = label_h + label_gap + (batch_bb[3] - batch_bb[1])
-    c2_top = row_center_y - batch_content_h // 2
-    draw.text((c2x, c1_top), "BATCH", fill=lbl_color, font=font_label)
-    draw.text((c2x, c1_top + label_h + label_gap), batch, fill=val_color, font=font_batch)
+    draw.text((c2x, c1_top), "BATCH", fill=lbl_color, font=fonts['label'])
+    draw.text((c2x, c1_top + label_h + label_gap), batch, fill=val_color, font=fonts['batch'])
 
     # Separator 2
     sep2_x = c2x + col2_w + gap_value
-    sep2_x_int = int(round(sep2_x))
-    for sy in range(sep_top, sep_bot):
-        st = (sy - sep_top) / max(sep_bot - sep_top - 1, 1)
-        if st < 0.5:
-            sa = int(lerp_color((76,), (128,), st * 2)[0])
-        else:
-            sa = int(lerp_color((128,), (76,), (st - 0.5) * 2)[0])
-        draw.point((sep2_x_int, sy), fill=(166, 213, 253, sa))
+    _draw_gradient_separator(draw, int(round(sep2_x)), sep_top, sep_bot)
 
     # Column 3 — Contact
     c3x = sep2_x + 1 + gap_value
-    draw.text((c3x, c1_top), "CONTACT", fill=lbl_color, font=font_label)
+    draw.text((c3x, c1_top), "CONTACT", fill=lbl_color, font=fonts['label'])
     # Contact value baseline-aligned with other values
     phone_val_h = phone_bb[3] - phone_bb[1]
     phone_val_y = c1_top + label_h + label_gap + (name_h - phone_val_h) // 2
     draw.text(
         (c3x, phone_val_y),
-        phone, fill=(255, 255, 255, 230), font=font_contact
+        phone, fill=(255, 255, 255, 230), font=fonts['contact']
     )
 
-    # ── Draw Group 3: Details Row ───────────────────────────────────
-    # HTML: flex items-center gap-10 opacity-80
-    # Children: [date_col, sep(1px h-8), time_col, sep(1px h-8), venue_col]
-    # gap-10 = 40px between each flex child
-    det_gap = 40  # gap-10 = 2.5rem = 40px
-    dy = g3_y
-    dx = cx0 + pad_x
-    detail_lbl_color = (255, 255, 255, 153)
-    detail_val_color = (255, 255, 255, 204)   # opacity 0.8
-    det_row_cy = dy + group3_h // 2  # vertical center
-
-    details = [
-        ("DATE", "March 18, 2026"),
-        ("TIME", "03:00 PM"),
-        ("VENUE", "CMHS Campus"),
-    ]
 
-    for i, (lbl, val) in enumerate(details):
-        if i > 0:
-            # Separator: 1px wide, h-8 (32px), centered vertically, gradient
-            sep_cx = dx
-            sep_t = det_row_cy - det_sep_h // 2
-            sep_b = sep_t + det_sep_h
-            for sy in range(sep_t, sep_b):
-                st = (sy - sep_t) / max(sep_b - sep_t - 1, 1)
-                if st < 0.5:
-                    sa = int(lerp_color((76,), (128,), st * 2)[0])
-                else:
-                    sa = int(lerp_color((128,), (76,), (st - 0.5) * 2)[0])
-                draw.point((sep_cx, sy), fill=(166, 213, 253, sa))
-            dx += 1 + det_gap  # past separator + gap
-
-        det_top = det_row_cy - det_content_h // 2
-        draw.text((dx, det_top), lbl, fill=detail_lbl_color, font=font_detail_lbl)
-        draw.text((dx, det_top + det_lbl_h + 4), val, fill=detail_val_color, font=font_detail_val)
-
-        vbb = draw.textbbox((0, 0), val, font=font_detail_val)
-        dx += max(vbb[2] - vbb[0], draw.textbbox((0, 0), lbl, font=font_detail_lbl)[2] - draw.textbbox((0, 0), lbl, font=font_detail_lbl)[0]) + det_gap
+def render_ticket_image(ticket, preview=False):
+    """
+    Render a ticket as a Pillow Image (RGBA -> RGB PNG bytes).
 
-    # ================================================================
-    #  FOOTER
-    # ================================================================
-    footer_y = TICKET_H - FOOTER_H
-    draw.rectangle([(0, footer_y), (TICKET_W, TICKET_H)], fill=(0, 0, 0, 153))
-    draw.line([(0, footer_y), (TICKET_W, footer_y)], fill=(255, 255, 255, 25), width=1)
+    With preview=True the ticket is rendered at PREVIEW_SCALE without the
+    upscale / unsharp pass and encoded as a JPEG, which is what the
+    frontend needs while the guest checks their details.
 
-    fl = "Powered by: "
-    fl_bold = "CMHS ALUMNI ASSOCIATION"
-    flb = draw.textbbox((0, 0), fl, font=font_footer)
-    fl_w = flb[2] - flb[0]
-    fl_y = footer_y + (FOOTER_H - (flb[3] - flb[1])) // 2
-    draw.text((24, fl_y), fl, fill=(255, 255, 255, 255), font=font_footer)
-    draw.text((24 + fl_w, fl_y), fl_bold, fill=(255, 255, 255, 255), font=font_footer_bold)
-
-    fr = "System Generated \u2022 Dev: Reshad (2019) \u2022 www.reshad.dev"
-    frb = draw.textbbox((0, 0), fr, font=font_footer)
-    fr_w = frb[2] - frb[0]
-    draw.text(
-        (TICKET_W - fr_w - 24, fl_y),
-        fr, fill=(255, 255, 255, 255), font=font_footer
-    )
+    Returns:
+        bytes - PNG image data (JPEG when preview=True)
+    """
+    name, batch, phone, ticket_code = _ticket_fields(ticket)
+    fonts, img, layout = _get_template()
+    _draw_ticket_details(img, fonts, layout, name, batch, phone, ticket_code, fast=preview)
 
     # ================================================================
-    #  Flatten RGBA -> RGB on dark background and export PNG
+    #  Flatten RGBA -> RGB on dark background and export
     # ================================================================
     final = Image.new('RGB', (TICKET_W, TICKET_H), (15, 15, 24))  # body #0f0f18
     final.paste(img, (0, 0), img)
 
+    buf = io.BytesIO()
+    if preview:
+        preview_w = int(TICKET_W * PREVIEW_SCALE)
+        preview_h = int(TICKET_H * PREVIEW_SCALE)
+        final = final.resize((preview_w, preview_h), Image.BOX)
+        final.save(buf, format='JPEG', quality=PREVIEW_QUALITY)
+        return buf.getvalue()
+
     if OUTPUT_SCALE and OUTPUT_SCALE != 1:
         upscale_w = int(TICKET_W * OUTPUT_SCALE)
         upscale_h = int(TICKET_H * OUTPUT_SCALE)
         final = final.resize((upscale_w, upscale_h), Image.LANCZOS)
         final = final.filter(ImageFilter.UnsharpMask(radius=1.2, percent=180, threshold=3))
-        redraw_footer_layer(final, OUTPUT_SCALE, fl, fl_bold, fr)
+        redraw_footer_layer(final, OUTPUT_SCALE, FOOTER_LEFT, FOOTER_LEFT_BOLD, FOOTER_RIGHT)
 
-    buf = io.BytesIO()
     final.save(buf, format='PNG', optimize=False, compress_level=5)
     buf.seek(0)
-    return buf.getvalue()
\ No newline at end of file
+    return buf.getvalue()
@@ -3,18 +3,35 @@ from .views import (
     UserTicketView, 
     TicketDownloadView, 
     CreateTicketAndUploadCloudinary,
+    TicketPreviewView,
     CheckEntranceByQRView,
     MarkFoodReceivedView,
+    MarkFoodReceivedBatchView,
     CheckEntranceByPhoneView,
     MarkFoodReceivedByPhoneView,
+    GateActionView,
+    QRKeysView,
+    RosterSyncView,
+    LiveDashboardStreamView,
+    LiveCountsView,
+    LiveStreamTokenView,
 )
 
 urlpatterns = [
     path('my-ticket/', UserTicketView.as_view(), name='user-ticket'),
     path('download/', TicketDownloadView.as_view(), name='ticket-download'),
     path('generate-image/', CreateTicketAndUploadCloudinary.as_view(), name='ticket-generate-image'),
+    path('preview/', TicketPreviewView.as_view(), name='ticket-preview'),
     path('check-entrance/<str:ticket_code>/', CheckEntranceByQRView.as_view(), name='check-entrance'),
     path('mark-food-received/<str:ticket_code>/', MarkFoodReceivedView.as_view(), name='mark-food-received'),
+    path('mark-food-received-batch/', MarkFoodReceivedBatchView.as_view(), name='mark-food-received-batch'),
     path('check-entrance-phone/<str:phone>/', CheckEntranceByPhoneView.as_view(), name='check-entrance-phone'),
     path('mark-food-received-phone/<str:phone>/', MarkFoodReceivedByPhoneView.as_view(), name='mark-food-received-phone'),
+    path('gate/<str:ticket_code>/', GateActionView.as_view(), name='gate-action'),
+    path('gate-phone/<str:phone>/', GateActionView.as_view(), name='gate-action-phone'),
+    path('qr-keys/', QRKeysView.as_view(), name='qr-keys'),
+    path('roster/', RosterSyncView.as_view(), name='roster-sync'),
+    path('live/', LiveDashboardStreamView.as_view(), name='live-dashboard'),
+    path('live/counts/', LiveCountsView.as_view(), name='live-counts'),
+    path('live/token/', LiveStreamTokenView.as_view(), name='live-stream-token'),
 ]
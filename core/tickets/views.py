@@ -1,19 +1,149 @@
 import io
+import json
+import logging
+import time
+import asyncio
+import base64
+import hashlib
+from datetime import timedelta
 import cloudinary.uploader
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import permissions, status
-from django.http import HttpResponse
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core import signing
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.views import View
 from django.utils.decorators import method_decorator
 from django.contrib.auth.decorators import login_required
+from django.db.models import Count, Max
+from django.utils import timezone
 from .models import Ticket
-from .serializers import TicketSerializer
+from .serializers import TicketSerializer, FoodScanBatchSerializer, GateActionSerializer
 from accounts.models import User
-from payments.models import Payment
 from .ticket_engine import render_ticket_html
 from .ticket_image import render_ticket_image
+from .gate import (
+    lookup_by_phone, apply_transition, mark_food_received_batch, claim_scan, release_scan,
+    SUCCESS, ALREADY_MARKED, NOT_FOUND, ENTER, FOOD,
+)
+from .qr_signing import (
+    resolve_scanned_code, qr_payload, get_keys, get_active_key_id, SEPARATOR, TAG_BYTES,
+)
+from .codes import ticket_code_candidates
+from .journal import event_mode_enabled, record_transitions
+from .scan_log import ScanLogMixin
+from .roster import (
+    roster, gate_payload, record_from_phone_row, record_by_code, on_commit_publish_record,
+    annotated_tickets, sync_rows, sync_cursor, parse_sync_cursor, SYNC_FIELDS,
+)
+from .live import live_counts
 from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework.exceptions import AuthenticationFailed
+
+logger = logging.getLogger(__name__)
+
+
+def wants_thumbnail(request):
+    """Gate endpoints include a pre-sized thumbnail URL with ?thumbnail=1."""
+    return request.query_params.get('thumbnail') in ('1', 'true', 'yes')
+
+
+# Longer than any code or signed payload; rejected before parsing
+MAX_SCANNED_LENGTH = 64
+
+
+def find_scanned_record(value):
+    """
+    Roster record for a scanned or typed ticket code, or None.
+
+    The signature (for signed payloads) and the code's format and check
+    character are verified first, so malformed input never reaches the
+    roster or the database. Legacy numeric codes and their check-format
+    equivalents resolve to the same ticket. A code the roster does not
+    know (e.g. a ticket issued on another worker whose change notice has
+    not arrived) is read from the database once and published.
+    """
+    if len(value) > MAX_SCANNED_LENGTH:
+        return None
+    code = resolve_scanned_code(value)
+    candidates = ticket_code_candidates(code) if code else []
+    if not candidates:
+        return None
+    for candidate in candidates:
+        record = roster.get_by_code(candidate)
+        if record is not None:
+            return record
+    record = record_by_code(candidates)
+    if record is not None:
+        roster.publish_record(record)
+    return record
+
+
+def claimed_transition(request, action, ticket_code):
+    """
+    Apply a gate transition unless the same code was just scanned for the
+    same action (see gate.claim_scan). Returns (result, earlier_claim);
+    a repeat within the window is ALREADY_MARKED with the earlier claim and
+    never reaches the database.
+    """
+    scanner_id = request.headers.get('X-Scanner-Id', '')
+    earlier = claim_scan(action, ticket_code, scanner_id)
+    if earlier:
+        return ALREADY_MARKED, earlier
+    if event_mode_enabled():
+        # Event mode: journal locally and acknowledge; replicated later
+        try:
+            [(_, result)] = record_transitions(action, [(ticket_code, None)], scanner_id)
+            return result, None
+        except OSError:
+            logger.exception("Gate journal unavailable; writing %s scan to the database", action)
+    try:
+        result, _ = apply_transition(action, ticket_code=ticket_code)
+    except Exception:
+        release_scan(action, ticket_code)
+        raise
+    if result == NOT_FOUND:
+        release_scan(action, ticket_code)
+    return result, None
+
+
+def duplicate_fields(earlier):
+    """Extra response fields for a scan flagged as a repeat."""
+    return {"duplicate": True, "first_scan": earlier} if earlier else {}
+
+
+def resolve_phone_record(phone, error_status):
+    """
+    Roster record for a phone-fallback scan, or (None, error response).
+    Valid roster entries are answered from memory; otherwise one joined
+    query reports the exact reason.
+    """
+    record = roster.get_by_phone(phone)
+    if record is not None and record.registration_approved:
+        return record, None
+    row = lookup_by_phone(phone)
+    if row is None:
+        return None, Response(
+            {"status": error_status, "detail": "No user found with this phone number"},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    if not row['registration_approved']:
+        return None, Response(
+            {"status": error_status, "detail": "No approved registration payment found for this user"},
+            status=status.HTTP_403_FORBIDDEN
+        )
+    if row['ticket_id'] is None:
+        return None, Response(
+            {"status": error_status, "detail": "No ticket found for this user"},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    return record_from_phone_row(row), None
+
 
 class UserTicketView(APIView):
     permission_classes = [permissions.IsAuthenticated]
@@ -103,7 +233,49 @@ class CreateTicketAndUploadCloudinary(APIView):
             )
 
 
-class CheckEntranceByQRView(APIView):
+class TicketPreviewView(APIView):
+    """
+    Quick low-resolution JPEG preview of the user's ticket.
+    Endpoint: GET /api/ticket/preview/
+    Nothing is uploaded; the full render + Cloudinary upload only happens
+    through generate-image/ when the user saves or downloads the ticket.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    cache_max_age = 300
+
+    def get(self, request):
+        try:
+            ticket = Ticket.objects.select_related('user').get(user=request.user)
+        except Ticket.DoesNotExist:
+            return Response(
+                {"detail": "No ticket found for this user."},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+
+        user = ticket.user
+        fingerprint = f"{qr_payload(ticket.ticket_code)}|{user.name}|{user.batch}|{user.phone}"
+        etag = '"%s"' % hashlib.md5(fingerprint.encode()).hexdigest()
+        cache_control = f"private, max-age={self.cache_max_age}"
+
+        if request.headers.get('If-None-Match') == etag:
+            response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            try:
+                jpeg_bytes = render_ticket_image(ticket, preview=True)
+            except Exception as e:
+                return Response(
+                    {"detail": f"Error generating ticket preview: {str(e)}"},
+                    status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                )
+            response = HttpResponse(jpeg_bytes, content_type='image/jpeg')
+            response['Content-Disposition'] = f'inline; filename="ticket_{ticket.ticket_code}_preview.jpg"'
+
+        response['ETag'] = etag
+        response['Cache-Control'] = cache_control
+        return response
+
+
+class CheckEntranceByQRView(ScanLogMixin, APIView):
     """
     Check entrance by scanning ticket QR code.
     Endpoint: GET /api/tickets/check-entrance/<ticket_code>/
@@ -112,18 +284,9 @@ class CheckEntranceByQRView(APIView):
     permission_classes = [IsAdminUser]
 
     def get(self, request, ticket_code):
-        try:
-            ticket = Ticket.objects.get(ticket_code=ticket_code)
-            serializer = TicketSerializer(ticket)
-            return Response(
-                {
-                    "status": "valid",
-                    "message": "Ticket is valid",
-                    "ticket": serializer.data
-                },
-                status=status.HTTP_200_OK
-            )
-        except Ticket.DoesNotExist:
+        # Signature checked first, then the in-memory roster; no database query per scan
+        record = find_scanned_record(ticket_code)
+        if record is None:
             return Response(
                 {
                     "status": "invalid",
@@ -131,41 +294,30 @@ class CheckEntranceByQRView(APIView):
                 },
                 status=status.HTTP_404_NOT_FOUND
             )
+        return Response(
+            {
+                "status": "valid",
+                "message": "Ticket is valid",
+                "ticket": gate_payload(record, thumbnail=wants_thumbnail(request))
+            },
+            status=status.HTTP_200_OK
+        )
 
 
-class MarkFoodReceivedView(APIView):
+class MarkFoodReceivedView(ScanLogMixin, APIView):
     """
     Mark food as received for a ticket by scanning QR code.
     Endpoint: POST /api/tickets/mark-food-received/<ticket_code>/
     Sets food_received to True
     """
     permission_classes = [IsAdminUser]
+    scan_action = 'food'
 
     def post(self, request, ticket_code):
-        try:
-            ticket = Ticket.objects.get(ticket_code=ticket_code)
-            if ticket.food_received:
-                return Response(
-                    {
-                        "status": "already_marked",
-                        "message": "Food has already been marked as received for this ticket",
-                        "ticket_code": ticket.ticket_code
-                    },
-                    status=status.HTTP_200_OK
-                )
-            else:
-                ticket.food_received = True
-                ticket.save()
-                serializer = TicketSerializer(ticket)
-                return Response(
-                    {
-                        "status": "success",
-                        "message": "Food marked as received",
-                        "ticket": serializer.data
-                    },
-                    status=status.HTTP_200_OK
-                )
-        except Ticket.DoesNotExist:
+        # Unknown or already-served tickets are rejected from the roster;
+        # only the actual state change goes to the database.
+        record = find_scanned_record(ticket_code)
+        if record is None:
             return Response(
                 {
                     "status": "error",
@@ -173,17 +325,109 @@ class MarkFoodReceivedView(APIView):
                 },
                 status=status.HTTP_404_NOT_FOUND
             )
-        except Exception as e:
+        if record.food_received:
+            return Response(
+                {
+                    "status": "already_marked",
+                    "message": "Food has already been marked as received for this ticket",
+                    "ticket_code": record.ticket_code
+                },
+                status=status.HTTP_200_OK
+            )
+
+        # Repeats within the duplicate window stop at the shared cache; otherwise
+        # one conditional UPDATE lets only the first of two racing counters win
+        result, earlier = claimed_transition(request, FOOD, record.ticket_code)
+        if result == NOT_FOUND:
             return Response(
                 {
                     "status": "error",
-                    "detail": str(e)
+                    "detail": "Ticket not found"
                 },
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+                status=status.HTTP_404_NOT_FOUND
             )
+        if result == ALREADY_MARKED:
+            if not earlier:
+                on_commit_publish_record(record._replace(food_received=True))
+            return Response(
+                {
+                    "status": "already_marked",
+                    "message": "Food has already been marked as received for this ticket",
+                    "ticket_code": record.ticket_code,
+                    **duplicate_fields(earlier),
+                },
+                status=status.HTTP_200_OK
+            )
+
+        record = record._replace(food_received=True)
+        on_commit_publish_record(record)
+        return Response(
+            {
+                "status": "success",
+                "message": "Food marked as received",
+                "ticket": gate_payload(record, thumbnail=wants_thumbnail(request))
+            },
+            status=status.HTTP_200_OK
+        )
 
 
-class CheckEntranceByPhoneView(APIView):
+class MarkFoodReceivedBatchView(ScanLogMixin, APIView):
+    """
+    Mark food as received for a batch of queued scanner scans.
+    Endpoint: POST /api/tickets/mark-food-received-batch/
+    Body: {"scans": [{"ticket_code": "00001", "scanned_at": "<ISO time>"}, ...]}
+    Returns a per-code result of success, already_marked or not_found.
+    """
+    permission_classes = [IsAdminUser]
+    scan_action = 'food'
+    scan_source = 'batch'
+
+    def apply(self, request, scans):
+        if event_mode_enabled():
+            try:
+                results = record_transitions(FOOD, scans, request.headers.get('X-Scanner-Id', ''))
+            except OSError:
+                logger.exception("Gate journal unavailable; writing batch to the database")
+            else:
+                for code, result in results:
+                    if result == SUCCESS:
+                        roster.publish_record(roster.get_by_code(code)._replace(food_received=True))
+                return results
+        return mark_food_received_batch(scans)
+
+    def post(self, request):
+        serializer = FoodScanBatchSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        # Forged, malformed or unknown codes are answered not_found without a query
+        scanned = []
+        for scan in serializer.validated_data['scans']:
+            record = find_scanned_record(scan['ticket_code'])
+            scanned.append((scan['ticket_code'], record and record.ticket_code, scan.get('scanned_at')))
+        self.resolved_codes = [code for _, code, _ in scanned]
+        verified = [(code, scanned_at) for _, code, scanned_at in scanned if code]
+        marked = iter(self.apply(request, verified) if verified else [])
+        results = [
+            (raw, next(marked)[1] if code else NOT_FOUND)
+            for raw, code, _ in scanned
+        ]
+        summary = {SUCCESS: 0, ALREADY_MARKED: 0, NOT_FOUND: 0}
+        for _, result in results:
+            summary[result] += 1
+
+        return Response(
+            {
+                "results": [
+                    {"ticket_code": code, "status": result} for code, result in results
+                ],
+                "summary": summary,
+            },
+            status=status.HTTP_200_OK
+        )
+
+
+class CheckEntranceByPhoneView(ScanLogMixin, APIView):
     """
     Backup entrance check by user phone number.
     Verifies user has an approved registration payment and a ticket.
@@ -192,100 +436,349 @@ class CheckEntranceByPhoneView(APIView):
     permission_classes = [IsAdminUser]
 
     def get(self, request, phone):
-        try:
-            user = User.objects.get(phone=phone)
-        except User.DoesNotExist:
-            return Response(
-                {"status": "invalid", "detail": "No user found with this phone number"},
-                status=status.HTTP_404_NOT_FOUND
-            )
-
-        has_approved_payment = Payment.objects.filter(
-            user=user,
-            payment_type='registration',
-            payment_approved=True
-        ).exists()
+        record, error = resolve_phone_record(phone, "invalid")
+        if error is not None:
+            return error
 
-        if not has_approved_payment:
-            return Response(
-                {"status": "invalid", "detail": "No approved registration payment found for this user"},
-                status=status.HTTP_403_FORBIDDEN
-            )
-
-        try:
-            ticket = Ticket.objects.get(user=user)
-            serializer = TicketSerializer(ticket)
-            return Response(
-                {
-                    "status": "valid",
-                    "message": "User has a valid ticket",
-                    "ticket": serializer.data
-                },
-                status=status.HTTP_200_OK
-            )
-        except Ticket.DoesNotExist:
-            return Response(
-                {"status": "invalid", "detail": "No ticket found for this user"},
-                status=status.HTTP_404_NOT_FOUND
-            )
+        return Response(
+            {
+                "status": "valid",
+                "message": "User has a valid ticket",
+                "ticket": gate_payload(record, thumbnail=wants_thumbnail(request))
+            },
+            status=status.HTTP_200_OK
+        )
 
 
-class MarkFoodReceivedByPhoneView(APIView):
+class MarkFoodReceivedByPhoneView(ScanLogMixin, APIView):
     """
     Backup food received marking by user phone number.
     Verifies user has an approved registration payment before marking.
     Endpoint: POST /api/tickets/mark-food-received-phone/<phone>/
     """
     permission_classes = [IsAdminUser]
+    scan_action = 'food'
 
     def post(self, request, phone):
-        try:
-            user = User.objects.get(phone=phone)
-        except User.DoesNotExist:
-            return Response(
-                {"status": "error", "detail": "No user found with this phone number"},
-                status=status.HTTP_404_NOT_FOUND
-            )
-
-        has_approved_payment = Payment.objects.filter(
-            user=user,
-            payment_type='registration',
-            payment_approved=True
-        ).exists()
-
-        if not has_approved_payment:
-            return Response(
-                {"status": "error", "detail": "No approved registration payment found for this user"},
-                status=status.HTTP_403_FORBIDDEN
-            )
-
-        try:
-            ticket = Ticket.objects.get(user=user)
-        except Ticket.DoesNotExist:
-            return Response(
-                {"status": "error", "detail": "No ticket found for this user"},
-                status=status.HTTP_404_NOT_FOUND
-            )
+        record, error = resolve_phone_record(phone, "error")
+        if error is not None:
+            return error
+
+        earlier = None
+        if not record.food_received:
+            result, earlier = claimed_transition(request, FOOD, record.ticket_code)
+            if result == NOT_FOUND:
+                return Response(
+                    {"status": "error", "detail": "No ticket found for this user"},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+            if not earlier:
+                on_commit_publish_record(record._replace(food_received=True))
+        else:
+            result = ALREADY_MARKED
 
-        if ticket.food_received:
+        record = record._replace(food_received=True)
+        if result == ALREADY_MARKED:
             return Response(
                 {
                     "status": "already_marked",
                     "message": "Food has already been marked as received for this user",
-                    "ticket_code": ticket.ticket_code
+                    "ticket_code": record.ticket_code,
+                    **duplicate_fields(earlier),
                 },
                 status=status.HTTP_200_OK
             )
 
-        ticket.food_received = True
-        ticket.save()
-        serializer = TicketSerializer(ticket)
         return Response(
             {
                 "status": "success",
                 "message": "Food marked as received",
-                "ticket": serializer.data
+                "ticket": gate_payload(record, thumbnail=wants_thumbnail(request))
+            },
+            status=status.HTTP_200_OK
+        )
+
+
+class GateActionView(ScanLogMixin, APIView):
+    """
+    Combined gate scan: validate a ticket and apply an action in one call.
+    Endpoint: POST /api/tickets/gate/<ticket_code>/
+    Endpoint: POST /api/tickets/gate-phone/<phone>/
+    Body: {"action": "check" | "enter" | "food", "dry_run": false}
+    The transition is a single conditional UPDATE, so two counters scanning
+    the same ticket cannot both succeed. The response carries the ticket's
+    post-action state. With dry_run the outcome is reported from the roster
+    and nothing is written.
+    """
+    permission_classes = [IsAdminUser]
+    done_field = {ENTER: 'entered', FOOD: 'food_received'}
+
+    def get_scan_action(self, request, response):
+        action = getattr(response, 'data', {}).get('action') or request.data.get('action')
+        return action if action in self.done_field else 'check'
+
+    def post(self, request, ticket_code=None, phone=None):
+        serializer = GateActionSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        action = serializer.validated_data['action']
+        dry_run = serializer.validated_data['dry_run']
+
+        if phone is not None:
+            record, error = resolve_phone_record(phone, "invalid")
+            if error is not None:
+                return error
+        else:
+            record = find_scanned_record(ticket_code)
+            if record is None:
+                return Response(
+                    {"status": "invalid", "detail": "Ticket not found"},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+
+        earlier = None
+        if action == 'check':
+            result = "valid"
+        else:
+            field = self.done_field[action]
+            if getattr(record, field):
+                result = ALREADY_MARKED
+            elif dry_run:
+                result = "would_succeed"
+            else:
+                result, earlier = claimed_transition(request, action, record.ticket_code)
+                if result == NOT_FOUND:
+                    return Response(
+                        {"status": "invalid", "detail": "Ticket not found"},
+                        status=status.HTTP_404_NOT_FOUND
+                    )
+                # Won or lost the race, the ticket is now in the post-action state
+                record = record._replace(**{field: True})
+                if not earlier:
+                    on_commit_publish_record(record)
+
+        return Response(
+            {
+                "status": result,
+                "action": action,
+                "dry_run": dry_run,
+                "ticket": gate_payload(record, thumbnail=wants_thumbnail(request)),
+                **duplicate_fields(earlier),
             },
             status=status.HTTP_200_OK
         )
 
+
+class QRKeysView(APIView):
+    """
+    Verification keys for scanners that check signed QR payloads offline.
+    Endpoint: GET /api/tickets/qr-keys/
+    Keys are base64 encoded; payloads look like <code>.<key_id>.<tag>.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        response = Response(
+            {
+                "algorithm": "HMAC-SHA256",
+                "separator": SEPARATOR,
+                "tag_bytes": TAG_BYTES,
+                "tag_encoding": "base32",
+                "active_key_id": get_active_key_id(),
+                "keys": {
+                    key_id: base64.b64encode(secret).decode()
+                    for key_id, secret in get_keys().items()
+                },
+            },
+            status=status.HTTP_200_OK
+        )
+        response['Cache-Control'] = 'private, no-store'
+        return response
+
+
+class RosterSyncView(APIView):
+    """
+    Ticket roster for offline-capable scanners.
+    Endpoint: GET /api/tickets/roster/?since=<cursor>
+    Without `since` the full roster is returned; with it only the tickets
+    changed since that cursor. Rows are positional arrays described by
+    `fields`. Responses carry an ETag, so polling an unchanged roster costs
+    one aggregate query and a 304.
+    """
+    permission_classes = [IsAdminUser]
+    # Rows committed slightly out of timestamp order are re-sent, never missed
+    cursor_overlap = timedelta(seconds=5)
+
+    def get(self, request):
+        since = request.query_params.get('since')
+        tickets = annotated_tickets()
+        since_dt = None
+        if since:
+            since_dt = parse_sync_cursor(since)
+            if since_dt is None:
+                return Response(
+                    {"detail": "Invalid sync cursor."},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            tickets = tickets.filter(updated_at__gt=since_dt)
+
+        started = timezone.now()
+        state = tickets.aggregate(latest=Max('updated_at'), count=Count('id'))
+        fingerprint = f"{since}|{state['latest']}|{state['count']}"
+        etag = '"%s"' % hashlib.md5(fingerprint.encode()).hexdigest()
+
+        if request.headers.get('If-None-Match') == etag:
+            response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            next_cursor = started - self.cursor_overlap
+            if since_dt and since_dt > next_cursor:
+                next_cursor = since_dt
+            response = Response(
+                {
+                    "full": since_dt is None,
+                    "cursor": sync_cursor(next_cursor),
+                    "fields": SYNC_FIELDS,
+                    "rows": sync_rows(tickets) if state['count'] else [],
+                },
+                status=status.HTTP_200_OK
+            )
+
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
+
+STREAM_TOKEN_SALT = 'tickets.live.stream'
+
+
+def issue_stream_token(user):
+    """Short-lived signed token for opening the live stream as `user`."""
+    return signing.dumps(user.pk, salt=STREAM_TOKEN_SALT)
+
+
+def authenticate_staff(request):
+    """
+    Staff user from a JWT access token in the Authorization header or, for
+    EventSource clients that cannot set headers, a stream token from
+    LiveStreamTokenView in the `token` query parameter. The access token
+    itself is never accepted in the URL, where proxies and logs keep it.
+    """
+    auth = JWTAuthentication()
+    header = auth.get_header(request)
+    if header:
+        try:
+            user = auth.get_user(auth.get_validated_token(auth.get_raw_token(header)))
+        except (InvalidToken, TokenError, AuthenticationFailed):
+            return None
+    else:
+        try:
+            user_id = signing.loads(
+                request.GET.get('token', ''), salt=STREAM_TOKEN_SALT,
+                max_age=getattr(settings, 'GATE_LIVE_TOKEN_MAX_AGE', 60),
+            )
+            user = User.objects.get(pk=user_id)
+        except (signing.BadSignature, User.DoesNotExist):
+            return None
+    return user if user.is_active and user.is_staff else None
+
+
+class LiveStreamTokenView(APIView):
+    """
+    Stream token for the live dashboard.
+    Endpoint: POST /api/ticket/live/token/
+    Returns a signed token valid for GATE_LIVE_TOKEN_MAX_AGE seconds, to be
+    passed as /api/ticket/live/?token=<token>. A reconnecting EventSource
+    needs a fresh one once it has expired.
+    """
+    permission_classes = [IsAdminUser]
+
+    def post(self, request):
+        response = Response(
+            {
+                "token": issue_stream_token(request.user),
+                "expires_in": getattr(settings, 'GATE_LIVE_TOKEN_MAX_AGE', 60),
+            },
+            status=status.HTTP_200_OK
+        )
+        response['Cache-Control'] = 'private, no-store'
+        return response
+
+
+class LiveCountsView(APIView):
+    """
+    Live gate / attendance counts as one JSON snapshot, for short polling.
+    Endpoint: GET /api/ticket/live/counts/
+    Same payload as the stream's `counts` event. Works under WSGI (the
+    Vercel deployment), where the stream is not served. Responses carry an
+    ETag; an unchanged snapshot is answered 304.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        snapshot = live_counts.snapshot()
+        fingerprint = json.dumps(snapshot, sort_keys=True, default=str)
+        etag = '"%s"' % hashlib.md5(fingerprint.encode()).hexdigest()
+        if request.headers.get('If-None-Match') == etag:
+            response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response(snapshot, status=status.HTTP_200_OK)
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
+
+class LiveDashboardStreamView(View):
+    """
+    Live gate / attendance counts as server-sent events.
+    Endpoint: GET /api/ticket/live/?token=<stream token>
+    Sends a `counts` event with entered, food served, tickets, per-batch
+    counts and scans per minute whenever they change, and a keep-alive
+    comment otherwise. Counts come from tickets.live, shared by all viewers
+    of a worker, never from per-viewer queries.
+
+    Only served under ASGI (core/asgi.py), where an open stream does not
+    hold a worker thread. Under WSGI the endpoint answers 404 and clients
+    poll live/counts/ instead.
+    """
+    keepalive_seconds = 15
+
+    async def get(self, request):
+        if not isinstance(request, ASGIRequest):
+            return JsonResponse(
+                {
+                    "detail": "Live stream requires the ASGI server; poll /api/ticket/live/counts/ instead.",
+                    "counts_url": "/api/ticket/live/counts/",
+                },
+                status=status.HTTP_404_NOT_FOUND
+            )
+        user = await sync_to_async(authenticate_staff)(request)
+        if user is None:
+            return JsonResponse(
+                {"detail": "Staff stream token required."},
+                status=status.HTTP_401_UNAUTHORIZED
+            )
+        response = StreamingHttpResponse(self.stream(), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    async def stream(self):
+        interval = getattr(settings, 'GATE_LIVE_POLL_INTERVAL', 1.0)
+        # Streams end periodically; EventSource reconnects after `retry` ms
+        deadline = time.monotonic() + getattr(settings, 'GATE_LIVE_STREAM_SECONDS', 300)
+        yield "retry: 3000\n\n"
+        last_version = object()
+        last_sent = time.monotonic()
+        while True:
+            snapshot = await sync_to_async(live_counts.snapshot)()
+            now = time.monotonic()
+            if snapshot['version'] != last_version:
+                last_version = snapshot['version']
+                last_sent = now
+                yield f"event: counts\nid: {last_version}\ndata: {json.dumps(snapshot)}\n\n"
+            elif now - last_sent >= self.keepalive_seconds:
+                last_sent = now
+                yield ": keep-alive\n\n"
+            if now >= deadline:
+                return
+            await asyncio.sleep(interval)